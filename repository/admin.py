@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 
-from .models import APIKey, Location, Observation, Satellite
+from .models import TLE, APIKey, Location, Observation, Satellite
 
 
 @admin.register(Satellite)
@@ -11,6 +11,13 @@ class SatelliteAdmin(admin.ModelAdmin):
     list_filter = ["date_added"]
 
 
+@admin.register(TLE)
+class TLEAdmin(admin.ModelAdmin):
+    search_fields = ["sat_number", "name"]
+    list_display = ["sat_number", "name", "epoch", "date_added"]
+    list_filter = ["date_added"]
+
+
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
     search_fields = ["obs_lat_deg", "obs_long_deg", "obs_alt_m"]
@@ -4,6 +4,7 @@ from ninja.errors import HttpError, ValidationError
 from ninja.throttling import AnonRateThrottle
 
 from .observations import router as observations_router
+from .renderers import ORJSONRenderer
 from .satellites import router as satellites_router
 from .upload import router as upload_router
 
@@ -61,6 +62,7 @@ api = NinjaAPI(
     title="SCORE API",
     description="API for accessing and uploading satellite observation data",
     version="2.0.0",
+    renderer=ORJSONRenderer(),
     throttle=[
         AnonRateThrottle("10/s"),
     ],
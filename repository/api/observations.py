@@ -1,41 +1,50 @@
 from datetime import datetime
 
-from django.db.models import Avg, Count, Max, Min
 from django.shortcuts import get_object_or_404
-from ninja import Router
-from ninja.pagination import paginate
-
-from ..models import Observation, Satellite
-from .schemas import ObservationSchema
+from ninja import Query, Router
+from ninja.errors import HttpError
+
+from ..models import Observation
+from ..utils import stats_utils
+from ..utils.upload_utils import settled_observations
+from .pagination import item_cursor, keyset_page, paginate_values
+from .renderers import json_response, schema_fields, schema_rows, schema_values
+from .schemas import (
+    ObservationChangeSchema,
+    ObservationChangesSchema,
+    ObservationSchema,
+)
 
 router = Router()
 
+# Order of the changes feed, served by observation_date_added_idx
+CHANGES_ORDERING = ("date_added", "id")
+
 
 @router.get("", response=list[ObservationSchema])
-@paginate
+@paginate_values(ObservationSchema)
 def get_all_observations(request):
     """Get All Observations
 
-    Retrieve all observations with pagination support.
+    Retrieve all observations, ordered by ID, with cursor pagination.
 
     ### Parameters
-    - **offset**: Page number (default: 1)
+    - **cursor**: The next_cursor of the previous page, omit for the first page
     - **limit**: Items per page (default: 1000)
+    - **count**: Include the total number of observations (default: false)
+    - **fields**: Comma-separated list of the fields to return (default: all)
 
     ### Returns
     Paginated response containing:
     - **items**: List of observations for current page
-    - **count**: Total number of observations
+    - **next_cursor**: Cursor for the next page, null on the last page
+    - **count**: Total number of observations, if requested
     """
-    return (
-        Observation.objects.select_related("location_id", "satellite_id")
-        .order_by("id")
-        .all()
-    )
+    return Observation.objects.select_related("location_id", "satellite_id").all()
 
 
 @router.get("/search", response=list[ObservationSchema])
-@paginate
+@paginate_values(ObservationSchema)
 def search_observations(
     request,
     satellite_number: int | None = None,
@@ -54,9 +63,10 @@ def search_observations(
     - **end_date**: Include observations before this date (UTC)
     - **min_magnitude**: Upper brightness limit (lower number = brighter)
     - **max_magnitude**: Lower brightness limit (higher number = dimmer)
+    - **cursor**, **limit**, **count**, **fields**: See Get All Observations
 
     ### Returns
-    List of observations matching the search criteria
+    List of observations matching the search criteria, ordered by ID
     """
     query = Observation.objects.select_related("location_id", "satellite_id")
 
@@ -72,7 +82,7 @@ def search_observations(
 
         if min_magnitude < max_magnitude:
             print("Invalid range, returning empty list")
-            return []
+            return query.none()
         query = query.filter(
             apparent_mag__lte=min_magnitude, apparent_mag__gte=max_magnitude
         )
@@ -85,25 +95,81 @@ def search_observations(
 
 
 @router.get("/recent", response=list[ObservationSchema])
-@paginate
+@paginate_values(ObservationSchema, ordering=("-obs_time_utc", "-id"))
 def get_recent_observations(request):
     """Get most recent observations
 
     Parameters
     ----------
     limit: Number of observations to return
+    cursor: The next_cursor of the previous page, for older observations
+    fields: Comma-separated list of the fields to return
     """
-    observations = Observation.objects.select_related(
-        "location_id", "satellite_id"
-    ).order_by("-obs_time_utc")
+    observations = Observation.objects.select_related("location_id", "satellite_id")
     return observations.all()
 
 
+@router.get("/changes", response=ObservationChangesSchema)
+def get_observation_changes(
+    request,
+    since: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = Query(1000, ge=1, le=5000),
+    fields: str | None = None,
+):
+    """Get Observation Changes
+
+    Retrieve the observations added after a given time, in the order they were
+    added, for keeping a copy of the data up to date. Observations only appear
+    here a few minutes after they were added, once uploads that were still being
+    saved at that time have finished, so nothing is skipped by a later sync.
+
+    ### Parameters
+    - **since**: Include observations added after this time (UTC)
+    - **cursor**: The next_cursor returned with the previous page
+    - **limit**: Items per page (default: 1000, max: 5000)
+    - **fields**: Comma-separated list of the fields to return (default: all)
+
+    ### Returns
+    - **items**: Observations for the current page, including date_added
+    - **next_cursor**: Cursor after the last item. Keep the cursor of the last page
+      to continue from there on the next sync.
+    - **has_more**: Whether more observations have already been added
+    """
+    fields = schema_fields(ObservationChangeSchema, fields)
+    query = schema_values(
+        settled_observations(),
+        ObservationChangeSchema,
+        fields,
+        extra=CHANGES_ORDERING,
+    )
+    if since:
+        query = query.filter(date_added__gt=since)
+
+    try:
+        items, has_more = keyset_page(query, CHANGES_ORDERING, cursor, limit)
+    except ValueError as e:
+        raise HttpError(400, str(e)) from e
+
+    return json_response(
+        {
+            "items": schema_rows(items, ObservationChangeSchema, fields),
+            "next_cursor": (
+                item_cursor(items[-1], CHANGES_ORDERING) if items else cursor
+            ),
+            "has_more": has_more,
+        }
+    )
+
+
 @router.get("/stats", response=dict)
 def get_observation_stats(request):
     """Get Observation Statistics
 
-    Retrieve summary statistics about all observations.
+    Retrieve summary statistics about all observations. The statistics are kept up
+    to date as observations are uploaded rather than computed for each request.
+    Observations changed or removed by other means are reflected after the nightly
+    recompute.
 
     ### Returns
     Dictionary containing:
@@ -113,64 +179,18 @@ def get_observation_stats(request):
     - **magnitude_stats**: Average, brightest, and faintest magnitudes
     - **most_observed_satellites**: Top 5 most frequently observed satellites
     """
-    # Basic counts
-    total_obs = Observation.objects.count()
-    total_satellites = Satellite.objects.count()
-
-    # Time range
-    time_stats = Observation.objects.aggregate(
-        earliest_observation=Min("obs_time_utc"), latest_observation=Max("obs_time_utc")
-    )
-
-    # Magnitude stats
-    mag_stats = Observation.objects.filter(apparent_mag__isnull=False).aggregate(
-        avg_magnitude=Avg("apparent_mag"),
-        brightest=Min("apparent_mag"),
-        faintest=Max("apparent_mag"),
-    )
-
-    # Most observed satellites
-    top_satellites = (
-        Observation.objects.values("satellite_id__sat_number", "satellite_id__sat_name")
-        .annotate(count=Count("id"))
-        .order_by("-count")[:5]
-    )
-
-    return {
-        "total_observations": total_obs,
-        "total_satellites": total_satellites,
-        "time_range": {
-            "first": time_stats["earliest_observation"],
-            "last": time_stats["latest_observation"],
-        },
-        "magnitude_stats": {
-            "average": (
-                round(mag_stats["avg_magnitude"], 2)
-                if mag_stats["avg_magnitude"]
-                else None
-            ),
-            "brightest": mag_stats["brightest"],
-            "faintest": mag_stats["faintest"],
-        },
-        "most_observed_satellites": [
-            {
-                "number": sat["satellite_id__sat_number"],
-                "name": sat["satellite_id__sat_name"],
-                "observations": sat["count"],
-            }
-            for sat in top_satellites
-        ],
-    }
+    return stats_utils.get_observation_stats()
 
 
 @router.get("/{observation_id}", response=ObservationSchema)
-def get_observation(request, observation_id: int):
+def get_observation(request, observation_id: int, fields: str | None = None):
     """Get Observation Details
 
     Retrieve detailed information about a specific observation by its ID.
 
     ### Parameters
     - **observation_id**: The unique identifier of the observation
+    - **fields**: Comma-separated list of the fields to return (default: all)
 
     ### Returns
     ObservationSchema containing:
@@ -183,7 +203,9 @@ def get_observation(request, observation_id: int):
     ### Raises
     - **404**: Observation not found
     """
-    return get_object_or_404(
-        Observation.objects.select_related("location_id", "satellite_id"),
+    fields = schema_fields(ObservationSchema, fields)
+    observation = get_object_or_404(
+        schema_values(Observation.objects.all(), ObservationSchema, fields),
         id=observation_id,
     )
+    return json_response(schema_rows([observation], ObservationSchema, fields)[0])
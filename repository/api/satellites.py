@@ -1,8 +1,8 @@
 from django.shortcuts import get_object_or_404
 from ninja import Router
-from ninja.pagination import paginate
 
 from ..models import Observation, Satellite
+from .pagination import paginate_values
 from .schemas import ObservationSchema, SatelliteSchema
 
 router = Router()
@@ -17,7 +17,7 @@ def list_satellites(
 
     Parameters
     ----------
-    name (optional): Filter by satellite name
+    name (optional): Filter by part of the satellite name, ignoring case
     """
 
     query = Satellite.objects.all()
@@ -27,14 +27,15 @@ def list_satellites(
 
 
 @router.get("/{satellite_number}/observations", response=list[ObservationSchema])
-@paginate
+@paginate_values(ObservationSchema, ordering=("obs_time_utc", "id"))
 def get_observations_for_satellite(request, satellite_number: int):
     """Get Satellite Observations
 
-    Retrieve all observations for a specific satellite.
+    Retrieve all observations for a specific satellite, in time order.
 
     ### Parameters
     - **satellite_number**: NORAD ID of the satellite
+    - **cursor**, **limit**, **count**, **fields**: See Get All Observations
 
     ### Returns
     List of observations containing:
@@ -58,6 +58,32 @@ class ObservationSchema(ModelSchema):
         ]
 
 
+class ObservationChangeSchema(ObservationSchema):
+    date_added: datetime
+
+
+class ObservationChangesSchema(Schema):
+    """Schema for a page of the observation changes feed"""
+
+    items: list[ObservationChangeSchema]
+    next_cursor: str | None = Field(
+        None,
+        description="Pass as cursor to continue after the last item, "
+        "including on a later sync after the last page",
+    )
+    has_more: bool
+
+
+class FieldsSchema(Schema):
+    """Schema for the fields query parameter of the observation endpoints"""
+
+    fields: str | None = Field(
+        None,
+        description="Comma-separated list of the fields to return, "
+        "e.g. id,obs_time_utc,apparent_mag (default: all fields)",
+    )
+
+
 class ObservationUploadSchema(Schema):
     # Required fields
     obs_time_utc: datetime
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from repository.models import Satellite, get_constellation_id
+
+
+class Command(BaseCommand):
+    help = (
+        "Sets the constellation of every satellite from its name. New and renamed "
+        "satellites are classified when they are saved, so this is only needed once "
+        "after adding the constellation column, or after changing "
+        "CONSTELLATION_PATTERNS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of satellites updated per query",
+        )
+
+    def handle(self, *args, **options):
+        changed = []
+        for satellite in Satellite.objects.only("id", "sat_name", "constellation"):
+            constellation = get_constellation_id(satellite.sat_name)
+            if satellite.constellation != constellation:
+                satellite.constellation = constellation
+                changed.append(satellite)
+        Satellite.objects.bulk_update(
+            changed, ["constellation"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated the constellation of {len(changed)} satellites"
+            )
+        )
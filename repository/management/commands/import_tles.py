@@ -0,0 +1,42 @@
+import gzip
+
+from django.core.management.base import BaseCommand, CommandError
+
+from repository.models import TLE
+from repository.utils.ephemeris_utils import import_tles, parse_tle_lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports TLEs from bulk TLE files (two or three line format, optionally "
+        "gzipped) for use by the local ephemeris backend. TLEs that are already "
+        "stored are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+", help="TLE files to import")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of TLEs inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        stored = TLE.objects.count()
+        for path in options["files"]:
+            opener = gzip.open if path.endswith(".gz") else open
+            try:
+                with opener(path, "rt", encoding="utf-8") as tle_file:
+                    count = import_tles(
+                        parse_tle_lines(tle_file), options["batch_size"]
+                    )
+            except OSError as e:
+                raise CommandError(f"Could not read {path}: {e}") from e
+            self.stdout.write(f"{path}: read {count} TLEs")
+            total += count
+        new = TLE.objects.count() - stored
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {new} new TLEs out of {total} read")
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from repository.utils.stats_utils import recompute_observation_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the observation statistics served by the stats API from all "
+        "observations. The statistics are kept up to date by the upload tasks and "
+        "recomputed nightly, so this is only needed to pick up observations changed "
+        "or deleted some other way straight away."
+    )
+
+    def handle(self, *args, **options):
+        stats = recompute_observation_stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recomputed statistics for {stats.observation_count} observations "
+                f"of {stats.satellite_count} satellites"
+            )
+        )
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.16 on 2026-10-18 03:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0017_apikeyverification_apikey"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TLE",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sat_number", models.IntegerField()),
+                ("name", models.CharField(blank=True, default="", max_length=200)),
+                ("epoch", models.DateTimeField()),
+                ("line1", models.CharField(max_length=80)),
+                ("line2", models.CharField(max_length=80)),
+                (
+                    "date_added",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="date added"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "TLE",
+                "verbose_name_plural": "TLEs",
+                "db_table": "tle",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="tle",
+            constraint=models.UniqueConstraint(
+                fields=("sat_number", "epoch"), name="tle_sat_number_epoch_unique"
+            ),
+        ),
+    ]
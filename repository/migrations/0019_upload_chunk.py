@@ -0,0 +1,47 @@
+# Generated by Django 4.2.16 on 2026-10-18 03:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0018_tle"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UploadChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("upload_id", models.UUIDField()),
+                ("chunk_index", models.IntegerField()),
+                ("rows", models.JSONField()),
+                ("satchecker_data", models.JSONField(blank=True, null=True)),
+                (
+                    "date_added",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="date added"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "upload_chunk",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="uploadchunk",
+            constraint=models.UniqueConstraint(
+                fields=("upload_id", "chunk_index"), name="upload_chunk_unique"
+            ),
+        ),
+    ]
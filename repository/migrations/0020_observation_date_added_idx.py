@@ -0,0 +1,19 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0019_upload_chunk"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(
+                fields=["date_added", "id"], name="observation_date_added_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0020_observation_date_added_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(
+                fields=["obs_time_utc", "id"], name="observation_obs_time_utc_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0021_observation_obs_time_utc_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ObservationStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("observation_count", models.BigIntegerField(default=0)),
+                ("satellite_count", models.IntegerField(default=0)),
+                ("earliest_obs_time", models.DateTimeField(blank=True, null=True)),
+                ("latest_obs_time", models.DateTimeField(blank=True, null=True)),
+                ("magnitude_count", models.BigIntegerField(default=0)),
+                ("magnitude_sum", models.FloatField(default=0)),
+                ("brightest_mag", models.FloatField(blank=True, null=True)),
+                ("faintest_mag", models.FloatField(blank=True, null=True)),
+                (
+                    "date_updated",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="date updated"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "observation_stats",
+            },
+        ),
+        migrations.CreateModel(
+            name="SatelliteObservationCount",
+            fields=[
+                (
+                    "satellite_id",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to="repository.satellite",
+                    ),
+                ),
+                ("observation_count", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "db_table": "satellite_observation_count",
+                "indexes": [
+                    models.Index(
+                        fields=["-observation_count"], name="satellite_obs_count_idx"
+                    )
+                ],
+            },
+        ),
+    ]
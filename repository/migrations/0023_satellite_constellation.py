@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0022_observation_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="satellite",
+            name="constellation",
+            field=models.CharField(db_index=True, default="other", max_length=20),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0023_satellite_constellation"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(
+                fields=["obs_lat_deg", "obs_long_deg"], name="location_lat_long_idx"
+            ),
+        ),
+    ]
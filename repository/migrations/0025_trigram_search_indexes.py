@@ -0,0 +1,47 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:41
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0024_location_lat_long_idx"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="observation",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("instrument"),
+                    name="gin_trgm_ops",
+                ),
+                name="obs_instrument_trgm_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("obs_filter"),
+                    name="gin_trgm_ops",
+                ),
+                name="obs_filter_trgm_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="satellite",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("sat_name"),
+                    name="gin_trgm_ops",
+                ),
+                name="satellite_sat_name_trgm_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:44
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0025_trigram_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="observation",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["obs_orc_id"], name="obs_orc_id_gin_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0026_observation_orc_id_gin_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadchunk",
+            name="claimed_by",
+            field=models.CharField(blank=True, max_length=36, null=True),
+        ),
+        migrations.AddField(
+            model_name="uploadchunk",
+            name="claimed_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
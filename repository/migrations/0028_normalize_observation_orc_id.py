@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def upper_case_orcids(apps, schema_editor):
+    # ORCIDs are matched exactly by orcid_filter, so ones stored with a lower case
+    # check digit ("x") have to be upper cased to be found
+    Observation = apps.get_model("repository", "Observation")
+    updated = []
+    for observation in (
+        Observation.objects.filter(obs_orc_id__icontains="x")
+        .only("id", "obs_orc_id")
+        .iterator()
+    ):
+        orcids = [orc_id.upper() for orc_id in observation.obs_orc_id]
+        if orcids != observation.obs_orc_id:
+            observation.obs_orc_id = orcids
+            updated.append(observation)
+    Observation.objects.bulk_update(updated, ["obs_orc_id"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0027_upload_chunk_claim"),
+    ]
+
+    operations = [
+        migrations.RunPython(upper_case_orcids, migrations.RunPython.noop),
+    ]
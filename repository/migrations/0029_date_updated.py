@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0028_normalize_observation_orc_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="location",
+            name="date_updated",
+            field=models.DateTimeField(auto_now=True, verbose_name="date updated"),
+        ),
+        migrations.AddField(
+            model_name="observation",
+            name="date_updated",
+            field=models.DateTimeField(auto_now=True, verbose_name="date updated"),
+        ),
+        migrations.AddField(
+            model_name="satellite",
+            name="date_updated",
+            field=models.DateTimeField(auto_now=True, verbose_name="date updated"),
+        ),
+    ]
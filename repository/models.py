@@ -6,14 +6,20 @@ import uuid
 from datetime import timedelta
 from math import atan2, cos, radians, sin, sqrt
 
+import numpy as np
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+# Earth's radius in kilometers, for distances between observer locations
+EARTH_RADIUS_KM = 6371
+
 
 def validate_orcid(value):
     pattern = re.compile(r"^\d{4}-\d{4}-\d{4}-\d{3}[0-9Xx]$")
@@ -22,16 +28,52 @@ def validate_orcid(value):
             raise ValidationError(f"{orc_id} is not a valid ORCID")
 
 
+# Constellations that satellites are grouped into, in the order they are checked,
+# with the satellite name patterns for each. Satellites that match none of them are
+# in the "other" constellation.
+CONSTELLATION_PATTERNS = {
+    "starlink": ("STARLINK",),
+    "kuiper": ("KUIPER",),
+    "qianfan": ("QIANFAN",),
+    "spacemobile": ("SPACEMOBILE",),
+    "oneweb": ("ONEWEB",),
+    "planetlabs": ("FLOCK", "PELICAN", "TANAGER"),
+}
+
+
+def get_constellation_id(sat_name):
+    """Returns the constellation of a satellite, based on its name."""
+    sat_name_upper = (sat_name or "").upper()
+    for constellation, patterns in CONSTELLATION_PATTERNS.items():
+        if any(pattern in sat_name_upper for pattern in patterns):
+            return constellation
+    return "other"
+
+
+def trigram_index(field_name: str, name: str) -> GinIndex:
+    """
+    Returns a pg_trgm index for case-insensitive substring searches on a text field.
+
+    Django's icontains lookup is compiled to UPPER(field) LIKE UPPER('%value%'), so
+    the index is on the same expression for Postgres to use it. Searches for fewer
+    than three characters still scan the table.
+    """
+    return GinIndex(OpClass(Upper(field_name), name="gin_trgm_ops"), name=name)
+
+
 class Satellite(models.Model):
 
     sat_name = models.CharField(max_length=200, null=True, blank=True)
     sat_number = models.IntegerField(default=0)
     date_added = models.DateTimeField("date added", default=timezone.now)
+    date_updated = models.DateTimeField("date updated", auto_now=True)
     intl_designator = models.CharField(max_length=200, null=True, blank=True)
     launch_date = models.DateField(null=True, blank=True)
     decay_date = models.DateField(null=True, blank=True)
     rcs_size = models.CharField(max_length=200, null=True, blank=True)
     object_type = models.CharField(max_length=200, null=True, blank=True)
+    # Set from the name when the satellite is saved, see get_constellation_id
+    constellation = models.CharField(max_length=20, default="other", db_index=True)
 
     def __str__(self):
         return str(self.sat_number) + ", " + self.sat_name
@@ -39,6 +81,10 @@ class Satellite(models.Model):
     class Meta:
         db_table = "satellite"
         unique_together = ("sat_name", "sat_number")
+        indexes = [
+            # Name search - icontains compares UPPER(sat_name), see trigram_index
+            trigram_index("sat_name", "satellite_sat_name_trgm_idx"),
+        ]
 
     def clean(self):
         if not self.sat_number:
@@ -49,10 +95,41 @@ class Satellite(models.Model):
             raise ValidationError("Satellite number must be positive.")
 
     def save(self, *args, **kwargs):
+        self.constellation = get_constellation_id(self.sat_name)
         self.full_clean()
         super().save(*args, **kwargs)
 
 
+class TLE(models.Model):
+    """
+    A two-line element set for a satellite, imported from bulk TLE files.
+
+    Used to calculate satellite positions locally instead of through SatChecker.
+    TLEs are looked up by NORAD ID and epoch, so the unique constraint on those two
+    fields also serves as the index for finding the TLE closest to an observation.
+    """
+
+    sat_number = models.IntegerField()
+    name = models.CharField(max_length=200, blank=True, default="")
+    epoch = models.DateTimeField()
+    line1 = models.CharField(max_length=80)
+    line2 = models.CharField(max_length=80)
+    date_added = models.DateTimeField("date added", default=timezone.now)
+
+    class Meta:
+        db_table = "tle"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sat_number", "epoch"], name="tle_sat_number_epoch_unique"
+            ),
+        ]
+        verbose_name = "TLE"
+        verbose_name_plural = "TLEs"
+
+    def __str__(self):
+        return f"{self.sat_number}, {self.name}, {self.epoch.isoformat()}"
+
+
 class Location(models.Model):
     obs_lat_deg = models.FloatField(
         validators=[MinValueValidator(-90), MaxValueValidator(90)]
@@ -62,9 +139,16 @@ class Location(models.Model):
     )
     obs_alt_m = models.FloatField(default=0)
     date_added = models.DateTimeField("date added", default=timezone.now)
+    date_updated = models.DateTimeField("date updated", auto_now=True)
 
     class Meta:
         db_table = "location"
+        indexes = [
+            # Bounding box prefilter for radius searches, see search_utils
+            models.Index(
+                fields=["obs_lat_deg", "obs_long_deg"], name="location_lat_long_idx"
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -76,7 +160,7 @@ class Location(models.Model):
         )
 
     def distance_to(self, lat, lon):
-        earth_radius = 6371  # Earth's radius in kilometers
+        earth_radius = EARTH_RADIUS_KM
 
         lat1, lon1 = radians(self.obs_lat_deg), radians(self.obs_long_deg)
         lat2, lon2 = radians(lat), radians(lon)
@@ -89,6 +173,36 @@ class Location(models.Model):
 
         return earth_radius * c
 
+    @staticmethod
+    def distances_to(latitudes, longitudes, lat, lon):
+        """
+        Calculates the great-circle distances from many locations to a point at once.
+
+        This uses the same haversine formula as distance_to, vectorized with NumPy,
+        so it can be used on the coordinates of many locations (e.g. from
+        values_list) without creating a Location for each one.
+
+        Args:
+            latitudes (array_like): Latitudes of the locations in degrees.
+            longitudes (array_like): Longitudes of the locations in degrees.
+            lat (float): Latitude of the point in degrees.
+            lon (float): Longitude of the point in degrees.
+
+        Returns:
+            np.ndarray: The distance from each location to the point in kilometers.
+        """
+        lat1 = np.radians(np.asarray(latitudes, dtype=float))
+        lon1 = np.radians(np.asarray(longitudes, dtype=float))
+        lat2, lon2 = radians(lat), radians(lon)
+
+        dlat = lat2 - lat1
+        dlon = lon2 - lon1
+
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * cos(lat2) * np.sin(dlon / 2) ** 2
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+        return EARTH_RADIUS_KM * c
+
     def save(self, *args, **kwargs):
         self.full_clean()  # Ensure validation is called
         super().save(*args, **kwargs)
@@ -161,6 +275,7 @@ class Observation(models.Model):
         Location, on_delete=models.CASCADE, related_name="observations"
     )
     date_added = models.DateTimeField("date added", default=timezone.now)
+    date_updated = models.DateTimeField("date updated", auto_now=True)
 
     def __str__(self):
         return (
@@ -178,6 +293,19 @@ class Observation(models.Model):
         indexes = [
             models.Index(fields=["satellite_id", "obs_time_utc"]),  # ASC
             models.Index(fields=["satellite_id", "-obs_time_utc"]),  # DESC
+            # Recent observations API - scanned backwards for newest first
+            models.Index(
+                fields=["obs_time_utc", "id"], name="observation_obs_time_utc_idx"
+            ),
+            # Changes feed - new observations in the order they were added
+            models.Index(
+                fields=["date_added", "id"], name="observation_date_added_idx"
+            ),
+            # Instrument and filter search
+            trigram_index("instrument", "obs_instrument_trgm_idx"),
+            trigram_index("obs_filter", "obs_filter_trgm_idx"),
+            # Observer pages and ORCID search, see orcid_filter
+            GinIndex(fields=["obs_orc_id"], name="obs_orc_id_gin_idx"),
         ]
 
     def clean(self):
@@ -208,6 +336,79 @@ class Observation(models.Model):
         super().save(*args, **kwargs)
 
 
+class UploadChunk(models.Model):
+    """
+    A fixed-size chunk of rows from an uploaded CSV file.
+
+    Uploaded files are split into chunks so that the rows don't have to be passed
+    to the upload task in one message. Once a chunk has been validated, the
+    SatChecker data for its rows is saved with it, so an upload task that is
+    restarted picks up from the first chunk that hasn't been validated yet.
+    Chunks are deleted when the upload task finishes.
+
+    The run of the upload task working on an upload holds a claim on it, stored on
+    the first chunk, see claim_csv_upload.
+    """
+
+    upload_id = models.UUIDField()
+    chunk_index = models.IntegerField()
+    rows = models.JSONField()
+    satchecker_data = models.JSONField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=36, null=True, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    date_added = models.DateTimeField("date added", default=timezone.now)
+
+    class Meta:
+        db_table = "upload_chunk"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["upload_id", "chunk_index"], name="upload_chunk_unique"
+            ),
+        ]
+
+
+class ObservationStats(models.Model):
+    """
+    Summary statistics of all observations, for the observation stats API.
+
+    There is a single row, which upload tasks update as observations are created
+    (see stats_utils.record_observations) so the statistics don't have to be
+    aggregated over the whole observation table for every request. It is rebuilt
+    from the observations nightly, or with the recompute_observation_stats command.
+    """
+
+    observation_count = models.BigIntegerField(default=0)
+    satellite_count = models.IntegerField(default=0)
+    earliest_obs_time = models.DateTimeField(null=True, blank=True)
+    latest_obs_time = models.DateTimeField(null=True, blank=True)
+    # Observations with an apparent magnitude, and the sum of their magnitudes
+    magnitude_count = models.BigIntegerField(default=0)
+    magnitude_sum = models.FloatField(default=0)
+    brightest_mag = models.FloatField(null=True, blank=True)
+    faintest_mag = models.FloatField(null=True, blank=True)
+    date_updated = models.DateTimeField("date updated", default=timezone.now)
+
+    class Meta:
+        db_table = "observation_stats"
+
+
+class SatelliteObservationCount(models.Model):
+    """
+    The number of observations of a satellite, kept with ObservationStats.
+    """
+
+    satellite_id = models.OneToOneField(
+        Satellite, on_delete=models.CASCADE, primary_key=True
+    )
+    observation_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "satellite_observation_count"
+        indexes = [
+            models.Index(fields=["-observation_count"], name="satellite_obs_count_idx"),
+        ]
+
+
 class APIKey(models.Model):
     """
     API Key model for authenticating API requests.
@@ -1,247 +1,336 @@
+import uuid
 from typing import Any
 
-from celery import shared_task
+from celery import shared_task, states
+from celery.exceptions import Ignore
 from celery_progress.backend import ProgressRecorder
+from django.conf import settings
+from django.db.models import Func, IntegerField, Sum
 from django.forms import ValidationError
 from django.utils import timezone
 
-from repository.models import Location, Observation, Satellite
+from repository.models import UploadChunk
+from repository.utils import csv_utils, stats_utils
 from repository.utils.email_utils import send_confirmation_email
-from repository.utils.general_utils import SatCheckerData, add_additional_data
+from repository.utils.general_utils import (
+    ProgressThrottle,
+    SatCheckerData,
+    add_additional_data,
+    additional_data_pool,
+    invalidate_stats,
+)
+from repository.utils.upload_utils import (
+    CSV_OBSERVATION_MATCH_FIELDS,
+    PreparedObservation,
+    claim_csv_upload,
+    persist_observations,
+    prepare_observation,
+)
 
 
 class UploadError(Exception):
     pass
 
 
+class UploadClaimLostError(Exception):
+    """Another run of process_upload_csv has taken over the upload."""
+
+
 def is_potentially_discrepant(additional_data: SatCheckerData) -> bool:
     return additional_data.alt_deg is not None and (
         additional_data.alt_deg < -3 or additional_data.illuminated is False
     )
 
 
-def get_or_create_satellite(
-    sat_number: int, satellite_name: str, additional_data: SatCheckerData
-) -> Satellite:
-    # First try to get existing satellite by number
+def csv_additional_data_args(column: list[Any]) -> tuple | None:
+    """
+    Returns the add_additional_data arguments for a CSV row, or None for rows that
+    will be rejected.
+    """
+    if "SATHUB-SATELLITE" in column[0] or len(column) != 27:
+        return None
+    return (
+        column[0].upper(),  # satellite_name
+        column[1],  # sat_number
+        column[2],  # obs_time_utc
+        float(column[6]),  # obs_lat_deg
+        float(column[7]),  # obs_long_deg
+        float(column[8]),  # obs_alt_m
+    )
+
+
+def csv_additional_data(column: list[Any]) -> SatCheckerData | str | bool | None:
+    """Gets the SatChecker data for a CSV row, skipping rows that will be rejected."""
+    args = csv_additional_data_args(column)
+    return None if args is None else add_additional_data(*args)
+
+
+def api_additional_data_args(obs_data: dict) -> tuple:
+    """Returns the add_additional_data arguments for an API observation."""
+    # Convert datetime to string format that astropy can parse
+    # (no timezone info)
+    obs_time_str = obs_data["obs_time_utc"].replace(tzinfo=None).isoformat()
+    return (
+        obs_data["satellite_name"],
+        obs_data["satellite_number"],
+        obs_time_str,
+        obs_data["obs_lat_deg"],
+        obs_data["obs_long_deg"],
+        obs_data["obs_alt_m"],
+    )
+
+
+def api_additional_data(obs_data: dict) -> SatCheckerData | str | bool:
+    """Gets the SatChecker data for an observation submitted through the API."""
+    return add_additional_data(*api_additional_data_args(obs_data))
+
+
+def prepare_csv_row(
+    column: list[Any], additional_data: SatCheckerData, obs_error_reference: str
+) -> PreparedObservation:
+    """
+    Checks a CSV row that passed the SatChecker checks and builds its observation.
+
+    Args:
+        column (list[Any]): The CSV row, with the satellite name in upper case.
+        additional_data (SatCheckerData): The SatChecker data for the row.
+        obs_error_reference (str): Identifies the row in error messages.
+
+    Returns:
+        PreparedObservation: The validated, unsaved observation.
+    """
+    potentially_discrepant = is_potentially_discrepant(additional_data)
+
+    # Special error message cases
+    if column[4] == "" and column[5] != "":
+        error_message = "Apparent magnitude uncertainty without apparent magnitude."
+        raise UploadError(error_message + " - " + obs_error_reference)
+
     try:
-        satellite = Satellite.objects.get(sat_number=sat_number)
-        # Get the new name from either column[0] or additional_data
-        new_name = (
-            satellite_name if satellite_name != "" else additional_data.satellite_name
-        )
-        # Update name if:
-        # 1. Satellite has no name and new data has a name, OR
-        # 2. New data has a name that's different from current satellite name
-        if (not satellite.sat_name and new_name) or (
-            new_name and new_name != satellite.sat_name
-        ):
-            satellite.sat_name = new_name
-            satellite.save()
-        # If satellite exists but has no intl_designator, update it
-        if not satellite.intl_designator and additional_data.intl_designator:
-            satellite.intl_designator = additional_data.intl_designator
-            satellite.save()
-    except Satellite.DoesNotExist:
-        # Only create new satellite if it doesn't exist
-        satellite = Satellite.objects.create(
-            sat_name=(
-                satellite_name
-                if satellite_name != ""
-                else additional_data.satellite_name
-            ),
-            sat_number=sat_number,
-            date_added=timezone.now(),
-            intl_designator=additional_data.intl_designator,
-        )
-    return satellite
+        obs_lat_deg = float(column[6])
+        obs_long_deg = float(column[7])
+        obs_alt_m = float(column[8])
+    except ValueError as e:
+        raise UploadError(f"Invalid value: {str(e)} - {obs_error_reference}") from e
+
+    # ORCIDs are stored in upper case, see orcid_filter
+    orc_id_list = [item.strip().upper() for item in column[14].split(",")]
+    if column[4] == "" and column[5] == "":
+        column[4] = None
+        column[5] = None
+
+    # Remove whitespace
+    observer_email = column[13].strip().lower()
+    observer_email = "".join(observer_email.split())
+
+    return prepare_observation(
+        {
+            "obs_time_utc": column[2],
+            "obs_time_uncert_sec": column[3],
+            "apparent_mag": column[4],
+            "apparent_mag_uncert": column[5],
+            "limiting_magnitude": column[9],
+            "instrument": column[10],
+            "obs_mode": column[11].upper(),
+            "obs_filter": column[12],
+            "obs_email": observer_email,
+            "obs_orc_id": orc_id_list,
+            "sat_ra_deg": column[15] if column[15] else None,
+            "sat_dec_deg": column[16] if column[16] else None,
+            "sigma_2_ra": column[17] if column[17] else None,
+            "sigma_ra_sigma_dec": column[18] if column[18] else None,
+            "sigma_2_dec": column[19] if column[19] else None,
+            "range_to_sat_km": column[20] if column[20] else None,
+            "range_to_sat_uncert_km": (column[21] if column[21] else None),
+            "range_rate_sat_km_s": column[22] if column[22] else None,
+            "range_rate_sat_uncert_km_s": (column[23] if column[23] else None),
+            "comments": column[24],
+            "data_archive_link": column[25],
+            "mpc_code": (column[26].strip().upper() if column[26] else None),
+            "phase_angle": additional_data.phase_angle,
+            "range_to_sat_km_satchecker": additional_data.range_to_sat,
+            "range_rate_sat_km_s_satchecker": (additional_data.range_rate),
+            "sat_ra_deg_satchecker": additional_data.sat_ra_deg,
+            "sat_dec_deg_satchecker": additional_data.sat_dec_deg,
+            "ddec_deg_s_satchecker": additional_data.ddec_deg_s,
+            "dra_cosdec_deg_s_satchecker": (additional_data.dra_cosdec_deg_s),
+            "alt_deg_satchecker": additional_data.alt_deg,
+            "az_deg_satchecker": additional_data.az_deg,
+            "sat_altitude_km_satchecker": (additional_data.sat_altitude_km),
+            "solar_elevation_deg_satchecker": (additional_data.solar_elevation_deg),
+            "solar_azimuth_deg_satchecker": (additional_data.solar_azimuth_deg),
+            "illuminated": additional_data.illuminated,
+            "potentially_discrepant": potentially_discrepant,
+            "date_added": timezone.now(),
+        },
+        {
+            "obs_lat_deg": obs_lat_deg,
+            "obs_long_deg": obs_long_deg,
+            "obs_alt_m": obs_alt_m,
+            "date_added": timezone.now(),
+        },
+        column[1],
+        column[0],
+        additional_data,
+    )
 
 
-@shared_task(bind=True)
-def process_upload_csv(
-    self, data: list[list[Any]]
-) -> dict[str, str | list[int] | bool]:
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def process_upload_csv(self, upload_id: str) -> dict[str, str | list[int] | bool]:
     """
-    Processes the uploaded CSV data and creates or updates the corresponding Satellite,
-    Location, and Observation objects.
+    Processes an uploaded CSV file and creates or updates the corresponding
+    Satellite, Location, and Observation objects.
 
-    This function takes a list of lists where each inner list represents a row from
-    the CSV file. It validates the data, creates or updates the corresponding Satellite,
-    Location, and Observation objects, and sends a confirmation email.
+    The rows of the file are read from the chunks saved by stage_csv_upload. Every
+    row is validated and checked with SatChecker first, one chunk at a time, and the
+    SatChecker data is saved with each chunk once all of its rows are valid. Only
+    when the whole file is valid are the observations saved, again a chunk at a
+    time, and a confirmation email sent.
+
+    The task is acknowledged only once it finishes, so if the worker running it is
+    lost the task is run again. Chunks that were already validated are skipped, and
+    observations that were already saved are found as duplicates, so the upload
+    picks up where it stopped instead of starting over.
+
+    The broker can also deliver the task again while the first run is still going,
+    so each run has to claim the upload first (see claim_csv_upload). A run that
+    finds the upload claimed schedules itself to try again once the claim would
+    run out, and a run for an upload that has already finished does nothing. Only
+    the run holding the claim deletes the chunks, once the upload has succeeded
+    or failed.
 
     Args:
-        data (list[list[str]]): A list of lists where each inner list represents a row
-                                from the CSV file.
+        upload_id (str): The upload ID returned by stage_csv_upload.
 
     Returns:
         dict[str, object]: A dictionary containing the status of the upload, the IDs of
         the created or updated observations, the date the upload was added, and the
         email to which the confirmation was sent.
     """
-    progress_recorder = ProgressRecorder(self)
+    if (
+        self.request.id
+        and self.AsyncResult(self.request.id).state in states.READY_STATES
+    ):
+        # Delivered again after another run finished the upload
+        raise Ignore()
+
+    chunks = UploadChunk.objects.filter(upload_id=upload_id)
+    claim_id = str(uuid.uuid4())
+    if chunks.exists() and not claim_csv_upload(upload_id, claim_id):
+        # Another run is working on the upload. Check again when its claim would
+        # run out, in case its worker was lost.
+        self.apply_async(
+            (upload_id,),
+            task_id=self.request.id,
+            countdown=settings.UPLOAD_CLAIM_TIMEOUT,
+        )
+        raise Ignore()
 
-    obs_ids = []
+    def renew_claim():
+        if not claim_csv_upload(upload_id, claim_id):
+            raise UploadClaimLostError()
+
+    progress_recorder = ProgressRecorder(self)
+    chunk_ids = list(chunks.order_by("chunk_index").values_list("id", flat=True))
+    row_count = Func("rows", function="jsonb_array_length", output_field=IntegerField())
+    observation_count = chunks.aggregate(count=Sum(row_count))["count"] or 0
+
+    # Saving each chunk counts as one more step, so the upload only reaches 100%
+    # once its observations have been saved
+    progress = ProgressThrottle(
+        lambda current, total: progress_recorder.set_progress(
+            current, total, description=""
+        ),
+        observation_count + len(chunk_ids),
+    )
 
-    observation_count = len(data)
     obs_index = 0
     confirmation_email = False
     obs_error_reference = None
+    obs_ids = []
+    claim_lost = False
 
     try:
-        for column in data:
-            # Check for data from the sample CSV file
-            if "SATHUB-SATELLITE" in column[0]:
-                raise UploadError(
-                    "File contains sample data. Please upload a valid file."
-                )
-
-            if len(column) != 27:
-                raise UploadError(
-                    f"Incorrect number of fields in csv file: expected 27, got {len(column)}."  # noqa: E501
-                )
+        for chunk_id in chunk_ids:
+            renew_claim()
+            chunk = UploadChunk.objects.get(id=chunk_id)
+            if chunk.satchecker_data is not None:
+                # Validated before the task was restarted
+                for column in chunk.rows:
+                    if not confirmation_email:
+                        confirmation_email = column[13]
+                obs_index += len(chunk.rows)
+                progress.update(obs_index)
+                continue
+
+            satchecker_data = []
+            with additional_data_pool(
+                csv_additional_data,
+                chunk.rows,
+                additional_data_args=csv_additional_data_args,
+            ) as satchecker_results:
+                for row_index, column in enumerate(chunk.rows):
+                    # Check for data from the sample CSV file
+                    if "SATHUB-SATELLITE" in column[0]:
+                        raise UploadError(
+                            "File contains sample data. Please upload a valid file."
+                        )
+
+                    if len(column) != 27:
+                        raise UploadError(
+                            f"Incorrect number of fields in csv file: expected 27, got {len(column)}."  # noqa: E501
+                        )
+
+                    # Satellite names are always upper case for some reason
+                    column[0] = column[0].upper()
+                    # Check if satellite is above the horizon
+                    additional_data = satchecker_results[row_index].result()
+
+                    # This gives the format
+                    # Observation x/y: satellite_name sat_number obs_time_utc
+                    obs_error_reference = (
+                        f"Observation {obs_index + 1}/{observation_count}: "
+                        f"{column[0]} {str(column[1])} {column[2]}"
+                    )
+
+                    if isinstance(additional_data, str):
+                        raise UploadError(additional_data + " - " + obs_error_reference)
+
+                    prepare_csv_row(column, additional_data, obs_error_reference)
+                    satchecker_data.append(
+                        [
+                            getattr(additional_data, field)
+                            for field in SatCheckerData._fields
+                        ]
+                    )
+
+                    if not confirmation_email:
+                        confirmation_email = column[13]
+                    progress.update(obs_index + 1)
+                    obs_index += 1
+
+            # Save the SatChecker data so this chunk isn't checked again if the
+            # task is restarted
+            chunk.satchecker_data = satchecker_data
+            chunk.save(update_fields=["satchecker_data"])
+
+        # All rows are valid - save them in bulk
+        obs_error_reference = None
+        for chunk_number, chunk_id in enumerate(chunk_ids, 1):
+            renew_claim()
+            chunk = UploadChunk.objects.get(id=chunk_id)
+            prepared = []
+            for column, values in zip(chunk.rows, chunk.satchecker_data, strict=True):
+                column[0] = column[0].upper()
+                prepared.append(prepare_csv_row(column, SatCheckerData(*values), ""))
+            saved = persist_observations(prepared, CSV_OBSERVATION_MATCH_FIELDS)
+            obs_ids.extend(obs_id for obs_id, _ in saved)
+            progress.update(observation_count + chunk_number)
+    except UploadClaimLostError:
+        # The run that took over finishes the upload
+        claim_lost = True
+        raise Ignore() from None
 
-            # Satellite names are always upper case for some reason
-            column[0] = column[0].upper()
-            # Check if satellite is above the horizon
-            additional_data = add_additional_data(
-                column[0],  # satellite_name
-                column[1],  # sat_number
-                column[2],  # obs_time_utc
-                float(column[6]),  # obs_lat_deg
-                float(column[7]),  # obs_long_deg
-                float(column[8]),  # obs_alt_m
-            )
-
-            # This gives the format
-            # Observation x/y: satellite_name sat_number obs_time_utc
-            obs_error_reference = (
-                f"Observation {obs_index + 1}/{observation_count}: "
-                f"{column[0]} {str(column[1])} {column[2]}"
-            )
-
-            if isinstance(additional_data, str):
-                raise UploadError(additional_data + " - " + obs_error_reference)
-
-            potentially_discrepant = is_potentially_discrepant(additional_data)
-
-            # Special error message cases
-            if column[4] == "" and column[5] != "":
-                error_message = (
-                    "Apparent magnitude uncertainty without apparent magnitude."
-                )
-                raise UploadError(error_message + " - " + obs_error_reference)
-
-            try:
-                obs_lat_deg = float(column[6])
-                obs_long_deg = float(column[7])
-                obs_alt_m = float(column[8])
-            except ValueError as e:
-                raise UploadError(
-                    f"Invalid value: {str(e)} - {obs_error_reference}"
-                ) from e
-
-            satellite = get_or_create_satellite(column[1], column[0], additional_data)
-
-            location, loc_created = Location.objects.get_or_create(
-                obs_lat_deg=obs_lat_deg,
-                obs_long_deg=obs_long_deg,
-                obs_alt_m=obs_alt_m,
-                defaults={
-                    "obs_lat_deg": obs_lat_deg,
-                    "obs_long_deg": obs_long_deg,
-                    "obs_alt_m": obs_alt_m,
-                    "date_added": timezone.now(),
-                },
-            )
-
-            orc_id_list = [item.strip() for item in column[14].split(",")]
-            if column[4] == "" and column[5] == "":
-                column[4] = None
-                column[5] = None
-
-            # Remove whitespace
-            observer_email = column[13].strip().lower()
-            observer_email = "".join(observer_email.split())
-
-            observation, obs_created = Observation.objects.get_or_create(
-                obs_time_utc=column[2],
-                obs_time_uncert_sec=column[3],
-                apparent_mag=column[4],
-                apparent_mag_uncert=column[5],
-                limiting_magnitude=column[9],
-                instrument=column[10],
-                obs_mode=column[11].upper(),
-                obs_filter=column[12],
-                obs_email=observer_email,
-                obs_orc_id=orc_id_list,
-                sat_ra_deg=column[15] if column[15] else None,
-                sat_dec_deg=column[16] if column[16] else None,
-                sigma_2_ra=column[17] if column[17] else None,
-                sigma_ra_sigma_dec=column[18] if column[18] else None,
-                sigma_2_dec=column[19] if column[19] else None,
-                range_to_sat_km=column[20] if column[20] else None,
-                range_to_sat_uncert_km=column[21] if column[21] else None,
-                range_rate_sat_km_s=column[22] if column[22] else None,
-                range_rate_sat_uncert_km_s=column[23] if column[23] else None,
-                comments=column[24],
-                data_archive_link=column[25],
-                mpc_code=column[26].strip().upper() if column[26] else None,
-                illuminated=additional_data.illuminated,
-                potentially_discrepant=potentially_discrepant,
-                satellite_id=satellite,
-                location_id=location,
-                defaults={
-                    "obs_time_utc": column[2],
-                    "obs_time_uncert_sec": column[3],
-                    "apparent_mag": column[4],
-                    "apparent_mag_uncert": column[5],
-                    "limiting_magnitude": column[9],
-                    "instrument": column[10],
-                    "obs_mode": column[11].upper(),
-                    "obs_filter": column[12],
-                    "obs_email": observer_email,
-                    "obs_orc_id": orc_id_list,
-                    "sat_ra_deg": column[15] if column[15] else None,
-                    "sat_dec_deg": column[16] if column[16] else None,
-                    "sigma_2_ra": column[17] if column[17] else None,
-                    "sigma_ra_sigma_dec": column[18] if column[18] else None,
-                    "sigma_2_dec": column[19] if column[19] else None,
-                    "range_to_sat_km": column[20] if column[20] else None,
-                    "range_to_sat_uncert_km": column[21] if column[21] else None,
-                    "range_rate_sat_km_s": column[22] if column[22] else None,
-                    "range_rate_sat_uncert_km_s": column[23] if column[23] else None,
-                    "comments": column[24],
-                    "data_archive_link": column[25],
-                    "mpc_code": column[26].strip().upper() if column[26] else None,
-                    "phase_angle": additional_data.phase_angle,
-                    "range_to_sat_km_satchecker": additional_data.range_to_sat,
-                    "range_rate_sat_km_s_satchecker": additional_data.range_rate,
-                    "sat_ra_deg_satchecker": additional_data.sat_ra_deg,
-                    "sat_dec_deg_satchecker": additional_data.sat_dec_deg,
-                    "ddec_deg_s_satchecker": additional_data.ddec_deg_s,
-                    "dra_cosdec_deg_s_satchecker": additional_data.dra_cosdec_deg_s,
-                    "alt_deg_satchecker": additional_data.alt_deg,
-                    "az_deg_satchecker": additional_data.az_deg,
-                    "sat_altitude_km_satchecker": (additional_data.sat_altitude_km),
-                    "solar_elevation_deg_satchecker": (
-                        additional_data.solar_elevation_deg
-                    ),
-                    "solar_azimuth_deg_satchecker": additional_data.solar_azimuth_deg,
-                    "illuminated": additional_data.illuminated,
-                    "potentially_discrepant": potentially_discrepant,
-                    "satellite_id": satellite,
-                    "location_id": location,
-                    "date_added": timezone.now(),
-                },
-            )
-
-            obs_ids.append(observation.id)
-            if not confirmation_email:
-                confirmation_email = column[13]
-            progress_recorder.set_progress(
-                obs_index + 1, observation_count, description=""
-            )
-            obs_index += 1
     except IndexError as e:
         raise UploadError(str(e) + " - check number of fields in csv file.") from e
 
@@ -287,6 +376,14 @@ def process_upload_csv(
             raise UploadError(msg + " - " + obs_error_reference) from e
         else:
             raise UploadError(msg) from e
+    finally:
+        # Restarted tasks resume from the saved chunks, but once the task finishes,
+        # successfully or not, they aren't needed anymore
+        if not claim_lost:
+            UploadChunk.objects.filter(upload_id=upload_id).delete()
+        # Chunks saved before an error are kept, so the stats may have changed
+        if obs_ids:
+            invalidate_stats()
 
     send_confirmation_email(obs_ids, confirmation_email)
 
@@ -333,13 +430,16 @@ def process_upload_api(
             }
         )
         summary["rejected"] += 1
+        progress.update(idx + 1)
+
+    def report_progress(current: int, total: int) -> None:
         self.update_state(
             state="PROGRESS",
             meta={
-                "current": idx + 1,
-                "total": observation_count,
-                "percent": int((idx + 1) / observation_count * 100),
-                "description": f"Processing observation {idx + 1}/{observation_count}",
+                "current": current,
+                "total": total,
+                "percent": int(current / total * 100),
+                "description": f"Processing observation {current}/{total}",
                 "created_at": created_at,
             },
         )
@@ -356,8 +456,10 @@ def process_upload_api(
     )
 
     obs_ids = []
+    prepared = []
     rejected_observations = []
     observation_count = len(observations)
+    progress = ProgressThrottle(report_progress, observation_count)
 
     summary = {"total": len(observations), "created": 0, "duplicates": 0, "rejected": 0}
 
@@ -365,226 +467,180 @@ def process_upload_api(
     if not notification_email:
         notification_email = observations[0]["obs_email"]
 
-    # processing here
-    for idx, obs_data in enumerate(observations):
-
-        # Verify the observation data
+    # Verify the observation data
+    for obs_data in observations:
         if obs_data["satellite_name"] is None:
             obs_data["satellite_name"] = ""
         else:
             obs_data["satellite_name"] = obs_data["satellite_name"].upper()
 
-        # get info from SatChecker
-        try:
-            # Convert datetime to string format that astropy can parse
-            # (no timezone info)
-            obs_time_str = obs_data["obs_time_utc"].replace(tzinfo=None).isoformat()
-            additional_data = add_additional_data(
-                obs_data["satellite_name"],
-                obs_data["satellite_number"],
-                obs_time_str,
-                obs_data["obs_lat_deg"],
-                obs_data["obs_long_deg"],
-                obs_data["obs_alt_m"],
-            )
-        except Exception as e:
-            reject_observation(idx, obs_data, str(e))
-            continue
-
-        # rejected for invalid position or name/ID mismatch (or other...)
-        if isinstance(additional_data, str):
-            reject_observation(idx, obs_data, additional_data)
-            continue
-
-        # rejected if validation returned False
-        if isinstance(additional_data, bool):
-            reject_observation(idx, obs_data, "Satellite position validation failed.")
-            continue
-
-        potentially_discrepant = is_potentially_discrepant(additional_data)
-
-        if (
-            obs_data["apparent_mag"] is not None
-            and obs_data["apparent_mag_uncert"] is None
-        ):
-            reject_observation(
-                idx,
-                obs_data,
-                "Apparent magnitude uncertainty without apparent magnitude.",
-            )
-            continue
-
-        satellite = get_or_create_satellite(
-            obs_data["satellite_number"], obs_data["satellite_name"], additional_data
-        )
+    # processing here
+    with additional_data_pool(
+        api_additional_data,
+        observations,
+        additional_data_args=api_additional_data_args,
+    ) as satchecker_results:
+        for idx, obs_data in enumerate(observations):
+            # get info from SatChecker
+            try:
+                additional_data = satchecker_results[idx].result()
+            except Exception as e:
+                reject_observation(idx, obs_data, str(e))
+                continue
 
-        location, loc_created = Location.objects.get_or_create(
-            obs_lat_deg=obs_data["obs_lat_deg"],
-            obs_long_deg=obs_data["obs_long_deg"],
-            obs_alt_m=obs_data["obs_alt_m"],
-            defaults={
-                "obs_lat_deg": obs_data["obs_lat_deg"],
-                "obs_long_deg": obs_data["obs_long_deg"],
-                "obs_alt_m": obs_data["obs_alt_m"],
-                "date_added": timezone.now(),
-            },
-        )
+            # rejected for invalid position or name/ID mismatch (or other...)
+            if isinstance(additional_data, str):
+                reject_observation(idx, obs_data, additional_data)
+                continue
 
-        observation, obs_created = Observation.objects.get_or_create(
-            obs_time_utc=obs_data["obs_time_utc"],
-            obs_time_uncert_sec=obs_data["obs_time_uncert_sec"],
-            apparent_mag=obs_data["apparent_mag"],
-            apparent_mag_uncert=obs_data["apparent_mag_uncert"],
-            limiting_magnitude=obs_data["limiting_magnitude"],
-            instrument=obs_data["instrument"],
-            obs_mode=obs_data["obs_mode"].upper(),
-            obs_filter=obs_data["obs_filter"],
-            obs_email=obs_data["obs_email"],
-            obs_orc_id=obs_data["obs_orc_id"],
-            sat_ra_deg=obs_data["sat_ra_deg"] if obs_data["sat_ra_deg"] else None,
-            sat_dec_deg=obs_data["sat_dec_deg"] if obs_data["sat_dec_deg"] else None,
-            sigma_2_ra=obs_data["sigma_2_ra"] if obs_data["sigma_2_ra"] else None,
-            sigma_ra_sigma_dec=(
-                obs_data["sigma_ra_sigma_dec"]
-                if obs_data["sigma_ra_sigma_dec"]
-                else None
-            ),
-            sigma_2_dec=obs_data["sigma_2_dec"] if obs_data["sigma_2_dec"] else None,
-            range_to_sat_km=(
-                obs_data["range_to_sat_km"] if obs_data["range_to_sat_km"] else None
-            ),
-            range_to_sat_uncert_km=(
-                obs_data["range_to_sat_uncert_km"]
-                if obs_data["range_to_sat_uncert_km"]
-                else None
-            ),
-            range_rate_sat_km_s=(
-                obs_data["range_rate_sat_km_s"]
-                if obs_data["range_rate_sat_km_s"]
-                else None
-            ),
-            range_rate_sat_uncert_km_s=(
-                obs_data["range_rate_sat_uncert_km_s"]
-                if obs_data["range_rate_sat_uncert_km_s"]
-                else None
-            ),
-            comments=obs_data["comments"] if obs_data["comments"] else None,
-            data_archive_link=(
-                obs_data["data_archive_link"] if obs_data["data_archive_link"] else None
-            ),
-            mpc_code=(
-                obs_data["mpc_code"].strip().upper() if obs_data["mpc_code"] else None
-            ),
-            phase_angle=additional_data.phase_angle,
-            range_to_sat_km_satchecker=additional_data.range_to_sat,
-            range_rate_sat_km_s_satchecker=additional_data.range_rate,
-            sat_ra_deg_satchecker=additional_data.sat_ra_deg,
-            sat_dec_deg_satchecker=additional_data.sat_dec_deg,
-            ddec_deg_s_satchecker=additional_data.ddec_deg_s,
-            dra_cosdec_deg_s_satchecker=additional_data.dra_cosdec_deg_s,
-            alt_deg_satchecker=additional_data.alt_deg,
-            az_deg_satchecker=additional_data.az_deg,
-            sat_altitude_km_satchecker=(additional_data.sat_altitude_km),
-            solar_elevation_deg_satchecker=additional_data.solar_elevation_deg,
-            solar_azimuth_deg_satchecker=additional_data.solar_azimuth_deg,
-            illuminated=additional_data.illuminated,
-            potentially_discrepant=potentially_discrepant,
-            satellite_id=satellite,
-            location_id=location,
-            defaults={
-                "obs_time_utc": obs_data["obs_time_utc"],
-                "obs_time_uncert_sec": obs_data["obs_time_uncert_sec"],
-                "apparent_mag": obs_data["apparent_mag"],
-                "apparent_mag_uncert": obs_data["apparent_mag_uncert"],
-                "limiting_magnitude": obs_data["limiting_magnitude"],
-                "instrument": obs_data["instrument"],
-                "obs_mode": obs_data["obs_mode"].upper(),
-                "obs_filter": obs_data["obs_filter"],
-                "obs_email": obs_data["obs_email"],
-                "obs_orc_id": obs_data["obs_orc_id"],
-                "sat_ra_deg": (
-                    obs_data["sat_ra_deg"] if obs_data["sat_ra_deg"] else None
-                ),
-                "sat_dec_deg": (
-                    obs_data["sat_dec_deg"] if obs_data["sat_dec_deg"] else None
-                ),
-                "sigma_2_ra": (
-                    obs_data["sigma_2_ra"] if obs_data["sigma_2_ra"] else None
-                ),
-                "sigma_ra_sigma_dec": (
-                    obs_data["sigma_ra_sigma_dec"]
-                    if obs_data["sigma_ra_sigma_dec"]
-                    else None
-                ),
-                "sigma_2_dec": (
-                    obs_data["sigma_2_dec"] if obs_data["sigma_2_dec"] else None
-                ),
-                "range_to_sat_km": (
-                    obs_data["range_to_sat_km"] if obs_data["range_to_sat_km"] else None
-                ),
-                "range_to_sat_uncert_km": (
-                    obs_data["range_to_sat_uncert_km"]
-                    if obs_data["range_to_sat_uncert_km"]
-                    else None
-                ),
-                "range_rate_sat_km_s": (
-                    obs_data["range_rate_sat_km_s"]
-                    if obs_data["range_rate_sat_km_s"]
-                    else None
-                ),
-                "range_rate_sat_uncert_km_s": (
-                    obs_data["range_rate_sat_uncert_km_s"]
-                    if obs_data["range_rate_sat_uncert_km_s"]
-                    else None
-                ),
-                "comments": obs_data["comments"] if obs_data["comments"] else None,
-                "data_archive_link": (
-                    obs_data["data_archive_link"]
-                    if obs_data["data_archive_link"]
-                    else None
-                ),
-                "mpc_code": (
-                    obs_data["mpc_code"].strip().upper()
-                    if obs_data["mpc_code"]
-                    else None
-                ),
-                "phase_angle": additional_data.phase_angle,
-                "range_to_sat_km_satchecker": additional_data.range_to_sat,
-                "range_rate_sat_km_s_satchecker": additional_data.range_rate,
-                "sat_ra_deg_satchecker": additional_data.sat_ra_deg,
-                "sat_dec_deg_satchecker": additional_data.sat_dec_deg,
-                "ddec_deg_s_satchecker": additional_data.ddec_deg_s,
-                "dra_cosdec_deg_s_satchecker": additional_data.dra_cosdec_deg_s,
-                "alt_deg_satchecker": additional_data.alt_deg,
-                "az_deg_satchecker": additional_data.az_deg,
-                "sat_altitude_km_satchecker": (additional_data.sat_altitude_km),
-                "solar_elevation_deg_satchecker": (additional_data.solar_elevation_deg),
-                "solar_azimuth_deg_satchecker": additional_data.solar_azimuth_deg,
-                "illuminated": additional_data.illuminated,
-                "potentially_discrepant": potentially_discrepant,
-                "satellite_id": satellite,
-                "location_id": location,
-                "date_added": timezone.now(),
-            },
-        )
+            # rejected if validation returned False
+            if isinstance(additional_data, bool):
+                reject_observation(
+                    idx, obs_data, "Satellite position validation failed."
+                )
+                continue
+
+            potentially_discrepant = is_potentially_discrepant(additional_data)
+
+            if (
+                obs_data["apparent_mag"] is not None
+                and obs_data["apparent_mag_uncert"] is None
+            ):
+                reject_observation(
+                    idx,
+                    obs_data,
+                    "Apparent magnitude uncertainty without apparent magnitude.",
+                )
+                continue
 
-        obs_ids.append(observation.id)
+            try:
+                prepared.append(
+                    prepare_observation(
+                        {
+                            "obs_time_utc": obs_data["obs_time_utc"],
+                            "obs_time_uncert_sec": obs_data["obs_time_uncert_sec"],
+                            "apparent_mag": obs_data["apparent_mag"],
+                            "apparent_mag_uncert": obs_data["apparent_mag_uncert"],
+                            "limiting_magnitude": obs_data["limiting_magnitude"],
+                            "instrument": obs_data["instrument"],
+                            "obs_mode": obs_data["obs_mode"].upper(),
+                            "obs_filter": obs_data["obs_filter"],
+                            "obs_email": obs_data["obs_email"],
+                            "obs_orc_id": [
+                                orc_id.strip().upper()
+                                for orc_id in obs_data["obs_orc_id"]
+                            ],
+                            "sat_ra_deg": (
+                                obs_data["sat_ra_deg"]
+                                if obs_data["sat_ra_deg"]
+                                else None
+                            ),
+                            "sat_dec_deg": (
+                                obs_data["sat_dec_deg"]
+                                if obs_data["sat_dec_deg"]
+                                else None
+                            ),
+                            "sigma_2_ra": (
+                                obs_data["sigma_2_ra"]
+                                if obs_data["sigma_2_ra"]
+                                else None
+                            ),
+                            "sigma_ra_sigma_dec": (
+                                obs_data["sigma_ra_sigma_dec"]
+                                if obs_data["sigma_ra_sigma_dec"]
+                                else None
+                            ),
+                            "sigma_2_dec": (
+                                obs_data["sigma_2_dec"]
+                                if obs_data["sigma_2_dec"]
+                                else None
+                            ),
+                            "range_to_sat_km": (
+                                obs_data["range_to_sat_km"]
+                                if obs_data["range_to_sat_km"]
+                                else None
+                            ),
+                            "range_to_sat_uncert_km": (
+                                obs_data["range_to_sat_uncert_km"]
+                                if obs_data["range_to_sat_uncert_km"]
+                                else None
+                            ),
+                            "range_rate_sat_km_s": (
+                                obs_data["range_rate_sat_km_s"]
+                                if obs_data["range_rate_sat_km_s"]
+                                else None
+                            ),
+                            "range_rate_sat_uncert_km_s": (
+                                obs_data["range_rate_sat_uncert_km_s"]
+                                if obs_data["range_rate_sat_uncert_km_s"]
+                                else None
+                            ),
+                            "comments": (
+                                obs_data["comments"] if obs_data["comments"] else None
+                            ),
+                            "data_archive_link": (
+                                obs_data["data_archive_link"]
+                                if obs_data["data_archive_link"]
+                                else None
+                            ),
+                            "mpc_code": (
+                                obs_data["mpc_code"].strip().upper()
+                                if obs_data["mpc_code"]
+                                else None
+                            ),
+                            "phase_angle": additional_data.phase_angle,
+                            "range_to_sat_km_satchecker": additional_data.range_to_sat,
+                            "range_rate_sat_km_s_satchecker": (
+                                additional_data.range_rate
+                            ),
+                            "sat_ra_deg_satchecker": additional_data.sat_ra_deg,
+                            "sat_dec_deg_satchecker": additional_data.sat_dec_deg,
+                            "ddec_deg_s_satchecker": additional_data.ddec_deg_s,
+                            "dra_cosdec_deg_s_satchecker": (
+                                additional_data.dra_cosdec_deg_s
+                            ),
+                            "alt_deg_satchecker": additional_data.alt_deg,
+                            "az_deg_satchecker": additional_data.az_deg,
+                            "sat_altitude_km_satchecker": (
+                                additional_data.sat_altitude_km
+                            ),
+                            "solar_elevation_deg_satchecker": (
+                                additional_data.solar_elevation_deg
+                            ),
+                            "solar_azimuth_deg_satchecker": (
+                                additional_data.solar_azimuth_deg
+                            ),
+                            "illuminated": additional_data.illuminated,
+                            "potentially_discrepant": potentially_discrepant,
+                            "date_added": timezone.now(),
+                        },
+                        {
+                            "obs_lat_deg": obs_data["obs_lat_deg"],
+                            "obs_long_deg": obs_data["obs_long_deg"],
+                            "obs_alt_m": obs_data["obs_alt_m"],
+                            "date_added": timezone.now(),
+                        },
+                        obs_data["satellite_number"],
+                        obs_data["satellite_name"],
+                        additional_data,
+                    )
+                )
+            except ValidationError as e:
+                reject_observation(idx, obs_data, " ".join(e.messages))
+                continue
+
+            # Update progress for new observation
+            progress.update(idx + 1)
+
+    # Save all accepted observations in bulk
+    for obs_id, obs_created in persist_observations(prepared):
+        obs_ids.append(obs_id)
         if obs_created:
             summary["created"] += 1
         else:
             summary["duplicates"] += 1
-
-        # Update progress for new observation
-        self.update_state(
-            state="PROGRESS",
-            meta={
-                "current": idx + 1,
-                "total": observation_count,
-                "percent": int((idx + 1) / observation_count * 100),
-                "description": f"Processing observation {idx + 1}/{observation_count}",
-                "created_at": created_at,
-            },
-        )
+    if summary["created"]:
+        invalidate_stats()
 
     # only send confirmation email if needed
     if send_confirmation and obs_ids:
@@ -597,3 +653,24 @@ def process_upload_api(
         "obs_ids": obs_ids,
         "created_at": created_at,
     }
+
+
+@shared_task
+def build_archive_snapshot(force: bool = False) -> bool:
+    """
+    Rebuilds the full-archive download if observations have changed since the last
+    time it was built. Scheduled by CELERY_BEAT_SCHEDULE.
+    """
+    return csv_utils.build_archive_snapshot(force)
+
+
+@shared_task
+def recompute_observation_stats() -> int:
+    """
+    Rebuilds the observation statistics, correcting any drift from observations
+    changed outside of the upload tasks. Scheduled by CELERY_BEAT_SCHEDULE.
+
+    Returns:
+        int: The number of observations.
+    """
+    return stats_utils.recompute_observation_stats().observation_count
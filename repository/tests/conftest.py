@@ -1,4 +1,5 @@
 import pytest
+from django.core.cache import cache
 
 
 @pytest.fixture(scope="function", autouse=True)
@@ -13,3 +14,4 @@ def use_locmem_cache_for_tests(settings):
             "LOCATION": "test-cache",
         }
     }
+    cache.clear()
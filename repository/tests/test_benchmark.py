@@ -1,8 +1,14 @@
+import json
+
+import numpy as np
 import pytest
 import requests
 from django.urls import reverse
 from django.utils import timezone
+from ninja.renderers import JSONRenderer
 
+from repository.api.renderers import ORJSONRenderer, schema_rows, schema_values
+from repository.api.schemas import ObservationSchema
 from repository.models import Location, Observation, Satellite
 
 base_url = "https://score.dev.aws.noirlab.edu/api"
@@ -81,3 +87,62 @@ def test_benchmark_view_satellite_observations(benchmark, client, benchmark_data
     response = benchmark(lambda: client.get(url))
     assert response.status_code == 200
     assert response.json()["total"] == 1000
+
+
+def observations_page():
+    return Observation.objects.select_related("location_id", "satellite_id").order_by(
+        "id"
+    )[:1000]
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group="api-observations-page")
+def test_benchmark_api_page_schema(benchmark, benchmark_data):
+    # Test rendering a page of the API by validating model instances (@paginate)
+    def render_page():
+        items = [
+            ObservationSchema.from_orm(obs).model_dump() for obs in observations_page()
+        ]
+        return JSONRenderer().render(None, {"items": items}, response_status=200)
+
+    result = benchmark(render_page)
+    assert len(json.loads(result)["items"]) == 1000
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group="api-observations-page")
+def test_benchmark_api_page_values(benchmark, benchmark_data):
+    # Test rendering a page of the API from database values (@paginate_values)
+    def render_page():
+        items = schema_rows(
+            schema_values(observations_page(), ObservationSchema), ObservationSchema
+        )
+        return ORJSONRenderer().render(None, {"items": items}, response_status=200)
+
+    result = benchmark(render_page)
+    assert len(json.loads(result)["items"]) == 1000
+
+
+@pytest.fixture
+def location_coordinates():
+    rng = np.random.default_rng(0)
+    return rng.uniform(-90, 90, 10000), rng.uniform(-180, 180, 10000)
+
+
+@pytest.mark.benchmark(group="location-distances")
+def test_benchmark_location_distance_to(benchmark, location_coordinates):
+    # Test distances from 10000 locations with the scalar method
+    locations = [
+        Location(obs_lat_deg=lat, obs_long_deg=lon)
+        for lat, lon in zip(*location_coordinates, strict=True)
+    ]
+    result = benchmark(lambda: [loc.distance_to(33, -117) for loc in locations])
+    assert len(result) == 10000
+
+
+@pytest.mark.benchmark(group="location-distances")
+def test_benchmark_location_distances_to(benchmark, location_coordinates):
+    # Test distances from 10000 locations with the vectorized method
+    latitudes, longitudes = location_coordinates
+    result = benchmark(Location.distances_to, latitudes, longitudes, 33, -117)
+    assert len(result) == 10000
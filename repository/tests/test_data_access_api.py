@@ -1,10 +1,20 @@
+import json
 import os
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
 
+from django.conf import settings
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from ninja.responses import NinjaJSONEncoder
 from ninja.testing import TestClient
 
 from repository.api import api
+from repository.api.renderers import ORJSONRenderer
+from repository.api.schemas import ObservationSchema
 from repository.models import Location, Observation, Satellite
 
 
@@ -76,7 +86,7 @@ class TestDataAccessAPI(TestCase):
     def test_get_satellite_observations(self):
         """Test getting all observations for a satellite"""
         response = self.client.get(
-            f"/satellites/{self.satellite.sat_number}/observations"
+            f"/satellites/{self.satellite.sat_number}/observations?count=true"
         )
         self.assertEqual(response.status_code, 200)
         data = response.json()
@@ -92,7 +102,7 @@ class TestDataAccessAPI(TestCase):
         self.assertIn(self.observation2.id, observation_ids)
 
         # Test with invalid satellite
-        response = self.client.get("/satellites/-1/observations?offset=1&limit=1")
+        response = self.client.get("/satellites/-1/observations?limit=1")
         self.assertEqual(response.status_code, 200)
         data = response.json()
         self.assertEqual(len(data.get("items", [])), 0)
@@ -101,7 +111,7 @@ class TestDataAccessAPI(TestCase):
         """Test searching observations with filters"""
         # In range
         response = self.client.get(
-            f"/observations/search?satellite_number={self.satellite.sat_number}&min_magnitude={11.0}&max_magnitude={9.0}"
+            f"/observations/search?satellite_number={self.satellite.sat_number}&min_magnitude={11.0}&max_magnitude={9.0}&count=true"
         )
         self.assertEqual(response.status_code, 200)
         data = response.json()
@@ -114,7 +124,7 @@ class TestDataAccessAPI(TestCase):
 
         # Out of range
         response = self.client.get(
-            f"/observations/search?satellite_number={self.satellite.sat_number}&min_magnitude={6.0}&max_magnitude={5.0}"
+            f"/observations/search?satellite_number={self.satellite.sat_number}&min_magnitude={6.0}&max_magnitude={5.0}&count=true"
         )
         self.assertEqual(response.status_code, 200)
         data = response.json()
@@ -122,7 +132,7 @@ class TestDataAccessAPI(TestCase):
         self.assertEqual(len(data["items"]), 0)
 
         response = self.client.get(
-            f"/observations/search?satellite_number={self.satellite.sat_number}&min_magnitude={9.0}&max_magnitude={11.0}"
+            f"/observations/search?satellite_number={self.satellite.sat_number}&min_magnitude={9.0}&max_magnitude={11.0}&count=true"
         )
         self.assertEqual(response.status_code, 200)
         data = response.json()
@@ -138,6 +148,17 @@ class TestDataAccessAPI(TestCase):
         self.assertEqual(data[0]["sat_number"], self.satellite.sat_number)
         self.assertEqual(data[0]["sat_name"], self.satellite.sat_name)
 
+    def test_get_satellites_by_name(self):
+        """Test filtering satellites by part of the name, ignoring case"""
+        Satellite.objects.create(sat_name="STARLINK-1234", sat_number=44444)
+
+        response = self.client.get("/satellites/?name=link-12")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([sat["sat_number"] for sat in response.json()], [44444])
+
+        response = self.client.get("/satellites/?name=oneweb")
+        self.assertEqual(response.json(), [])
+
     def test_get_observations(self):
         """Test getting all observations"""
         response = self.client.get("/observations")
@@ -153,3 +174,200 @@ class TestDataAccessAPI(TestCase):
         observation_ids = {obs["id"] for obs in data["items"]}
         self.assertIn(self.observation.id, observation_ids)
         self.assertIn(self.observation2.id, observation_ids)
+
+    def test_get_observations_cursor(self):
+        """Test paging through observations with the next cursor"""
+        response = self.client.get("/observations?limit=1")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([obs["id"] for obs in data["items"]], [self.observation.id])
+        self.assertIsNone(data["count"])
+        self.assertIsNotNone(data["next_cursor"])
+
+        response = self.client.get(
+            f"/observations?limit=1&cursor={data['next_cursor']}"
+        )
+        data = response.json()
+        self.assertEqual([obs["id"] for obs in data["items"]], [self.observation2.id])
+        self.assertIsNone(data["next_cursor"])
+
+        # Recent observations page backwards through time
+        response = self.client.get("/observations/recent?limit=1&count=true")
+        data = response.json()
+        self.assertEqual(data["count"], 2)
+        first = data["items"][0]["id"]
+        response = self.client.get(
+            f"/observations/recent?limit=1&cursor={data['next_cursor']}"
+        )
+        second = response.json()["items"][0]["id"]
+        self.assertEqual({first, second}, {self.observation.id, self.observation2.id})
+
+        response = self.client.get("/observations?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_observations_matches_schema(self):
+        """Test that pages built from database values match the response schema"""
+        self.observation.obs_orc_id = ["0000-0000-0000-0000", "0000-0000-0000-0001"]
+        self.observation.comments = "Test comment"
+        self.observation.illuminated = True
+        self.observation.save()
+
+        response = self.client.get("/observations?count=true")
+        self.assertEqual(response.status_code, 200)
+
+        observations = Observation.objects.select_related(
+            "location_id", "satellite_id"
+        ).order_by("id")
+        expected = {
+            "items": [
+                ObservationSchema.from_orm(obs).model_dump() for obs in observations
+            ],
+            "next_cursor": None,
+            "count": 2,
+        }
+        self.assertEqual(
+            response.content,
+            ORJSONRenderer().render(None, expected, response_status=200),
+        )
+        # Values are formatted the same as with the default JSON encoder
+        self.assertEqual(
+            response.json(), json.loads(json.dumps(expected, cls=NinjaJSONEncoder))
+        )
+        self.assertTrue(response.json()["items"][0]["obs_time_utc"].endswith("Z"))
+
+    def test_get_observations_fields(self):
+        """Test returning only some fields of each observation"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/observations/recent?limit=1&fields=apparent_mag,obs_time_utc"
+            )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(list(data["items"][0]), ["obs_time_utc", "apparent_mag"])
+        # Only the observation table is read
+        self.assertNotIn("JOIN", queries[0]["sql"])
+
+        # The cursor still works without the ordering fields in the response
+        response = self.client.get(
+            "/observations/recent?limit=1&fields=apparent_mag,obs_time_utc"
+            f"&cursor={data['next_cursor']}"
+        )
+        self.assertEqual(len(response.json()["items"]), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                f"/satellites/{self.satellite.sat_number}/observations"
+                "?fields=id,satellite_name"
+            )
+        # Only the satellite table is joined for the satellite name
+        sql = queries[-1]["sql"]
+        self.assertIn('JOIN "satellite"', sql)
+        self.assertNotIn('JOIN "location"', sql)
+        self.assertEqual(
+            response.json()["items"][0],
+            {"satellite_name": "Test Satellite", "id": self.observation.id},
+        )
+
+        response = self.client.get(
+            f"/observations/{self.observation.id}?fields=id,obs_lat_deg"
+        )
+        self.assertEqual(
+            response.json(), {"obs_lat_deg": 20.0, "id": self.observation.id}
+        )
+
+        Observation.objects.update(date_added=timezone.now() - timedelta(hours=1))
+        response = self.client.get("/observations/changes?fields=id,date_added")
+        self.assertEqual(list(response.json()["items"][0]), ["id", "date_added"])
+
+        response = self.client.get("/observations?fields=id,obs_email")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("obs_email", response.json()["error"])
+
+    def test_get_observation_stats(self):
+        """Test getting the observation statistics"""
+        response = self.client.get("/observations/stats")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["total_observations"], 2)
+        self.assertEqual(data["total_satellites"], 1)
+        self.assertEqual(
+            data["magnitude_stats"],
+            {"average": 7.0, "brightest": 4.0, "faintest": 10.0},
+        )
+        self.assertEqual(
+            data["most_observed_satellites"],
+            [{"number": 12345, "name": "Test Satellite", "observations": 2}],
+        )
+
+    def test_get_observation_changes(self):
+        """Test paging through the changes feed and resuming from its cursor"""
+        Observation.objects.filter(id=self.observation.id).update(
+            date_added=timezone.now() - timedelta(days=2)
+        )
+        Observation.objects.filter(id=self.observation2.id).update(
+            date_added=timezone.now() - timedelta(hours=1)
+        )
+
+        response = self.client.get("/observations/changes?limit=1")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([obs["id"] for obs in data["items"]], [self.observation.id])
+        self.assertIn("date_added", data["items"][0])
+        self.assertTrue(data["has_more"])
+
+        response = self.client.get(
+            f"/observations/changes?limit=1&cursor={data['next_cursor']}"
+        )
+        data = response.json()
+        self.assertEqual([obs["id"] for obs in data["items"]], [self.observation2.id])
+        self.assertFalse(data["has_more"])
+
+        # Nothing new yet, the cursor stays where it was
+        cursor = data["next_cursor"]
+        response = self.client.get(f"/observations/changes?cursor={cursor}")
+        data = response.json()
+        self.assertEqual(data["items"], [])
+        self.assertEqual(data["next_cursor"], cursor)
+
+        # Only the observations added after the given time
+        since = urlencode({"since": (timezone.now() - timedelta(days=1)).isoformat()})
+        response = self.client.get(f"/observations/changes?{since}")
+        data = response.json()
+        self.assertEqual([obs["id"] for obs in data["items"]], [self.observation2.id])
+
+        response = self.client.get("/observations/changes?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_observation_changes_late_commit(self):
+        """Test that observations committed after a sync with an earlier date_added
+        are returned by the next sync"""
+        now = timezone.now()
+        Observation.objects.filter(id=self.observation.id).update(
+            date_added=now - timedelta(hours=1)
+        )
+        # Just added, so not included yet
+        Observation.objects.filter(id=self.observation2.id).update(
+            date_added=now - timedelta(seconds=30)
+        )
+
+        response = self.client.get("/observations/changes")
+        data = response.json()
+        self.assertEqual([obs["id"] for obs in data["items"]], [self.observation.id])
+
+        # An upload chunk that was prepared before the sync commits after it
+        late = Observation.objects.get(id=self.observation.id)
+        late.pk = None
+        late.save()
+        Observation.objects.filter(id=late.id).update(
+            date_added=now - timedelta(minutes=1)
+        )
+
+        later = now + timedelta(seconds=settings.CHANGES_FEED_DELAY)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            response = self.client.get(
+                f"/observations/changes?cursor={data['next_cursor']}"
+            )
+        self.assertEqual(
+            [obs["id"] for obs in response.json()["items"]],
+            [late.id, self.observation2.id],
+        )
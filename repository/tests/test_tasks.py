@@ -1,8 +1,13 @@
+from datetime import timedelta
+
 import pytest
+from celery.exceptions import Ignore
 from django.utils import timezone
 
-from repository.models import Observation, Satellite
+from repository.models import Observation, Satellite, UploadChunk
 from repository.tasks import UploadError, process_upload_csv
+from repository.utils.general_utils import SatCheckerData
+from repository.utils.upload_utils import claim_csv_upload, stage_csv_upload
 
 
 @pytest.mark.django_db
@@ -39,21 +44,21 @@ def test_process_upload_valid_data(mocker):
             "",
         ]
     ]
-    result = process_upload_csv(data)
+    result = process_upload_csv(stage_csv_upload(data))
     assert result["status"] == "success"
     assert isinstance(result["obs_ids"], list)
     assert isinstance(result["date_added"], str)
     assert isinstance(result["email"], str)
 
     # Re-upload same data - should not create duplicate
-    result2 = process_upload_csv(data)
+    result2 = process_upload_csv(stage_csv_upload(data))
     assert result2["obs_ids"][0] == result["obs_ids"][0]
     assert Observation.objects.filter(satellite_id__sat_number="59588").count() == 1
 
     # Upload with different apparent_mag - should create new record
     data_different_mag = [data[0][:]]
     data_different_mag[0][4] = 5.0
-    result3 = process_upload_csv(data_different_mag)
+    result3 = process_upload_csv(stage_csv_upload(data_different_mag))
     assert result3["obs_ids"][0] != result["obs_ids"][0]
     assert Observation.objects.filter(satellite_id__sat_number="59588").count() == 2
 
@@ -92,7 +97,7 @@ def test_process_upload_valid_data_zero_altitude(mocker):
             "",
         ]
     ]
-    result = process_upload_csv(data)
+    result = process_upload_csv(stage_csv_upload(data))
     assert result["status"] == "success"
     assert isinstance(result["obs_ids"], list)
     assert isinstance(result["date_added"], str)
@@ -136,7 +141,7 @@ def test_process_upload_sample_data(mocker):
     with pytest.raises(
         UploadError, match="File contains sample data. Please upload a valid file."
     ):
-        process_upload_csv(data)
+        process_upload_csv(stage_csv_upload(data))
 
 
 @pytest.mark.django_db
@@ -174,7 +179,7 @@ def test_process_upload_incorrect_number_of_fields(mocker):
         ]
     ]
     with pytest.raises(UploadError, match="Incorrect number of fields in csv file."):
-        process_upload_csv(data)
+        process_upload_csv(stage_csv_upload(data))
 
 
 @pytest.mark.django_db
@@ -213,7 +218,7 @@ def test_process_upload_value_error(mocker):
         ]
     ]
     with pytest.raises(UploadError):
-        process_upload_csv(data)
+        process_upload_csv(stage_csv_upload(data))
 
 
 @pytest.mark.django_db
@@ -252,7 +257,7 @@ def test_process_upload_validation_error(mocker):
         ]
     ]
     with pytest.raises(UploadError):
-        process_upload_csv(data)
+        process_upload_csv(stage_csv_upload(data))
 
 
 @pytest.mark.django_db
@@ -291,7 +296,7 @@ def test_process_upload_general_exception(mocker):
         ]
     ]
     with pytest.raises(UploadError):
-        process_upload_csv(data)
+        process_upload_csv(stage_csv_upload(data))
 
 
 @pytest.mark.django_db
@@ -330,7 +335,7 @@ def test_process_upload_name_id_mismatch(mocker):
     ]
 
     with pytest.raises(UploadError):
-        process_upload_csv(data)
+        process_upload_csv(stage_csv_upload(data))
 
 
 @pytest.mark.django_db
@@ -378,7 +383,7 @@ def test_process_upload_existing_satellite(mocker):
         ]
     ]
 
-    result = process_upload_csv(data)
+    result = process_upload_csv(stage_csv_upload(data))
 
     # Verify satellite wasn't duplicated
     assert Satellite.objects.count() == 1
@@ -430,7 +435,7 @@ def test_process_upload_update_empty_name(mocker):
         ]
     ]
 
-    result = process_upload_csv(data)
+    result = process_upload_csv(stage_csv_upload(data))
 
     # Verify satellite name was updated
     satellite = Satellite.objects.get(sat_number="59588")
@@ -474,7 +479,7 @@ def test_process_upload_new_satellites(mocker):
         ]
     ]
 
-    result = process_upload_csv(data)
+    result = process_upload_csv(stage_csv_upload(data))
 
     # Verify satellite name was updated
     satellite = Satellite.objects.get(sat_number="59588")
@@ -513,7 +518,7 @@ def test_process_upload_new_satellites(mocker):
             "",
         ]
     ]
-    result = process_upload_csv(data)
+    result = process_upload_csv(stage_csv_upload(data))
     assert result["status"] == "success"
     assert Satellite.objects.count() == 2
     assert Satellite.objects.get(sat_number="58296").sat_name == "PELICAN 3001"
@@ -549,7 +554,7 @@ def test_process_upload_new_satellites(mocker):
             "",
         ]
     ]
-    result = process_upload_csv(data)
+    result = process_upload_csv(stage_csv_upload(data))
     assert result["status"] == "success"
     assert Satellite.objects.count() == 3
     assert Satellite.objects.get(sat_number="58013").sat_name == "KUIPER-P2"
@@ -612,7 +617,7 @@ def test_process_upload_discrepant_flag_low_altitude(mocker):
         ]
     ]
 
-    result = process_upload_csv(data)
+    result = process_upload_csv(stage_csv_upload(data))
     assert result["status"] == "success"
 
     observation = Observation.objects.get(satellite_id__sat_number="99999")
@@ -678,7 +683,7 @@ def test_process_upload_discrepant_flag_not_illuminated(mocker):
         ]
     ]
 
-    result = process_upload_csv(data)
+    result = process_upload_csv(stage_csv_upload(data))
     assert result["status"] == "success"
 
     observation = Observation.objects.get(satellite_id__sat_number="99998")
@@ -744,7 +749,7 @@ def test_process_upload_discrepant_flag_both_conditions(mocker):
         ]
     ]
 
-    result = process_upload_csv(data)
+    result = process_upload_csv(stage_csv_upload(data))
     assert result["status"] == "success"
 
     observation = Observation.objects.get(satellite_id__sat_number="99997")
@@ -810,7 +815,7 @@ def test_process_upload_discrepant_flag_false(mocker):
         ]
     ]
 
-    result = process_upload_csv(data)
+    result = process_upload_csv(stage_csv_upload(data))
     assert result["status"] == "success"
 
     observation = Observation.objects.get(satellite_id__sat_number="99996")
@@ -881,7 +886,7 @@ def test_process_upload_different_satchecker_values(mocker):
         "repository.tasks.add_additional_data",
         return_value=make_mock_satchecker(180.12345678),
     )
-    result1 = process_upload_csv(data)
+    result1 = process_upload_csv(stage_csv_upload(data))
     assert result1["status"] == "success"
     first_obs_id = result1["obs_ids"][0]
     assert Observation.objects.filter(satellite_id__sat_number="88888").count() == 1
@@ -891,9 +896,132 @@ def test_process_upload_different_satchecker_values(mocker):
         "repository.tasks.add_additional_data",
         return_value=make_mock_satchecker(180.1234568),
     )
-    result2 = process_upload_csv(data)
+    result2 = process_upload_csv(stage_csv_upload(data))
     assert result2["status"] == "success"
 
     # only one observation should be created
     assert result2["obs_ids"][0] == first_obs_id
     assert Observation.objects.filter(satellite_id__sat_number="88888").count() == 1
+
+
+@pytest.mark.django_db
+def test_process_upload_resumes_from_validated_chunks(mocker):
+    mock_set_progress = mocker.patch(
+        "celery_progress.backend.ProgressRecorder.set_progress"
+    )
+    mocker.patch("repository.tasks.send_confirmation_email")
+
+    def make_row(sat_number):
+        return [
+            f"RESUME SAT {sat_number}",
+            str(sat_number),
+            "2024-10-03T19:00:27.319Z",
+            0.001,
+            6.5,
+            0.1,
+            52.15,
+            4.49,
+            8,
+            10,
+            "Test instrument",
+            "CCD",
+            "CLEAR",
+            "test@example.com",
+            "0000-0001-6659-9253",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+        ]
+
+    satchecker_data = SatCheckerData(
+        15.0,
+        500.0,
+        0.1,
+        True,
+        15.0,
+        270.0,
+        0.01,
+        0.02,
+        45.0,
+        180.0,
+        "RESUME SAT",
+        "2024-001A",
+        400.0,
+        -10.0,
+        180.0,
+    )
+    mock_add_additional_data = mocker.patch(
+        "repository.tasks.add_additional_data", return_value=satchecker_data
+    )
+
+    mock_invalidate_stats = mocker.patch("repository.tasks.invalidate_stats")
+
+    upload_id = stage_csv_upload([make_row(1), make_row(2), make_row(3)], 2)
+    # The first chunk was validated before the worker running the task was lost
+    UploadChunk.objects.filter(upload_id=upload_id, chunk_index=0).update(
+        satchecker_data=[list(satchecker_data), list(satchecker_data)]
+    )
+
+    result = process_upload_csv(upload_id)
+    assert result["status"] == "success"
+    assert len(result["obs_ids"]) == 3
+    assert result["email"] == "test@example.com"
+
+    # Only the row in the second chunk was checked with SatChecker
+    assert mock_add_additional_data.call_count == 1
+    assert (
+        Observation.objects.filter(satellite_id__sat_number__in=[1, 2, 3]).count() == 3
+    )
+    assert not UploadChunk.objects.filter(upload_id=upload_id).exists()
+    mock_invalidate_stats.assert_called_once()
+
+    # Three rows checked, then two chunks saved - 100% only once both are saved
+    assert [call.args for call in mock_set_progress.call_args_list] == [
+        (2, 5),
+        (3, 5),
+        (4, 5),
+        (5, 5),
+    ]
+
+
+@pytest.mark.django_db
+def test_process_upload_claimed_by_another_run(mocker):
+    mocker.patch("celery_progress.backend.ProgressRecorder.set_progress")
+    mocker.patch("repository.tasks.send_confirmation_email")
+    mock_add_additional_data = mocker.patch("repository.tasks.add_additional_data")
+    mock_apply_async = mocker.patch.object(process_upload_csv, "apply_async")
+
+    row = ["CLAIMED SAT", "1", "2024-10-03T19:00:27.319Z"] + [""] * 24
+    upload_id = stage_csv_upload([row])
+    assert claim_csv_upload(upload_id, "first-run")
+
+    # A second delivery while the first run is still going waits for it
+    with pytest.raises(Ignore):
+        process_upload_csv(upload_id)
+    mock_apply_async.assert_called_once()
+    assert mock_apply_async.call_args.kwargs["countdown"] > 0
+    mock_add_additional_data.assert_not_called()
+    assert UploadChunk.objects.filter(upload_id=upload_id).exists()
+
+    # It takes over once the claim has run out, e.g. after the worker was lost
+    UploadChunk.objects.filter(upload_id=upload_id).update(
+        claimed_until=timezone.now() - timedelta(seconds=1)
+    )
+    assert claim_csv_upload(upload_id, "second-run")
+    assert not claim_csv_upload(upload_id, "first-run")
+
+    # The first run stops without deleting the chunks once it has lost the claim
+    mocker.patch("repository.tasks.claim_csv_upload", side_effect=[True, False])
+    with pytest.raises(Ignore):
+        process_upload_csv(upload_id)
+    mock_add_additional_data.assert_not_called()
+    assert UploadChunk.objects.filter(upload_id=upload_id).exists()
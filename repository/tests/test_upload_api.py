@@ -1,13 +1,18 @@
 import os
+import threading
+import time
 import uuid
+from datetime import timedelta
 
 import pytest
 from django.utils import timezone
 from ninja.testing import TestClient
 
 from repository.api import api
-from repository.models import APIKey
+from repository.models import APIKey, Location, Observation, Satellite
 from repository.tasks import process_upload_api
+from repository.utils.ephemeris_utils import import_tles, parse_tle_lines
+from repository.utils.general_utils import SatCheckerData
 
 
 @pytest.fixture
@@ -626,3 +631,336 @@ def test_process_upload_api_progress_task(mocker):
     assert last_call.kwargs["meta"]["percent"] == 100
     assert last_call.kwargs["meta"]["current"] == 10
     assert last_call.kwargs["meta"]["total"] == 10
+
+
+@pytest.mark.django_db
+def test_process_upload_api_progress_throttled_task(mocker, settings):
+    """
+    Test that progress updates for a large upload are coalesced, with the final
+    state always written.
+    """
+    settings.UPLOAD_PROGRESS_INTERVAL = 60
+    mocker.patch("repository.tasks.send_confirmation_email")
+    mocker.patch.object(process_upload_api, "update_state")
+    mocker.patch(
+        "repository.tasks.add_additional_data",
+        return_value=SatCheckerData(
+            15.0,
+            500.0,
+            0.1,
+            True,
+            15.0,
+            270.0,
+            0.01,
+            0.02,
+            45.0,
+            180.0,
+            "TEST SAT",
+            "2024-001A",
+            400.0,
+            -10.0,
+            180.0,
+        ),
+    )
+
+    obs_time = timezone.datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+    observations_data = [
+        {
+            "satellite_name": "TEST SAT",
+            "satellite_number": 12345,
+            "obs_time_utc": obs_time + timedelta(seconds=i),
+            "obs_time_uncert_sec": 0.1,
+            "instrument": "TEST-SCOPE",
+            "obs_mode": "CCD",
+            "obs_filter": "Clear",
+            "obs_email": "test@example.com",
+            "obs_orc_id": ["0000-0000-0000-0000"],
+            "obs_lat_deg": 20.0,
+            "obs_long_deg": -155.0,
+            "obs_alt_m": 3000.0,
+            "limiting_magnitude": 18.0,
+            "apparent_mag": 6.0,
+            "apparent_mag_uncert": 0.1,
+            "sat_ra_deg": None,
+            "sat_dec_deg": None,
+            "sigma_2_ra": None,
+            "sigma_2_dec": None,
+            "sigma_ra_sigma_dec": None,
+            "range_to_sat_km": None,
+            "range_to_sat_uncert_km": None,
+            "range_rate_sat_km_s": None,
+            "range_rate_sat_uncert_km_s": None,
+            "comments": None,
+            "data_archive_link": None,
+            "mpc_code": None,
+        }
+        for i in range(250)
+    ]
+
+    result = process_upload_api(
+        observations_data, timezone.now().isoformat(), None, False
+    )
+    assert result["summary"]["created"] == 250
+
+    # The initial state, one update per percent (every 3 rows) and the final state
+    update_state_mock = process_upload_api.update_state
+    assert update_state_mock.call_count == 85
+    percents = [call.kwargs["meta"]["percent"] for call in update_state_mock.mock_calls]
+    assert percents == sorted(percents)
+    last_call = update_state_mock.call_args_list[-1]
+    assert last_call.kwargs["meta"]["current"] == 250
+    assert last_call.kwargs["meta"]["percent"] == 100
+
+
+@pytest.mark.django_db
+def test_process_upload_api_bulk_insert_task(mocker):
+    """
+    Test that a batch is saved in chunks, with invalid observations rejected
+    individually and shared satellites/locations only created once.
+    """
+    mocker.patch("repository.tasks.send_confirmation_email")
+    mocker.patch.object(process_upload_api, "update_state")
+    mocker.patch("repository.utils.upload_utils.UPLOAD_CHUNK_SIZE", 2)
+
+    mock_satchecker = mocker.Mock()
+    mock_satchecker.alt_deg = 15.0
+    mock_satchecker.illuminated = True
+    mock_satchecker.phase_angle = 15.0
+    mock_satchecker.range_to_sat = 500.0
+    mock_satchecker.range_rate = 0.1
+    mock_satchecker.sat_ra_deg = 180.0
+    mock_satchecker.sat_dec_deg = 45.0
+    mock_satchecker.ddec_deg_s = 0.01
+    mock_satchecker.dra_cosdec_deg_s = 0.02
+    mock_satchecker.az_deg = 270.0
+    mock_satchecker.satellite_name = "TEST SAT"
+    mock_satchecker.intl_designator = "2024-001A"
+    mock_satchecker.sat_altitude_km = 400.0
+    mock_satchecker.solar_elevation_deg = -10.0
+    mock_satchecker.solar_azimuth_deg = 180.0
+    mocker.patch("repository.tasks.add_additional_data", return_value=mock_satchecker)
+
+    obs_time = timezone.datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+
+    single_observation = {
+        "satellite_name": "TEST SAT",
+        "satellite_number": 12345,
+        "obs_time_utc": obs_time,
+        "obs_time_uncert_sec": 0.1,
+        "instrument": "TEST-SCOPE",
+        "obs_mode": "CCD",
+        "obs_filter": "Clear",
+        "obs_email": "test@example.com",
+        "obs_orc_id": ["0000-0000-0000-0000"],
+        "obs_lat_deg": 20.0,
+        "obs_long_deg": -155.0,
+        "obs_alt_m": 3000.0,
+        "limiting_magnitude": 18.0,
+        "apparent_mag": 6.0,
+        "apparent_mag_uncert": 0.1,
+        "sat_ra_deg": None,
+        "sat_dec_deg": None,
+        "sigma_2_ra": None,
+        "sigma_2_dec": None,
+        "sigma_ra_sigma_dec": None,
+        "range_to_sat_km": None,
+        "range_to_sat_uncert_km": None,
+        "range_rate_sat_km_s": None,
+        "range_rate_sat_uncert_km_s": None,
+        "comments": None,
+        "data_archive_link": None,
+        "mpc_code": None,
+    }
+
+    observations_data = []
+    for i in range(5):
+        observation = single_observation.copy()
+        observation["apparent_mag"] = 6.0 + i
+        observations_data.append(observation)
+    # invalid ORCID - rejected by model validation
+    observations_data[2]["obs_orc_id"] = ["0"]
+    # duplicate of the first observation, in a later chunk
+    observations_data.append(single_observation.copy())
+
+    result = process_upload_api(
+        observations_data,
+        timezone.now().isoformat(),
+        None,
+        False,
+    )
+
+    assert result["status"] == "PARTIAL_SUCCESS"
+    assert result["summary"] == {
+        "total": 6,
+        "created": 4,
+        "duplicates": 1,
+        "rejected": 1,
+    }
+    assert result["rejected_obs"][0]["index"] == 2
+    assert "not a valid ORCID" in result["rejected_obs"][0]["error"]
+    assert len(result["obs_ids"]) == 5
+    assert result["obs_ids"][-1] == result["obs_ids"][0]
+    assert Observation.objects.count() == 4
+    assert Satellite.objects.count() == 1
+    assert Location.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_process_upload_api_concurrent_satchecker_task(mocker, settings):
+    """
+    Test that SatChecker lookups run concurrently but are reported in upload order,
+    even when later lookups finish first.
+    """
+    mocker.patch("repository.tasks.send_confirmation_email")
+    mocker.patch.object(process_upload_api, "update_state")
+    settings.SATCHECKER_MAX_WORKERS = 4
+
+    mock_satchecker = mocker.Mock()
+    mock_satchecker.alt_deg = 15.0
+    mock_satchecker.illuminated = True
+    mock_satchecker.phase_angle = 15.0
+    mock_satchecker.range_to_sat = 500.0
+    mock_satchecker.range_rate = 0.1
+    mock_satchecker.sat_ra_deg = 180.0
+    mock_satchecker.sat_dec_deg = 45.0
+    mock_satchecker.ddec_deg_s = 0.01
+    mock_satchecker.dra_cosdec_deg_s = 0.02
+    mock_satchecker.az_deg = 270.0
+    mock_satchecker.satellite_name = "TEST SAT"
+    mock_satchecker.intl_designator = "2024-001A"
+    mock_satchecker.sat_altitude_km = 400.0
+    mock_satchecker.solar_elevation_deg = -10.0
+    mock_satchecker.solar_azimuth_deg = 180.0
+
+    lookup_threads = set()
+
+    def fake_satchecker(satellite_name, sat_number, *args):
+        lookup_threads.add(threading.get_ident())
+        # earlier rows take longer, so results complete in reverse order
+        time.sleep(0.05 * (7 - sat_number))
+        if sat_number == 2:
+            return "Satellite below horizon at this time and location"
+        if sat_number == 4:
+            raise ValueError("SatChecker lookup failed")
+        return mock_satchecker
+
+    mocker.patch("repository.tasks.add_additional_data", side_effect=fake_satchecker)
+
+    obs_time = timezone.datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+
+    single_observation = {
+        "satellite_name": "TEST SAT",
+        "satellite_number": 12345,
+        "obs_time_utc": obs_time,
+        "obs_time_uncert_sec": 0.1,
+        "instrument": "TEST-SCOPE",
+        "obs_mode": "CCD",
+        "obs_filter": "Clear",
+        "obs_email": "test@example.com",
+        "obs_orc_id": ["0000-0000-0000-0000"],
+        "obs_lat_deg": 20.0,
+        "obs_long_deg": -155.0,
+        "obs_alt_m": 3000.0,
+        "limiting_magnitude": 18.0,
+        "apparent_mag": 6.0,
+        "apparent_mag_uncert": 0.1,
+        "sat_ra_deg": None,
+        "sat_dec_deg": None,
+        "sigma_2_ra": None,
+        "sigma_2_dec": None,
+        "sigma_ra_sigma_dec": None,
+        "range_to_sat_km": None,
+        "range_to_sat_uncert_km": None,
+        "range_rate_sat_km_s": None,
+        "range_rate_sat_uncert_km_s": None,
+        "comments": None,
+        "data_archive_link": None,
+        "mpc_code": None,
+    }
+
+    observations_data = []
+    for i in range(6):
+        observation = single_observation.copy()
+        observation["apparent_mag"] = 6.0 + i
+        observation["satellite_number"] = i + 1
+        observations_data.append(observation)
+
+    result = process_upload_api(
+        observations_data,
+        timezone.now().isoformat(),
+        None,
+        False,
+    )
+
+    assert len(lookup_threads) > 1
+    assert result["status"] == "PARTIAL_SUCCESS"
+    assert result["summary"]["created"] == 4
+    assert [rejected["index"] for rejected in result["rejected_obs"]] == [1, 3]
+    assert [rejected["sat_number"] for rejected in result["rejected_obs"]] == [2, 4]
+    assert result["rejected_obs"][0]["error"] == (
+        "Satellite below horizon at this time and location"
+    )
+    assert result["rejected_obs"][1]["error"] == "SatChecker lookup failed"
+    saved = Observation.objects.filter(id__in=result["obs_ids"])
+    assert [
+        saved.get(id=obs_id).satellite_id.sat_number for obs_id in result["obs_ids"]
+    ] == [1, 3, 5, 6]
+
+
+@pytest.mark.django_db
+def test_process_upload_api_local_ephemeris_task(mocker, settings):
+    """Test that observations can be uploaded without SatChecker"""
+    mocker.patch("repository.tasks.send_confirmation_email")
+    mocker.patch.object(process_upload_api, "update_state")
+    satchecker_get = mocker.patch("repository.utils.satchecker_client.get")
+
+    import_tles(
+        parse_tle_lines(
+            [
+                "ISS (ZARYA)",
+                "1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  9005",
+                "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391563537",
+            ]
+        )
+    )
+    settings.EPHEMERIS_BACKEND = "local"
+
+    observation = {
+        "satellite_name": None,
+        "satellite_number": 25544,
+        "obs_time_utc": timezone.datetime(2024, 1, 1, 19, 24, 20, tzinfo=timezone.utc),
+        "obs_time_uncert_sec": 0.1,
+        "instrument": "TEST-SCOPE",
+        "obs_mode": "CCD",
+        "obs_filter": "Clear",
+        "obs_email": "test@example.com",
+        "obs_orc_id": ["0000-0000-0000-0000"],
+        "obs_lat_deg": 33.0,
+        "obs_long_deg": -117.0,
+        "obs_alt_m": 100.0,
+        "limiting_magnitude": 18.0,
+        "apparent_mag": 2.0,
+        "apparent_mag_uncert": 0.1,
+        "sat_ra_deg": None,
+        "sat_dec_deg": None,
+        "sigma_2_ra": None,
+        "sigma_2_dec": None,
+        "sigma_ra_sigma_dec": None,
+        "range_to_sat_km": None,
+        "range_to_sat_uncert_km": None,
+        "range_rate_sat_km_s": None,
+        "range_rate_sat_uncert_km_s": None,
+        "comments": None,
+        "data_archive_link": None,
+        "mpc_code": None,
+    }
+
+    result = process_upload_api([observation], timezone.now().isoformat(), None, False)
+
+    assert not satchecker_get.called
+    assert result["status"] == "SUCCESS"
+    saved = Observation.objects.get(id=result["obs_ids"][0])
+    assert saved.satellite_id.sat_name == "ISS (ZARYA)"
+    assert saved.satellite_id.intl_designator == "1998-067A"
+    assert saved.alt_deg_satchecker == pytest.approx(72.9, abs=0.1)
+    assert saved.potentially_discrepant is False
@@ -1,3 +1,6 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.db import transaction
 from django.forms import ValidationError
 from django.test import TestCase
@@ -19,6 +22,24 @@ class SatelliteTest(TestCase):
         self.assertTrue(isinstance(sat, Satellite))
         self.assertEqual(sat.__str__(), str(sat.sat_number) + ", " + sat.sat_name)
 
+    def test_satellite_constellation(self):
+        sat = self.create_satellite()
+        self.assertEqual(sat.constellation, "starlink")
+
+        sat.sat_name = "FLOCK 4Q-12"
+        sat.save()
+        self.assertEqual(sat.constellation, "planetlabs")
+
+        sat = self.create_satellite(sat_name="ISS (ZARYA)", sat_number=25544)
+        self.assertEqual(sat.constellation, "other")
+
+        # Satellites saved without the model (e.g. before the column was added)
+        # are fixed by the backfill command
+        Satellite.objects.filter(id=sat.id).update(constellation="kuiper")
+        call_command("backfill_constellations", stdout=StringIO())
+        sat.refresh_from_db()
+        self.assertEqual(sat.constellation, "other")
+
     def test_satellite_validation(self):
         # field is required
         with self.assertRaises(ValidationError):
@@ -65,6 +86,21 @@ class LocationTest(TestCase):
             + str(loc.obs_alt_m),
         )
 
+    def test_location_distances_to(self):
+        locations = [
+            Location(obs_lat_deg=lat, obs_long_deg=lon)
+            for lat, lon in [(33, -117), (-45.5, 170.2), (89.9, 0), (0, -179.9)]
+        ]
+        distances = Location.distances_to(
+            [loc.obs_lat_deg for loc in locations],
+            [loc.obs_long_deg for loc in locations],
+            19.8,
+            -155.5,
+        )
+        self.assertEqual(len(distances), len(locations))
+        for loc, distance in zip(locations, distances, strict=True):
+            self.assertAlmostEqual(distance, loc.distance_to(19.8, -155.5), places=6)
+
     def test_location_validation(self):
         # field is required
         with transaction.atomic():
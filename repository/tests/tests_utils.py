@@ -1,14 +1,37 @@
+import importlib
+import threading
+from datetime import timedelta
+
+import numpy as np
 import pytest
 import requests
+from django.apps import apps as django_apps
+from django.conf import settings
 from django.utils import timezone
 
-from repository.models import Location, Observation, Satellite
+from repository import tasks
+from repository.models import TLE, Location, Observation, Satellite
+from repository.utils import general_utils, satchecker_client
+from repository.utils.ephemeris_utils import (
+    get_closest_tle,
+    import_tles,
+    parse_tle_lines,
+)
 from repository.utils.general_utils import (
+    ProgressThrottle,
+    add_additional_data,
+    additional_data_pool,
     get_norad_id,
+    get_satchecker_response,
     get_satellite_name,
     validate_position,
 )
-from repository.utils.search_utils import filter_observations
+from repository.utils.search_utils import filter_observations, get_locations_within
+from repository.utils.stats_utils import (
+    get_observation_stats,
+    recompute_observation_stats,
+)
+from repository.utils.upload_utils import persist_observations, prepare_observation
 
 
 @pytest.fixture
@@ -267,6 +290,260 @@ def test_get_satellite_name_request_exception(requests_mock):
     assert result is None, "Expected None when a RequestException is raised"
 
 
+def test_satchecker_client_shared_session(requests_mock):
+    session = satchecker_client.get_session()
+    assert satchecker_client.get_session() is session
+
+    adapter = session.adapters[satchecker_client.SATCHECKER_BASE_URL]
+    assert 503 in adapter.max_retries.status_forcelist
+    assert adapter.max_retries.backoff_factor > 0
+
+    requests_mock.get(
+        "https://satchecker.cps.iau.org/tools/names-from-norad-id/",
+        json={"data": []},
+    )
+    response = satchecker_client.get("/tools/names-from-norad-id/", {"id": 1})
+    assert response.json() == {"data": []}
+    assert requests_mock.last_request.qs == {"id": ["1"]}
+    assert requests_mock.last_request.timeout == (
+        satchecker_client.SATCHECKER_TIMEOUTS["tools"]
+    )
+
+
+@pytest.mark.django_db
+def test_get_satchecker_response_cached(requests_mock, settings):
+    url = "https://satchecker.cps.iau.org/ephemeris/catalog-number/"
+    endpoint = "/ephemeris/catalog-number/"
+    params = {"catalog": 12345, "julian_date": 2460400.5, "latitude": 33.0}
+    adapter = requests_mock.get(
+        url, status_code=200, json={"data": [["TestSat"]], "fields": ["name"]}
+    )
+
+    first = get_satchecker_response(endpoint, params)
+    second = get_satchecker_response(endpoint, params)
+    assert adapter.call_count == 1
+    assert second.status_code == 200
+    assert second.json() == first.json()
+
+    # A different observer position is a different request
+    get_satchecker_response(endpoint, {**params, "latitude": 34.0})
+    assert adapter.call_count == 2
+
+    # Responses over the size limit are not cached
+    settings.SATCHECKER_CACHE_MAX_BYTES = 10
+    get_satchecker_response(endpoint, {**params, "latitude": 35.0})
+    get_satchecker_response(endpoint, {**params, "latitude": 35.0})
+    assert adapter.call_count == 4
+
+
+@pytest.mark.django_db
+def test_get_satchecker_response_negative_cache(requests_mock, mocker):
+    url = "https://satchecker.cps.iau.org/ephemeris/catalog-number/"
+    endpoint = "/ephemeris/catalog-number/"
+    cache_set = mocker.spy(general_utils.cache, "set")
+
+    # No position found - cached with the negative timeout
+    adapter = requests_mock.get(url, status_code=200, json={"info": "No data"})
+    get_satchecker_response(endpoint, {"catalog": 1})
+    response = get_satchecker_response(endpoint, {"catalog": 1})
+    assert adapter.call_count == 1
+    assert response.json() == {"info": "No data"}
+    assert cache_set.call_args.args[2] == settings.SATCHECKER_CACHE_NEGATIVE_TIMEOUT
+
+    # Temporary server errors are not cached
+    adapter = requests_mock.get(url, status_code=503, json={"message": "Busy"})
+    get_satchecker_response(endpoint, {"catalog": 2})
+    response = get_satchecker_response(endpoint, {"catalog": 2})
+    assert adapter.call_count == 2
+    assert response.status_code == 503
+
+
+def test_progress_throttle(mocker):
+    report = mocker.Mock()
+    clock = mocker.patch("repository.utils.general_utils.time.monotonic")
+    clock.return_value = 100.0
+    progress = ProgressThrottle(report, 1000, min_interval=1.0)
+
+    # Updates within the same percent and interval are skipped
+    for current in range(1, 10):
+        assert not progress.update(current)
+    report.assert_not_called()
+
+    # Another percent of the upload has been processed
+    assert progress.update(10)
+    report.assert_called_with(10, 1000)
+
+    # The interval has passed
+    clock.return_value = 101.5
+    assert progress.update(11)
+    report.assert_called_with(11, 1000)
+
+    # The final update is always reported
+    assert progress.update(1000)
+    report.assert_called_with(1000, 1000)
+    assert report.call_count == 3
+
+
+ISS_TLE = """ISS (ZARYA)
+1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  9005
+2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391563537
+"""
+
+
+def test_parse_tle_lines():
+    lines = ("0 " + ISS_TLE + ISS_TLE.split("\n", 1)[1]).splitlines()
+    tles = list(parse_tle_lines(lines))
+
+    assert len(tles) == 2
+    assert tles[0].sat_number == 25544
+    assert tles[0].name == "ISS (ZARYA)"
+    # Two line format without a name
+    assert tles[1].name == ""
+    assert tles[0].epoch.isoformat() == "2024-01-01T12:00:00+00:00"
+
+
+@pytest.mark.django_db
+def test_import_tles():
+    older = ISS_TLE.replace("24001.50000000", "23360.50000000")
+    assert import_tles(parse_tle_lines((ISS_TLE + older).splitlines())) == 2
+    # Importing the same TLEs again doesn't create duplicates
+    import_tles(parse_tle_lines(ISS_TLE.splitlines()))
+    assert TLE.objects.count() == 2
+
+    obs_time = timezone.datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert get_closest_tle(25544, obs_time).epoch.day == 1
+    obs_time = timezone.datetime(2023, 12, 27, tzinfo=timezone.utc)
+    assert get_closest_tle(25544, obs_time).epoch.day == 26
+    assert get_closest_tle(12345, obs_time) is None
+
+
+@pytest.mark.django_db
+def test_add_additional_data_local_backend(settings, requests_mock):
+    import_tles(parse_tle_lines(ISS_TLE.splitlines()))
+    settings.EPHEMERIS_BACKEND = "local"
+
+    result = add_additional_data(
+        "ISS (ZARYA)", 25544, "2024-01-01T19:24:20.000", 33.0, -117.0, 100.0
+    )
+    assert not requests_mock.called
+    assert result.satellite_name == "ISS (ZARYA)"
+    assert result.intl_designator == "1998-067A"
+    assert result.alt_deg == pytest.approx(72.9, abs=0.1)
+    # Range is close to height / sin(altitude) this high in the sky
+    assert result.range_to_sat == pytest.approx(
+        result.sat_altitude_km / np.sin(np.radians(result.alt_deg)), rel=0.01
+    )
+    assert 0 < result.phase_angle < 180
+    assert result.illuminated is True
+
+    result = add_additional_data(
+        "ISS (ZARYA)", 25544, "2024-01-01T12:00:00.000", 33.0, -117.0, 100.0
+    )
+    assert result.startswith("Satellite below horizon")
+
+    result = add_additional_data(
+        "STARLINK-1", 25544, "2024-01-01T19:24:20.000", 33.0, -117.0, 100.0
+    )
+    assert result == "Satellite name and number do not match"
+
+    # No TLE within 14 days of the observation
+    result = add_additional_data(
+        "", 25544, "2023-12-01T19:24:20.000", 33.0, -117.0, 100.0
+    )
+    assert result.alt_deg is None
+
+
+@pytest.mark.django_db
+def test_add_additional_data_local_backend_unnamed_tle(settings):
+    # Two line format, so the TLE has no name
+    import_tles(parse_tle_lines(ISS_TLE.splitlines()[1:]))
+    settings.EPHEMERIS_BACKEND = "local"
+
+    # Nothing to check the name against, so it is accepted
+    result = add_additional_data(
+        "ISS (ZARYA)", 25544, "2024-01-01T19:24:20.000", 33.0, -117.0, 100.0
+    )
+    assert result.satellite_name == "ISS (ZARYA)"
+    assert result.alt_deg == pytest.approx(72.9, abs=0.1)
+
+    # Otherwise the name is checked against the satellite in SCORE
+    Satellite.objects.create(sat_name="ISS (ZARYA)", sat_number=25544)
+    result = add_additional_data(
+        "ISS", 25544, "2024-01-01T19:24:20.000", 33.0, -117.0, 100.0
+    )
+    assert result == "Satellite name and number do not match"
+    result = add_additional_data(
+        "ISS (ZARYA)", 25544, "2024-01-01T19:24:20.000", 33.0, -117.0, 100.0
+    )
+    assert result.satellite_name == "ISS (ZARYA)"
+
+
+def test_additional_data_pool_shared_executor():
+    started = threading.Event()
+    release = threading.Event()
+
+    def fetch(item):
+        if item == 0:
+            started.set()
+        release.wait(5)
+        return item
+
+    items = list(range(settings.SATCHECKER_MAX_WORKERS + 10))
+    with additional_data_pool(fetch, items) as futures:
+        assert started.wait(5)
+    release.set()
+
+    # Lookups that hadn't started when the block exited are cancelled
+    assert futures[0].result() == 0
+    assert futures[-1].cancelled()
+
+    # The next batch runs on the same threads
+    executor = general_utils.get_satchecker_executor()
+    with additional_data_pool(lambda item: item * 2, [1, 2]) as futures:
+        assert [future.result() for future in futures] == [2, 4]
+    assert general_utils.get_satchecker_executor() is executor
+
+
+@pytest.mark.django_db
+def test_additional_data_pool_local_backend_batch(settings, mocker):
+    import_tles(parse_tle_lines(ISS_TLE.splitlines()))
+    settings.EPHEMERIS_BACKEND = "local"
+
+    items = [
+        ("ISS (ZARYA)", 25544, "2024-01-01T19:24:20.000", 33.0, -117.0, 100.0),
+        ("ISS (ZARYA)", 25544, "2024-01-01T19:24:50.000", 33.0, -117.0, 100.0),
+        ("ISS (ZARYA)", 25544, "2024-01-01T12:00:00.000", 33.0, -117.0, 100.0),
+        ("", 25544, "2024-01-01T19:23:40.000", 33.0, -117.0, 100.0),
+        ("ISS (ZARYA)", 25544, "2024-01-01T19:24:20.000", 34.0, -117.5, 0.0),
+        ("STARLINK-1", 25544, "2024-01-01T19:24:20.000", 33.0, -117.0, 100.0),
+        ("ISS (ZARYA)", 25544, "2023-12-01T19:24:20.000", 33.0, -117.0, 100.0),
+        ("ISS (ZARYA)", 25544, "2024-01-01T19:24:20.000", 95.0, -117.0, 100.0),
+        ("ISS (ZARYA)", 25544, "not a time", 33.0, -117.0, 100.0),
+        None,
+    ]
+    expected = []
+    for item in items:
+        try:
+            expected.append(None if item is None else add_additional_data(*item))
+        except ValueError as e:
+            expected.append(e)
+
+    fetch = mocker.Mock()
+    with additional_data_pool(
+        fetch, items, additional_data_args=lambda item: item
+    ) as results:
+        for future, item_expected in zip(results, expected, strict=True):
+            if isinstance(item_expected, Exception):
+                with pytest.raises(ValueError):
+                    future.result()
+            else:
+                assert future.result() == item_expected
+    fetch.assert_not_called()
+    # The rows calculated together were checked, not just rejected
+    assert expected[0].alt_deg == pytest.approx(72.9, abs=0.1)
+    assert expected[1].alt_deg != expected[0].alt_deg
+
+
 @pytest.mark.django_db
 def test_filter_observations_location(setup_data):
     location, satellite, observation = setup_data
@@ -303,6 +580,82 @@ def test_filter_observations_location(setup_data):
     assert results[0] == observation
 
 
+@pytest.mark.django_db
+def test_get_locations_within():
+    locations = [
+        Location.objects.create(obs_lat_deg=lat, obs_long_deg=lon, obs_alt_m=0)
+        for lat in range(-90, 91, 15)
+        for lon in range(-180, 180, 20)
+    ]
+    locations += [
+        Location.objects.create(obs_lat_deg=0, obs_long_deg=179.9, obs_alt_m=0),
+        Location.objects.create(obs_lat_deg=0, obs_long_deg=-179.9, obs_alt_m=0),
+    ]
+
+    # Across the antimeridian, around a pole, and a circle covering everything
+    for latitude, longitude, radius in [
+        (0, 180, 50),
+        (5, -175, 2000),
+        (80, 30, 3000),
+        (-85, -120, 1000),
+        (33, -117, 5000),
+        (0, 0, 25000),
+    ]:
+        expected = {
+            loc.id
+            for loc in locations
+            if loc.distance_to(latitude, longitude) <= radius
+        }
+        assert set(get_locations_within(latitude, longitude, radius)) == expected
+
+
+@pytest.mark.django_db
+def test_filter_observations_orcid(setup_data):
+    location, satellite, observation = setup_data
+    other = Observation.objects.get(pk=observation.pk)
+    other.pk = None
+    other.obs_orc_id = ["0000-0002-1825-009X", "0123-4567-8910-1112"]
+    other.save()
+
+    def search(orcid):
+        results = filter_observations({"observer_orcid": orcid})
+        return set(results.values_list("id", flat=True))
+
+    # Complete ORCIDs match any element, in any case
+    assert search("0123-4567-8910-1112") == {observation.id, other.id}
+    assert search("0000-0002-1825-009x") == {other.id}
+    assert search("0000-0002-1825-009X, 0000-0000-0000-0000") == {other.id}
+    assert search("0000-0000-0000-0000") == set()
+    # Partial ORCIDs still match
+    assert search("1825-009") == {other.id}
+    assert search("4567") == {observation.id, other.id}
+
+
+@pytest.mark.django_db
+def test_filter_observations_orcid_stored_lower_case(setup_data):
+    location, satellite, observation = setup_data
+    # Stored before ORCIDs were upper cased on upload
+    Observation.objects.filter(pk=observation.pk).update(
+        obs_orc_id=["0000-0002-1825-009x"]
+    )
+
+    def search(orcid):
+        results = filter_observations({"observer_orcid": orcid})
+        return set(results.values_list("id", flat=True))
+
+    assert search("0000-0002-1825-009X") == set()
+
+    migration = importlib.import_module(
+        "repository.migrations.0028_normalize_observation_orc_id"
+    )
+    migration.upper_case_orcids(django_apps, None)
+
+    observation.refresh_from_db()
+    assert observation.obs_orc_id == ["0000-0002-1825-009X"]
+    assert search("0000-0002-1825-009X") == {observation.id}
+    assert search("0000-0002-1825-009x") == {observation.id}
+
+
 @pytest.mark.django_db
 def test_filter_observations_position_data(setup_data):
     location, satellite, observation = setup_data
@@ -315,3 +668,73 @@ def test_filter_observations_position_data(setup_data):
     results = filter_observations(form_data)
     assert len(results) == 1
     assert results[0] == observation
+
+
+@pytest.mark.django_db
+def test_observation_stats_updated_by_upload(setup_data):
+    _, satellite, observation = setup_data
+    stats = get_observation_stats()
+    assert stats["total_observations"] == 1
+    assert stats["magnitude_stats"]["average"] == 5.2
+
+    satchecker_data = general_utils.SatCheckerData(
+        *([None] * 10), "NEW-SAT", "2024-001A", None, None, None
+    )
+    location_fields = {"obs_lat_deg": 33, "obs_long_deg": -117, "obs_alt_m": 100}
+    observation_fields = {
+        "obs_email": "abc@def.com",
+        "obs_time_uncert_sec": 1,
+        "obs_mode": "CCD",
+        "obs_filter": "CLEAR",
+        "instrument": "none",
+        "obs_orc_id": ["0123-4567-8910-1112"],
+    }
+    prepared = [
+        prepare_observation(
+            {
+                **observation_fields,
+                "obs_time_utc": observation.obs_time_utc - timedelta(days=1),
+                "apparent_mag": 3.0,
+                "apparent_mag_uncert": 0.1,
+            },
+            location_fields,
+            satellite.sat_number,
+            satellite.sat_name,
+            satchecker_data,
+        ),
+        prepare_observation(
+            {
+                **observation_fields,
+                "obs_time_utc": observation.obs_time_utc + timedelta(days=1),
+            },
+            location_fields,
+            54321,
+            "",
+            satchecker_data,
+        ),
+    ]
+    persist_observations(prepared)
+
+    stats = get_observation_stats()
+    assert stats["total_observations"] == 3
+    assert stats["total_satellites"] == 2
+    assert stats["time_range"]["first"] == prepared[0].observation.obs_time_utc
+    assert stats["time_range"]["last"] == prepared[1].observation.obs_time_utc
+    assert stats["magnitude_stats"] == {
+        "average": 4.1,
+        "brightest": 3.0,
+        "faintest": 5.2,
+    }
+    assert stats["most_observed_satellites"] == [
+        {"number": 12345, "name": "STARLINK-123", "observations": 2},
+        {"number": 54321, "name": "NEW-SAT", "observations": 1},
+    ]
+
+    recompute_observation_stats()
+    assert get_observation_stats() == stats
+
+    # Deletions outside of the uploads are picked up by the scheduled recompute
+    Observation.objects.filter(pk=observation.pk).delete()
+    assert get_observation_stats()["total_observations"] == 3
+    assert tasks.recompute_observation_stats() == 2
+    assert get_observation_stats()["total_observations"] == 2
@@ -1,13 +1,27 @@
-from datetime import timedelta
+import csv
+import io
+import zipfile
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 from unittest.mock import patch
 
+import pyarrow.parquet as pq
 import pytest
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, RequestFactory, TestCase
 from django.urls import reverse
 from django.utils import timezone
 
 from repository.forms import DataChangeForm, GenerateCSVForm, SearchForm
-from repository.models import Location, Observation, Satellite
+from repository.models import Location, Observation, Satellite, UploadChunk
+from repository.utils.csv_utils import (
+    build_archive_snapshot,
+    get_archive_snapshot,
+    get_csv_header,
+)
+from repository.utils.general_utils import invalidate_stats
+from repository.utils.search_utils import get_saved_search
 from repository.views import generate_csv
 
 
@@ -50,11 +64,47 @@ class TestViews(TestCase):
         self.assertContains(response, "satellites")
         self.assertContains(response, "observers")
 
+    def test_index_stats_cached(self):
+        response = self.client.get("/")
+        self.assertEqual(response.context["observation_count"], 1)
+
+        # Served from the cache until an upload finishes
+        self.observation.pk = None
+        self.observation.save()
+        with self.assertNumQueries(0):
+            response = self.client.get("/")
+        self.assertEqual(response.context["observation_count"], 1)
+
+        invalidate_stats()
+        response = self.client.get("/")
+        self.assertEqual(response.context["observation_count"], 2)
+        self.assertEqual(len(response.context["latest_obs_list"]), 2)
+
     def test_index_post_no_file(self):
         response = self.client.post(reverse("root"))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context["error"], "Please select a file to upload.")
 
+    @patch("repository.views.process_upload_csv.delay")
+    def test_index_post_file_stages_rows(self, mock_delay):
+        mock_delay.return_value.task_id = "test-task-id"
+        uploaded_file = SimpleUploadedFile(
+            "upload.csv",
+            "\ufeffsatellite_name,sat_number\nSAT A,1\nSAT B,2\n".encode(),
+            content_type="text/csv",
+        )
+        response = self.client.post(reverse("root"), {"uploaded_file": uploaded_file})
+        self.assertEqual(response.status_code, 302)
+
+        # The header and byte order mark are removed and the rows saved for the task
+        upload_id = mock_delay.call_args.args[0]
+        chunks = UploadChunk.objects.filter(upload_id=upload_id)
+        self.assertEqual(
+            [row for chunk in chunks for row in chunk.rows],
+            [["SAT A", "1"], ["SAT B", "2"]],
+        )
+        self.assertEqual(self.client.session["task_id"], "test-task-id")
+
     def test_data_format(self):
         response = self.client.get("/data-format")
         self.assertEqual(response.status_code, 200)
@@ -77,6 +127,20 @@ class TestViews(TestCase):
             response["Content-Disposition"].startswith("attachment; filename=")
         )
 
+        # The zip file is streamed and contains the header and every observation
+        self.assertTrue(response.streaming)
+        zipped_file = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(zipped_file.namelist(), ["satellite_observations_all.csv"])
+        rows = list(
+            csv.reader(
+                io.StringIO(zipped_file.read("satellite_observations_all.csv").decode())
+            )
+        )
+        self.assertEqual(rows[0], get_csv_header())
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][0], "STARLINK-30321")
+        self.assertEqual(rows[1][13], "0123-4567-8910-1112")
+
     def test_search(self):
         response = self.client.get("/search")
         self.assertEqual(response.status_code, 200)
@@ -87,6 +151,30 @@ class TestViews(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "repository/generate-csv.html")
 
+    def test_download_changes(self):
+        added = self.obs_date - timedelta(hours=1)
+        Observation.objects.update(date_added=added)
+        since = (added - timedelta(hours=1)).isoformat()
+        response = self.client.get(reverse("download-changes"), {"since": since})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        zipped_file = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        csv_text = zipped_file.read(zipped_file.namelist()[0]).decode()
+        self.assertEqual(len(list(csv.reader(io.StringIO(csv_text)))), 2)
+
+        # Observations added in the last few minutes are left out until they settle
+        Observation.objects.update(date_added=timezone.now())
+        response = self.client.get(reverse("download-changes"), {"since": since})
+        self.assertEqual(response.status_code, 204)
+
+        # No observations added since then
+        since = (added + timedelta(hours=1)).isoformat()
+        response = self.client.get(reverse("download-changes"), {"since": since})
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.get(reverse("download-changes"), {"since": "yesterday"})
+        self.assertEqual(response.status_code, 400)
+
     def test_satellites_page(self):
         response = self.client.get(reverse("satellites"))
         self.assertEqual(response.status_code, 200)
@@ -160,6 +248,84 @@ def test_generate_csv_get(request_factory):
     assert "form" in str(response.content)
 
 
+@pytest.mark.django_db
+def test_download_all_archive_snapshot(client, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    location = Location.objects.create(
+        obs_lat_deg=33, obs_long_deg=-117, obs_alt_m=100, date_added=timezone.now()
+    )
+    satellite = Satellite.objects.create(
+        sat_name="STARLINK-30321", sat_number=57679, date_added=timezone.now()
+    )
+
+    def add_observation(apparent_mag):
+        Observation.objects.create(
+            obs_time_utc=timezone.now(),
+            obs_email="abc@def.com",
+            satellite_id=satellite,
+            location_id=location,
+            date_added=timezone.now(),
+            obs_time_uncert_sec=5,
+            apparent_mag=apparent_mag,
+            apparent_mag_uncert=0.1,
+            obs_mode="VISUAL",
+            obs_filter="CLEAR",
+            instrument="none",
+            obs_orc_id=["0123-4567-8910-1112"],
+        )
+
+    add_observation(5.2)
+    assert build_archive_snapshot()
+    # Nothing has changed, so the snapshot isn't rebuilt
+    assert not build_archive_snapshot()
+
+    response = client.get(reverse("download-all"))
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/zip"
+    assert response["Content-Disposition"] == (
+        'attachment; filename="satellite_observations_all.zip"'
+    )
+    assert "Last-Modified" in response
+    zipped_file = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+    csv_text = zipped_file.read("satellite_observations_all.csv").decode()
+    assert len(list(csv.reader(io.StringIO(csv_text)))) == 2
+
+    # Unchanged downloads are answered with 304
+    response = client.get(reverse("download-all"), HTTP_IF_NONE_MATCH=response["ETag"])
+    assert response.status_code == 304
+
+    # A new observation replaces the snapshot without removing its metadata first
+    etag = get_archive_snapshot().etag
+    add_observation(6.1)
+    with patch(
+        "repository.utils.csv_utils.default_storage.delete",
+        wraps=default_storage.delete,
+    ) as delete:
+        assert build_archive_snapshot()
+    assert "exports/satellite_observations_all.json" not in [
+        call.args[0] for call in delete.call_args_list
+    ]
+    assert get_archive_snapshot().etag != etag
+    assert len(list((tmp_path / "exports").glob("*.zip"))) == 1
+    assert [path.name for path in (tmp_path / "exports").glob("*.json*")] == [
+        "satellite_observations_all.json"
+    ]
+
+    # Edits to observations and satellites are picked up too
+    observation = Observation.objects.first()
+    observation.potentially_discrepant = True
+    observation.save()
+    assert build_archive_snapshot()
+    assert not build_archive_snapshot()
+    satellite.sat_name = "STARLINK-30322"
+    satellite.save()
+    assert build_archive_snapshot()
+    zipped_file = zipfile.ZipFile(default_storage.open(get_archive_snapshot().path))
+    assert (
+        "STARLINK-30322" in zipped_file.read("satellite_observations_all.csv").decode()
+    )
+
+
 class SearchViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -253,12 +419,12 @@ class SearchViewTest(TestCase):
         data = response.json()
         self.assertTrue(len(data["rows"]) > 0)
         self.assertEqual(data["rows"][0]["satellite_name"], "STARLINK-30321")
-        self.assertIn("obs_ids", data)
-        self.assertIsInstance(data["obs_ids"], list)
-        self.assertTrue(len(data["obs_ids"]) > 0)
+        self.assertIn("search_id", data)
+        self.assertNotIn("obs_ids", data)
+        self.assertEqual(get_saved_search(data["search_id"]).count(), data["total"])
 
-    def test_search_with_date_filter_updates_obs_ids(self):
-        """Test search with date filters returns correct obs_ids"""
+    def test_search_with_date_filter_updates_search_id(self):
+        """Test search with date filters saves the search for the download"""
         # Create observations on different dates
         base_date = timezone.now()
         old_obs = Observation.objects.create(
@@ -308,10 +474,26 @@ class SearchViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         data = response.json()
 
-        # Verify obs_ids contains only recent observation, not old one
-        self.assertIn("obs_ids", data)
-        self.assertIn(recent_obs.id, data["obs_ids"])
-        self.assertNotIn(old_obs.id, data["obs_ids"])
+        # Verify the saved search finds only the recent observation, not the old one
+        self.assertIn("search_id", data)
+        obs_ids = set(get_saved_search(data["search_id"]).values_list("id", flat=True))
+        self.assertIn(recent_obs.id, obs_ids)
+        self.assertNotIn(old_obs.id, obs_ids)
+
+        # The search box term is saved with the form, as a different search
+        response = self.client.post(
+            reverse("search"),
+            {
+                "start_date_range": start_date.isoformat(),
+                "limit": "25",
+                "offset": "0",
+                "search": "NONEXISTENT",
+            },
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        self.assertEqual(response.json()["total"], 0)
+        self.assertNotEqual(response.json()["search_id"], data["search_id"])
+        self.assertFalse(get_saved_search(response.json()["search_id"]).exists())
 
     def test_custom_404(self):
         # Test the custom 404 handler
@@ -406,6 +588,52 @@ class SearchViewTest(TestCase):
             response["Content-Disposition"].startswith("attachment; filename=")
         )
 
+    def test_download_results_post_parquet(self):
+        response = self.client.post(
+            reverse("download-results"),
+            {
+                "obs_ids": f"[{self.observation.id}]",
+                "satellite_name": self.satellite.sat_name,
+                "format": "parquet",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.parquet")
+        self.assertEqual(
+            response["Content-Disposition"],
+            "attachment; filename=STARLINK-30321_observations.parquet",
+        )
+
+        table = pq.read_table(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(table.column_names, get_csv_header())
+        self.assertEqual(table.num_rows, 1)
+        row = table.to_pylist()[0]
+        self.assertEqual(row["satellite_name"], "STARLINK-30321")
+        self.assertEqual(row["norad_cat_id"], 57679)
+        self.assertEqual(row["apparent_magnitude"], 5.2)
+        self.assertEqual(row["observer_orcid"], ["0123-4567-8910-1112"])
+        self.assertEqual(
+            row["observation_time_utc"],
+            datetime(2024, 1, 2, 23, 59, 59, 123000, tzinfo=dt_timezone.utc),
+        )
+
+    def test_download_results_search_id(self):
+        response = self.client.post(reverse("search"), {"sat_name": "STARLINK-30321"})
+        search_id = response.context["search_id"]
+
+        response = self.client.post(
+            reverse("download-results"),
+            {"search_id": search_id, "format": "parquet"},
+        )
+        self.assertEqual(response.status_code, 200)
+        table = pq.read_table(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 1)
+
+        response = self.client.post(
+            reverse("download-results"), {"search_id": "expired"}
+        )
+        self.assertEqual(response.status_code, 400)
+
     def test_download_results_get(self):
         response = self.client.get(reverse("download-results"))
         self.assertEqual(response.status_code, 200)
@@ -477,7 +705,7 @@ class SearchViewTest(TestCase):
             {"error": "Please provide either a NORAD ID or a satellite name."},
         )
 
-    @patch("repository.views.requests.get")
+    @patch("repository.views.satchecker_client.get")
     def test_satellite_pos_lookup_with_norad_id(self, mock_get):
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {
@@ -835,6 +1063,57 @@ class VisualizationViewsTest(TestCase):
         self.assertIn("Starlink", constellation_names)
         self.assertIn("OneWeb", constellation_names)
 
+    def test_visualization_view_stats(self):
+        Observation.objects.create(
+            satellite_id=self.starlink_sat,
+            obs_time_utc=self.obs_date,
+            obs_time_uncert_sec=1.0,
+            apparent_mag=6.5,
+            apparent_mag_uncert=0.1,
+            instrument="none",
+            obs_mode="VISUAL",
+            obs_filter="CLEAR",
+            obs_email="test@example.com",
+            obs_orc_id=["0000-0000-0000-0000"],
+            location_id=self.location,
+        )
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("data-visualization"))
+
+        stats = {stat["id"]: stat for stat in response.context["constellation_stats"]}
+        self.assertEqual(response.context["constellation_stats"][0]["id"], "starlink")
+        self.assertEqual(stats["starlink"]["observation_count"], 2)
+        self.assertEqual(stats["starlink"]["satellite_count"], 1)
+        self.assertEqual(stats["starlink"]["avg_magnitude"], 6.0)
+        self.assertEqual(stats["oneweb"]["observation_count"], 1)
+        self.assertEqual(stats["kuiper"]["observation_count"], 0)
+        self.assertIsNone(stats["kuiper"]["avg_magnitude"])
+
+        magnitude_bins = response.context["magnitude_bins"]
+        self.assertEqual(list(magnitude_bins), [5, 6, 7])
+        self.assertEqual(magnitude_bins[5]["starlink"], 1)
+        self.assertEqual(magnitude_bins[6]["starlink"], 1)
+        self.assertEqual(magnitude_bins[6]["oneweb"], 1)
+        self.assertEqual(magnitude_bins[7]["starlink"], 0)
+
+        # The stats and all-sky plot points are cached
+        with self.assertNumQueries(0):
+            self.client.get(reverse("data-visualization"))
+
+    def test_visualization_view_cache_unavailable(self):
+        with (
+            patch("repository.views.cache.get", side_effect=ConnectionError),
+            patch("repository.views.cache.set") as mock_set,
+        ):
+            response = self.client.get(reverse("data-visualization"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["constellation_stats"])
+        mock_set.assert_not_called()
+
+        with patch("repository.views.cache.set", side_effect=ConnectionError):
+            response = self.client.get(reverse("data-visualization"))
+        self.assertEqual(response.status_code, 200)
+
     def test_visualization_view_observations_data(self):
         response = self.client.get(reverse("data-visualization"))
         observations = response.context["observations"]
@@ -848,6 +1127,17 @@ class VisualizationViewsTest(TestCase):
             self.assertIn("az_deg_satchecker", obs)
             self.assertIn("magnitude", obs)
 
+    def test_visualization_view_observations_sampled(self):
+        with self.settings(ALLSKY_PLOT_MAX_POINTS=1):
+            response = self.client.get(reverse("data-visualization"))
+        observations = response.context["observations"]
+
+        # Every second observation, in order of ID
+        self.assertEqual(
+            observations,
+            [{"alt_deg_satchecker": 30.0, "az_deg_satchecker": 90.0, "magnitude": 6.0}],
+        )
+
     def test_graphs_view(self):
         response = self.client.get(reverse("graphs"))
         self.assertEqual(response.status_code, 200)
@@ -14,6 +14,7 @@ urlpatterns = [
     path("data-format", views.data_format, name="data-format"),
     path("view", views.view_data, name="view-data"),
     path("download-all", views.download_all, name="download-all"),
+    path("download-changes", views.download_changes, name="download-changes"),
     path("api-access", views.api_access, name="api-access"),
     path("request-api-key", views.request_api_key, name="request-api-key"),
     path("download-results", views.download_results, name="download-results"),
@@ -1,13 +1,38 @@
 import csv
+import hashlib
 import io
+import json
 import logging
+import os
+import tempfile
 import time
 import zipfile
+from collections import namedtuple
+from collections.abc import Iterator
+from datetime import datetime
 
-from repository.models import Observation
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max, QuerySet
+from django.utils import timezone
+
+from repository.models import Location, Observation, Satellite
 
 logger = logging.getLogger(__name__)
 
+# Number of observations fetched from the database, and written to the zip file,
+# at a time
+CSV_CHUNK_SIZE = 2000
+
+ARCHIVE_SNAPSHOT_NAME = "satellite_observations_all"
+
+# The stored full-archive download, see build_archive_snapshot
+ArchiveSnapshot = namedtuple(
+    "ArchiveSnapshot", ["path", "etag", "last_modified", "file_name"]
+)
+
 
 # CSV header - same as upload format minus the email address for privacy
 def get_csv_header() -> list[str]:
@@ -67,32 +92,158 @@ def get_csv_header() -> list[str]:
     return header
 
 
-def create_csv(
-    observation_list: list[Observation], prefix: str
-) -> tuple[io.BytesIO, str]:
+def get_csv_row(observation: Observation) -> list:
     """
-    Creates a CSV file from a list of observations and compresses it into a zip file.
-
-    This function takes a list of Observation objects, generates a CSV file with the
-    details of each observation, and compresses the CSV file into a zip file. If the
-    observation list is empty, it retrieves all observations from the database.
-    The CSV file includes a header row with the names of all the fields.
+    Returns the CSV row for an observation, in the order of get_csv_header.
 
     Args:
-        observation_list (List[Observation]): A list of Observation objects.
-        prefix (str): A prefix for the zip file name.
+        observation (Observation): The observation, with its satellite and location
+            selected.
+
     Returns:
-        Tuple[io.BytesIO, str]: A tuple containing the compressed zip file and the
-        name of the zip file.
+        list: The values of the CSV row.
+    """
+    # format ORC ID string properly
+    orc_id = (
+        ", ".join(observation.obs_orc_id)
+        if isinstance(observation.obs_orc_id, list)
+        else observation.obs_orc_id.replace("[", "").replace("]", "")
+    )
+    if "," in orc_id:
+        orc_id = f'"{orc_id}"'
+
+    # format date/time to match upload format
+    obs_time_utc = observation.obs_time_utc.strftime("%Y-%m-%dT%H:%M:%S.%fZ")[:-4] + "Z"
+
+    return [
+        observation.satellite_id.sat_name,
+        observation.satellite_id.sat_number,
+        obs_time_utc,
+        observation.obs_time_uncert_sec,
+        observation.apparent_mag,
+        observation.apparent_mag_uncert,
+        observation.location_id.obs_lat_deg,
+        observation.location_id.obs_long_deg,
+        observation.location_id.obs_alt_m,
+        observation.limiting_magnitude,
+        observation.instrument,
+        observation.obs_mode,
+        observation.obs_filter,
+        orc_id,
+        observation.sat_ra_deg,
+        observation.sat_dec_deg,
+        observation.sigma_2_ra,
+        observation.sigma_ra_sigma_dec,
+        observation.sigma_2_dec,
+        observation.range_to_sat_km,
+        observation.range_to_sat_uncert_km,
+        observation.range_rate_sat_km_s,
+        observation.range_rate_sat_uncert_km_s,
+        observation.comments,
+        observation.data_archive_link,
+        observation.mpc_code,
+        observation.sat_ra_deg_satchecker,
+        observation.sat_dec_deg_satchecker,
+        observation.range_to_sat_km_satchecker,
+        observation.range_rate_sat_km_s_satchecker,
+        observation.ddec_deg_s_satchecker,
+        observation.dra_cosdec_deg_s_satchecker,
+        observation.phase_angle,
+        observation.alt_deg_satchecker,
+        observation.az_deg_satchecker,
+        observation.sat_altitude_km_satchecker,
+        observation.solar_elevation_deg_satchecker,
+        observation.solar_azimuth_deg_satchecker,
+        observation.illuminated,
+        observation.satellite_id.intl_designator,
+        observation.potentially_discrepant,
+    ]
+
+
+class StreamBuffer(io.RawIOBase):
     """
-    logger.info("Starting create_csv function")
+    Write-only, unseekable file that keeps only what was written since the last
+    call to pop, so a file (zip, Parquet) can be sent while it is being written.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def pop(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _iter_csv_zip(observation_list: QuerySet, file_name: str) -> Iterator[bytes]:
     start_time = time.time()
+    stream = StreamBuffer()
+    count = 0
+
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as zip:
+        # The size isn't known in advance, so allow for files over 2 GB
+        with zip.open(f"{file_name}.csv", "w", force_zip64=True) as zip_entry:
+            csv_file = io.StringIO()
+            writer = csv.writer(csv_file)
+            writer.writerow(get_csv_header())
+
+            # A server-side cursor keeps only one chunk of observations in memory
+            for observation in observation_list.iterator(chunk_size=CSV_CHUNK_SIZE):
+                writer.writerow(get_csv_row(observation))
+                count += 1
+                if count % CSV_CHUNK_SIZE == 0:
+                    zip_entry.write(csv_file.getvalue().encode("utf-8"))
+                    csv_file.seek(0)
+                    csv_file.truncate()
+                    yield stream.pop()
+
+            zip_entry.write(csv_file.getvalue().encode("utf-8"))
+    yield stream.pop()
+
+    logger.info(
+        f"Streaming {count} observations took {time.time() - start_time:.4f} seconds"
+    )
+
+
+def stream_csv(
+    observation_list: QuerySet | bool | None, prefix: str
+) -> tuple[Iterator[bytes], str]:
+    """
+    Creates a zipped CSV file of observations that is written while it is read.
+
+    The observations are read from the database with a server-side cursor and the
+    zip file is produced a chunk of rows at a time, so memory use doesn't depend on
+    the number of observations and the first bytes can be sent straight away. If
+    no observations are given, all observations are included.
+
+    Args:
+        observation_list (QuerySet | bool | None): The observations to include.
+        prefix (str): A prefix for the zip file name.
 
-    all_observations = False
-    if not observation_list:
+    Returns:
+        tuple[Iterator[bytes], str]: The contents of the zip file, in pieces, and
+        the name of the zip file.
+    """
+    # Checked with exists() so that a queryset isn't loaded just to test it
+    all_observations = (
+        not isinstance(observation_list, QuerySet) or not observation_list.exists()
+    )
+    if all_observations:
         logger.info("No observation list provided, retrieving all observations")
         observation_list = Observation.objects.all()
-        all_observations = True
 
     observation_list = observation_list.select_related("satellite_id", "location_id")
 
@@ -103,97 +254,128 @@ def create_csv(
     else:
         file_name = "satellite_observations_search_results"
 
-    header = get_csv_header()
-    logger.info("CSV header retrieved")
+    return _iter_csv_zip(observation_list, file_name), f"{file_name}.zip"
 
-    # Use BytesIO for the zip file
-    zipped_file = io.BytesIO()
 
-    with zipfile.ZipFile(zipped_file, "w") as zip:
-        # Create a StringIO stream for the CSV
-        with io.StringIO() as csv_file:
-            writer = csv.writer(csv_file)
-            writer.writerow(header)
-
-            # Write rows in chunks
-            chunk_size = 1000  # Adjust chunk size as needed
-            for i in range(0, len(observation_list), chunk_size):
-                chunk = observation_list[i : i + chunk_size]
-                csv_lines = []
-                for observation in chunk:
-                    # format ORC ID string properly
-                    orc_id = (
-                        ", ".join(observation.obs_orc_id)
-                        if isinstance(observation.obs_orc_id, list)
-                        else observation.obs_orc_id.replace("[", "").replace("]", "")
-                    )
-                    if "," in orc_id:
-                        orc_id = f'"{orc_id}"'
-
-                    # format date/time to match upload format
-                    obs_time_utc = (
-                        observation.obs_time_utc.strftime("%Y-%m-%dT%H:%M:%S.%fZ")[:-4]
-                        + "Z"
-                    )
-
-                    csv_lines.append(
-                        [
-                            observation.satellite_id.sat_name,
-                            observation.satellite_id.sat_number,
-                            obs_time_utc,
-                            observation.obs_time_uncert_sec,
-                            observation.apparent_mag,
-                            observation.apparent_mag_uncert,
-                            observation.location_id.obs_lat_deg,
-                            observation.location_id.obs_long_deg,
-                            observation.location_id.obs_alt_m,
-                            observation.limiting_magnitude,
-                            observation.instrument,
-                            observation.obs_mode,
-                            observation.obs_filter,
-                            orc_id,
-                            observation.sat_ra_deg,
-                            observation.sat_dec_deg,
-                            observation.sigma_2_ra,
-                            observation.sigma_ra_sigma_dec,
-                            observation.sigma_2_dec,
-                            observation.range_to_sat_km,
-                            observation.range_to_sat_uncert_km,
-                            observation.range_rate_sat_km_s,
-                            observation.range_rate_sat_uncert_km_s,
-                            observation.comments,
-                            observation.data_archive_link,
-                            observation.mpc_code,
-                            observation.sat_ra_deg_satchecker,
-                            observation.sat_dec_deg_satchecker,
-                            observation.range_to_sat_km_satchecker,
-                            observation.range_rate_sat_km_s_satchecker,
-                            observation.ddec_deg_s_satchecker,
-                            observation.dra_cosdec_deg_s_satchecker,
-                            observation.phase_angle,
-                            observation.alt_deg_satchecker,
-                            observation.az_deg_satchecker,
-                            observation.sat_altitude_km_satchecker,
-                            observation.solar_elevation_deg_satchecker,
-                            observation.solar_azimuth_deg_satchecker,
-                            observation.illuminated,
-                            observation.satellite_id.intl_designator,
-                            observation.potentially_discrepant,
-                        ]
-                    )
-
-                # Write the chunk to the CSV file
-                writer.writerows(csv_lines)
-
-            # Write the CSV content to the zip file as bytes
-            zip.writestr(f"{file_name}.csv", csv_file.getvalue().encode("utf-8"))
-
-    zipped_file.seek(0)
-    zipfile_name = f"{file_name}.zip"
-
-    logger.info(f"Zipping the CSV file took {time.time() - start_time:.4f} seconds")
-    logger.info(
-        f"Total create_csv execution time: {time.time() - start_time:.4f} seconds"
+def _archive_metadata_path() -> str:
+    return f"{settings.ARCHIVE_SNAPSHOT_DIR}/{ARCHIVE_SNAPSHOT_NAME}.json"
+
+
+def _read_archive_metadata() -> dict | None:
+    try:
+        with default_storage.open(_archive_metadata_path(), "rb") as metadata_file:
+            return json.load(metadata_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_archive_metadata(metadata: dict) -> None:
+    # The metadata file is replaced without ever being missing, so download_all
+    # doesn't fall back to a live export while a new snapshot is swapped in
+    metadata_path = _archive_metadata_path()
+    content = json.dumps(metadata).encode("utf-8")
+    temp_path = default_storage.save(f"{metadata_path}.tmp", ContentFile(content))
+    try:
+        os.replace(default_storage.path(temp_path), default_storage.path(metadata_path))
+    except NotImplementedError:
+        # Remote storages have no local paths, but replace objects atomically
+        default_storage.delete(temp_path)
+        with default_storage.open(metadata_path, "wb") as metadata_file:
+            metadata_file.write(content)
+
+
+def _archive_state() -> dict:
+    # The snapshot needs rebuilding when observations are added or removed, or when
+    # an observation, or the satellite or location it refers to, is edited. Edits
+    # made with QuerySet.update() or bulk_update() don't set date_updated, so they
+    # are only picked up by a forced rebuild.
+    state = Observation.objects.aggregate(
+        count=Count("id"), observation_updated=Max("date_updated")
+    )
+    state |= Satellite.objects.aggregate(satellite_updated=Max("date_updated"))
+    state |= Location.objects.aggregate(location_updated=Max("date_updated"))
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in state.items()
+    }
+
+
+def get_archive_snapshot() -> ArchiveSnapshot | None:
+    """
+    Returns the stored zipped CSV file of all observations.
+
+    Returns:
+        ArchiveSnapshot | None: The storage path, content hash and build time of the
+        snapshot, or None if it hasn't been built.
+    """
+    metadata = _read_archive_metadata()
+    if not metadata or not default_storage.exists(metadata["path"]):
+        return None
+    return ArchiveSnapshot(
+        metadata["path"],
+        metadata["etag"],
+        datetime.fromisoformat(metadata["last_modified"]),
+        f"{ARCHIVE_SNAPSHOT_NAME}.zip",
     )
 
-    return zipped_file, zipfile_name
+
+def build_archive_snapshot(force: bool = False) -> bool:
+    """
+    Builds the zipped CSV file of all observations served by download_all.
+
+    The file is written to a temporary file while its SHA-256 hash is calculated,
+    then saved in the default storage under a name that includes the hash, along
+    with a small JSON file describing it, which replaces the previous one in a
+    single step. The previous snapshot is removed once the new one is in place.
+    Nothing is rebuilt unless observations have been added, removed or edited
+    since the last snapshot, including edits to their satellites and locations.
+
+    Args:
+        force (bool): Rebuild the snapshot even if no observations have changed.
+
+    Returns:
+        bool: True if a new snapshot was built.
+    """
+    metadata = _read_archive_metadata()
+    state = _archive_state()
+    if (
+        not force
+        and metadata
+        and metadata["state"] == state
+        and default_storage.exists(metadata["path"])
+    ):
+        logger.info("Archive snapshot is up to date")
+        return False
+
+    start_time = time.time()
+    digest = hashlib.sha256()
+    zip_chunks, _ = stream_csv(False, None)
+    with tempfile.TemporaryFile() as snapshot_file:
+        for chunk in zip_chunks:
+            snapshot_file.write(chunk)
+            digest.update(chunk)
+        snapshot_file.seek(0)
+
+        etag = digest.hexdigest()
+        path = default_storage.save(
+            f"{settings.ARCHIVE_SNAPSHOT_DIR}/{ARCHIVE_SNAPSHOT_NAME}_{etag[:16]}.zip",
+            File(snapshot_file),
+        )
+
+    _write_archive_metadata(
+        {
+            "path": path,
+            "etag": etag,
+            "last_modified": timezone.now().isoformat(),
+            "state": state,
+        }
+    )
+
+    if metadata and metadata["path"] != path:
+        default_storage.delete(metadata["path"])
+
+    logger.info(
+        f"Building the archive snapshot of {state['count']} observations took "
+        f"{time.time() - start_time:.4f} seconds"
+    )
+    return True
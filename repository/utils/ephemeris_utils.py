@@ -0,0 +1,468 @@
+import logging
+from collections import defaultdict, namedtuple
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import UTC, datetime, timedelta
+
+import astropy.units as u
+import numpy as np
+from astropy.constants import R_earth
+from astropy.coordinates import (
+    GCRS,
+    ITRS,
+    TEME,
+    AltAz,
+    CartesianDifferential,
+    CartesianRepresentation,
+    EarthLocation,
+    get_body,
+)
+from astropy.time import Time
+from astropy.utils import iers
+from sgp4.api import Satrec
+
+from repository.models import TLE, Satellite
+from repository.utils.general_utils import (
+    ARCHIVAL_TLE_AGE_DAYS,
+    SatCheckerData,
+    below_line_of_sight,
+)
+
+logger = logging.getLogger(__name__)
+
+# A TLE more than this far after the observation can't be used to check it
+MAX_TLE_AGE = timedelta(days=ARCHIVAL_TLE_AGE_DAYS)
+
+# Time step used to calculate the RA/Dec and range rates by finite differences
+RATE_STEP_SEC = 0.5
+
+
+def parse_tle_lines(lines: Iterable[str]) -> Iterator[TLE]:
+    """
+    Parses TLEs from the lines of a TLE file.
+
+    Both the three line format (with a name line before each TLE) and the plain two
+    line format are supported. Lines that aren't part of a valid TLE are skipped.
+
+    Args:
+        lines (Iterable[str]): The lines of the file.
+
+    Yields:
+        TLE: An unsaved TLE for each entry in the file, in file order.
+    """
+    name = ""
+    line1 = None
+    for raw_line in lines:
+        line = raw_line.rstrip()
+        if not line:
+            continue
+        if line.startswith("1 ") and len(line) >= 69:
+            line1 = line
+        elif line.startswith("2 ") and line1 is not None and len(line) >= 69:
+            try:
+                satrec = Satrec.twoline2rv(line1, line)
+            except ValueError as e:
+                logger.warning(f"Skipping invalid TLE for {name or line1[2:7]}: {e}")
+            else:
+                epoch = Time(
+                    satrec.jdsatepoch, satrec.jdsatepochF, format="jd", scale="utc"
+                )
+                yield TLE(
+                    sat_number=satrec.satnum,
+                    name=name,
+                    line1=line1,
+                    line2=line,
+                    epoch=epoch.to_datetime(timezone=UTC),
+                )
+            name = ""
+            line1 = None
+        else:
+            # Name lines in 3LE files are sometimes prefixed with "0 "
+            name = line[2:].strip() if line.startswith("0 ") else line.strip()
+            line1 = None
+
+
+def import_tles(tles: Iterable[TLE], batch_size: int = 1000) -> int:
+    """
+    Saves TLEs to the database in batches, skipping any that are already stored.
+
+    Args:
+        tles (Iterable[TLE]): Unsaved TLEs, e.g. from parse_tle_lines.
+        batch_size (int): Number of TLEs inserted per query.
+
+    Returns:
+        int: The number of TLEs read.
+    """
+    count = 0
+    batch = []
+    for tle in tles:
+        batch.append(tle)
+        if len(batch) >= batch_size:
+            TLE.objects.bulk_create(batch, ignore_conflicts=True)
+            count += len(batch)
+            batch = []
+    TLE.objects.bulk_create(batch, ignore_conflicts=True)
+    count += len(batch)
+    return count
+
+
+def get_closest_tle(sat_number: int, obs_time: datetime) -> TLE | None:
+    """
+    Returns the stored TLE with the epoch closest to the observation time, or None
+    if there are no TLEs for the satellite.
+
+    The latest TLE before and the earliest TLE after the observation are fetched in
+    one query, each with a lookup on the (NORAD ID, epoch) index.
+    """
+    tles = TLE.objects.filter(sat_number=sat_number)
+    before = tles.filter(epoch__lte=obs_time).order_by("-epoch")[:1]
+    after = tles.filter(epoch__gt=obs_time).order_by("epoch")[:1]
+    candidates = list(before.union(after, all=True))
+    if not candidates:
+        return None
+    return min(candidates, key=lambda tle: abs(tle.epoch - obs_time))
+
+
+def get_satellite_names(sat_number: int) -> tuple[set[str], str | None]:
+    """
+    Returns every name stored with a satellite's TLEs and the name from its most
+    recent TLE.
+
+    TLEs imported in the two line format have no name, so if none of the
+    satellite's TLEs has one, the names of the satellite in SCORE are used instead,
+    with the most recently added as the current name. Both are empty if the
+    satellite isn't named anywhere.
+    """
+    tles = TLE.objects.filter(sat_number=sat_number).exclude(name="")
+    names = set(tles.values_list("name", flat=True).distinct())
+    current_name = tles.order_by("-epoch").values_list("name", flat=True).first()
+    if names:
+        return names, current_name
+
+    satellites = (
+        Satellite.objects.filter(sat_number=sat_number)
+        .exclude(sat_name__isnull=True)
+        .exclude(sat_name="")
+        .order_by("-date_added")
+    )
+    names = set(satellites.values_list("sat_name", flat=True))
+    current_name = satellites.values_list("sat_name", flat=True).first()
+    return names, current_name
+
+
+def format_intl_designator(line1: str) -> str | None:
+    """Converts the designator in a TLE (e.g. 24001A) to the 2024-001A format."""
+    designator = line1[9:17].strip()
+    if len(designator) < 6 or not designator[:5].isdigit():
+        return None
+    year = int(designator[:2])
+    year += 1900 if year >= 57 else 2000
+    return f"{year}-{designator[2:]}"
+
+
+def compute_ephemeris(
+    tle: TLE,
+    times: Time,
+    latitude: float,
+    longitude: float,
+    altitude: float,
+) -> dict[str, np.ndarray]:
+    """
+    Calculates the SatChecker ephemeris fields for a satellite at one or more times.
+
+    The satellite is propagated with SGP4 for every time at once, and the positions
+    are converted from the TEME frame with astropy. Rates are found by propagating
+    RATE_STEP_SEC either side of each time in the same call. The Sun is treated as a
+    point source when deciding whether the satellite is illuminated.
+
+    No network access is needed - astropy is told not to download Earth orientation
+    data, which limits the accuracy of the positions to a few arcseconds.
+
+    Args:
+        tle (TLE): The TLE to propagate.
+        times (Time): The observation time(s).
+        latitude (float): The latitude of the observer in degrees.
+        longitude (float): The longitude of the observer in degrees.
+        altitude (float): The altitude of the observer in meters.
+
+    Returns:
+        dict[str, np.ndarray]: Arrays with one value per time, using the SatChecker
+        field names, and an "error" array with the SGP4 error code (0 if valid).
+    """
+    times = Time(np.atleast_1d(times.utc.jd), format="jd", scale="utc")
+    n_times = len(times)
+    step = RATE_STEP_SEC * u.s
+    all_times = Time(
+        np.concatenate([(times - step).jd, times.jd, (times + step).jd]),
+        format="jd",
+        scale="utc",
+    )
+
+    satrec = Satrec.twoline2rv(tle.line1, tle.line2)
+    error, position, velocity = satrec.sgp4_array(all_times.jd1, all_times.jd2)
+
+    with (
+        iers.conf.set_temp("auto_download", False),
+        iers.conf.set_temp("iers_degraded_accuracy", "ignore"),
+    ):
+        teme = TEME(
+            CartesianRepresentation(
+                position.T * u.km,
+                differentials=CartesianDifferential(velocity.T * u.km / u.s),
+            ),
+            obstime=all_times,
+        )
+        location = EarthLocation.from_geodetic(
+            longitude * u.deg, latitude * u.deg, altitude * u.m
+        )
+        obsgeoloc, obsgeovel = location.get_gcrs_posvel(all_times)
+
+        topocentric = teme.transform_to(
+            GCRS(obstime=all_times, obsgeoloc=obsgeoloc, obsgeovel=obsgeovel)
+        )
+        altaz = teme.transform_to(AltAz(obstime=all_times, location=location))
+        sat_height = teme.transform_to(ITRS(obstime=all_times)).earth_location.height
+
+        current = slice(n_times, 2 * n_times)
+        sun = get_body("sun", times)
+        sun_altaz = sun.transform_to(AltAz(obstime=times, location=location))
+        sat_xyz = teme[current].transform_to(GCRS(obstime=times)).cartesian.xyz
+        sun_xyz = sun.cartesian.xyz
+        observer_xyz = obsgeoloc[current].xyz
+
+    # Phase angle - the angle at the satellite between the Sun and the observer
+    to_sun = (sun_xyz - sat_xyz).to_value(u.km)
+    to_observer = (observer_xyz - sat_xyz).to_value(u.km)
+    cos_phase = np.sum(to_sun * to_observer, axis=0) / (
+        np.linalg.norm(to_sun, axis=0) * np.linalg.norm(to_observer, axis=0)
+    )
+    phase_angle = np.degrees(np.arccos(np.clip(cos_phase, -1, 1)))
+
+    # The satellite is in shadow if the line from it to the Sun passes through
+    # the Earth
+    sat_km = sat_xyz.to_value(u.km)
+    sun_direction = to_sun / np.linalg.norm(to_sun, axis=0)
+    along = np.sum(sat_km * sun_direction, axis=0)
+    closest_approach = np.linalg.norm(sat_km - along * sun_direction, axis=0)
+    illuminated = (along > 0) | (closest_approach > R_earth.to_value(u.km))
+
+    def before_after(values):
+        return values[:n_times], values[current], values[2 * n_times :]
+
+    ra_before, ra, ra_after = before_after(topocentric.ra.deg)
+    dec_before, dec, dec_after = before_after(topocentric.dec.deg)
+    range_before, range_km, range_after = before_after(altaz.distance.to_value(u.km))
+    two_steps = 2 * RATE_STEP_SEC
+    # Wrap the RA difference so that crossing 0h doesn't produce a huge rate
+    dra = (ra_after - ra_before + 180) % 360 - 180
+
+    return {
+        "error": error[current],
+        "right_ascension_deg": ra,
+        "declination_deg": dec,
+        "dra_cosdec_deg_per_sec": dra * np.cos(np.radians(dec)) / two_steps,
+        "ddec_deg_per_sec": (dec_after - dec_before) / two_steps,
+        "altitude_deg": altaz.alt.deg[current],
+        "azimuth_deg": altaz.az.deg[current],
+        "range_km": range_km,
+        "range_rate_km_per_sec": (range_after - range_before) / two_steps,
+        "phase_angle_deg": phase_angle,
+        "illuminated": illuminated,
+        "sat_altitude_km": sat_height.to_value(u.km)[current],
+        "solar_elevation_deg": sun_altaz.alt.deg,
+        "solar_azimuth_deg": sun_altaz.az.deg,
+    }
+
+
+def archival_data(satellite_name: str) -> SatCheckerData:
+    """Returns the SatCheckerData used for observations that can't be checked."""
+    return SatCheckerData(
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        satellite_name,
+        None,
+        None,
+        None,
+        None,
+    )
+
+
+# An observation that passed the checks in prepare_local_lookup, with the TLE and
+# satellite name its ephemeris is calculated with
+LocalLookup = namedtuple(
+    "LocalLookup",
+    ["tle", "obs_time", "latitude", "longitude", "altitude", "satellite_name"],
+)
+
+
+def prepare_local_lookup(
+    satellite_name: str,
+    sat_number: int,
+    observation_time: str | Time,
+    latitude: float,
+    longitude: float,
+    altitude: float,
+) -> SatCheckerData | str | LocalLookup:
+    """
+    Runs the checks of local_additional_data that don't need the ephemeris.
+
+    Observations without a TLE within 14 days are treated as archival data, and the
+    satellite name must match one of the names stored with the satellite's TLEs.
+    Satellites without any stored TLEs are also treated as archival data, since the
+    TLE catalog may not be complete.
+
+    Args:
+        satellite_name (str): The name of the satellite.
+        sat_number (int): The catalog number of the satellite.
+        observation_time (Union[str, Time]): The time of observation.
+        latitude (float): The latitude of the observation location.
+        longitude (float): The longitude of the observation location.
+        altitude (float): The altitude of the observation location.
+
+    Returns:
+        Union[SatCheckerData, str, LocalLookup]: The archival SatCheckerData, an
+        error message string if the name check failed, or a LocalLookup to pass to
+        complete_local_lookups.
+    """
+    obs_time = Time(observation_time, format="isot", scale="utc")
+    obs_datetime = obs_time.to_datetime(timezone=UTC)
+
+    tle = get_closest_tle(sat_number, obs_datetime)
+    if tle is None or tle.epoch - obs_datetime > MAX_TLE_AGE:
+        return archival_data(satellite_name)
+
+    if satellite_name and satellite_name != tle.name:
+        names, current_name = get_satellite_names(sat_number)
+        # The name can only be checked if the satellite is named somewhere
+        if names and satellite_name not in names:
+            return "Satellite name and number do not match"
+        updated_satellite_name = current_name or satellite_name
+    elif obs_time < Time("2024-05-01T00:00:00.000", format="isot"):
+        # Older observations use the current name, as with SatChecker
+        updated_satellite_name = get_satellite_names(sat_number)[1] or None
+    else:
+        updated_satellite_name = tle.name or None
+
+    return LocalLookup(
+        tle, obs_time, latitude, longitude, altitude, updated_satellite_name
+    )
+
+
+def complete_local_lookups(
+    lookups: Sequence[LocalLookup],
+) -> list[SatCheckerData | str]:
+    """
+    Calculates the SatChecker fields for observations checked by
+    prepare_local_lookup.
+
+    Observations of the same satellite with the same TLE and location are
+    calculated in a single call to compute_ephemeris, so the SGP4 propagation, the
+    Sun's position and the frame transformations are done once for all of their
+    times. The satellite must be above the horizon at each time.
+
+    Args:
+        lookups (Sequence[LocalLookup]): The observations to calculate.
+
+    Returns:
+        list[Union[SatCheckerData, str]]: A SatCheckerData namedtuple, or an error
+        message string, for each lookup in order.
+    """
+    groups = defaultdict(list)
+    for index, lookup in enumerate(lookups):
+        key = (lookup.tle.pk, lookup.latitude, lookup.longitude, lookup.altitude)
+        groups[key].append(index)
+
+    results = [None] * len(lookups)
+    for indices in groups.values():
+        first = lookups[indices[0]]
+        ephemeris = compute_ephemeris(
+            first.tle,
+            Time([lookups[index].obs_time for index in indices]),
+            first.latitude,
+            first.longitude,
+            first.altitude,
+        )
+        for position, index in enumerate(indices):
+            results[index] = _local_result(lookups[index], ephemeris, position)
+    return results
+
+
+def _local_result(
+    lookup: LocalLookup, ephemeris: dict[str, np.ndarray], position: int
+) -> SatCheckerData | str:
+    if ephemeris["error"][position] != 0:
+        return "Satellite position check failed - verify uploaded data is correct."
+
+    alt_deg = float(ephemeris["altitude_deg"][position])
+    if below_line_of_sight(alt_deg, lookup.altitude):
+        return f"Satellite below horizon at this time and location ({alt_deg:.2f}°)"
+
+    def value(field):
+        return round(float(ephemeris[field][position]), 7)
+
+    return SatCheckerData(
+        phase_angle=value("phase_angle_deg"),
+        range_to_sat=value("range_km"),
+        range_rate=value("range_rate_km_per_sec"),
+        illuminated=bool(ephemeris["illuminated"][position]),
+        alt_deg=value("altitude_deg"),
+        az_deg=value("azimuth_deg"),
+        ddec_deg_s=value("ddec_deg_per_sec"),
+        dra_cosdec_deg_s=value("dra_cosdec_deg_per_sec"),
+        sat_dec_deg=value("declination_deg"),
+        sat_ra_deg=value("right_ascension_deg"),
+        satellite_name=lookup.satellite_name,
+        intl_designator=format_intl_designator(lookup.tle.line1),
+        sat_altitude_km=value("sat_altitude_km"),
+        solar_elevation_deg=value("solar_elevation_deg"),
+        solar_azimuth_deg=value("solar_azimuth_deg"),
+    )
+
+
+def local_additional_data(
+    satellite_name: str,
+    sat_number: int,
+    observation_time: str | Time,
+    latitude: float,
+    longitude: float,
+    altitude: float,
+) -> SatCheckerData | str:
+    """
+    Local replacement for the SatChecker lookup in add_additional_data.
+
+    Uses the stored TLE closest to the observation time to calculate the same fields
+    SatChecker provides, and applies the same checks: observations without a TLE
+    within 14 days are treated as archival data, the satellite name must match one
+    of the names stored with the satellite's TLEs, and the satellite must be above
+    the horizon. Satellites without any stored TLEs are also treated as archival
+    data, since the TLE catalog may not be complete.
+
+    Batches of observations should use prepare_local_lookup and
+    complete_local_lookups instead, which calculate the ephemeris of many
+    observations at once.
+
+    Args:
+        satellite_name (str): The name of the satellite.
+        sat_number (int): The catalog number of the satellite.
+        observation_time (Union[str, Time]): The time of observation.
+        latitude (float): The latitude of the observation location.
+        longitude (float): The longitude of the observation location.
+        altitude (float): The altitude of the observation location.
+
+    Returns:
+        Union[SatCheckerData, str]: A SatCheckerData namedtuple, or an error message
+        string if one of the checks failed.
+    """
+    lookup = prepare_local_lookup(
+        satellite_name, sat_number, observation_time, latitude, longitude, altitude
+    )
+    if not isinstance(lookup, LocalLookup):
+        return lookup
+    return complete_local_lookups([lookup])[0]
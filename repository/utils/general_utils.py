@@ -1,18 +1,34 @@
+import hashlib
 import json
 import logging
+import math
+import os
+import threading
+import time
 from collections import namedtuple
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any
 
 import astropy.units as u
 import numpy as np
 import requests
 from astropy.constants import R_earth
 from astropy.time import Time
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Count, Q
 from requests import Response
 
 from repository.models import Observation, Satellite
+from repository.utils import satchecker_client
 
 logger = logging.getLogger(__name__)
+
+# Observations more than this many days before the TLE used to check them are
+# treated as archival data
+ARCHIVAL_TLE_AGE_DAYS = 14
 # Named tuple to represent additional data from SatChecker for each observation
 SatCheckerData = namedtuple(
     "SatCheckerData",
@@ -36,47 +52,35 @@ SatCheckerData = namedtuple(
 )
 
 
-# Statistics for main page
-def get_stats():
-    """
-    Retrieves statistics for the main page.
+# Statistics shown on the main page, see get_stats
+HomepageStats = namedtuple(
+    "HomepageStats",
+    [
+        "satellite_count",
+        "observation_count",
+        "observer_count",
+        "latest_obs_list",
+        "observer_locations",
+    ],
+)
 
-    This function retrieves the count of satellites, observations, and observers,
-    as well as a list of the latest observations. If there are no observations,
-    it returns a stats object with all fields set to 0 or empty.The latest observations
-    are returned as a list of tuples, where each tuple contains an Observation object
-    and its JSON representation.
+HOMEPAGE_STATS_CACHE_KEY = "homepage_stats"
+VISUALIZATION_STATS_CACHE_KEY = "visualization_stats"
 
-    Returns:
-        stats: A namedtuple containing the following fields:
-            - satellite_count (int): The total number of satellites.
-            - observation_count (int): The total number of observations.
-            - observer_count (int): The total number of distinct observers.
-            - latest_obs_list (list): A list of the 7 most recent observations, each
-              represented as a tuple containing an Observation object and its
-              JSON representation.
-    """
-    stats = namedtuple(
-        "stats",
-        [
-            "satellite_count",
-            "observation_count",
-            "observer_count",
-            "latest_obs_list",
-            "observer_locations",
-        ],
-    )
 
+def _compute_stats() -> HomepageStats:
     observation_count = Observation.objects.count()
     if observation_count == 0:
-        return stats(0, 0, 0, [])
+        return HomepageStats(0, 0, 0, [], json.dumps([]))
     satellite_count = Satellite.objects.count()
 
     observer_count = (
         Observation.objects.values("location_id", "obs_email").distinct().count()
     )
-    latest_obs_list = Observation.objects.order_by("-date_added")[:7].select_related(
-        "satellite_id", "location_id"
+    latest_obs_list = list(
+        Observation.objects.order_by("-date_added")[:7].select_related(
+            "satellite_id", "location_id"
+        )
     )
 
     # Get all observer locations (the latitude and longitude) and a count of how many
@@ -92,7 +96,7 @@ def get_stats():
     observer_locations_list = list(observer_locations)
     observer_locations_json = json.dumps(observer_locations_list)
 
-    return stats(
+    return HomepageStats(
         satellite_count,
         observation_count,
         observer_count,
@@ -101,6 +105,161 @@ def get_stats():
     )
 
 
+def get_stats() -> HomepageStats:
+    """
+    Retrieves statistics for the main page.
+
+    This function retrieves the count of satellites, observations, and observers,
+    as well as a list of the latest observations and the observer locations. If
+    there are no observations, it returns a stats object with all fields set to 0
+    or empty.
+
+    The statistics are cached, so the observation table is only scanned again once
+    an upload has finished (see invalidate_stats) or after STATS_CACHE_TIMEOUT
+    seconds. If the cache can't be reached they are computed for every request.
+
+    Returns:
+        HomepageStats: A namedtuple containing the following fields:
+            - satellite_count (int): The total number of satellites.
+            - observation_count (int): The total number of observations.
+            - observer_count (int): The total number of distinct observers.
+            - latest_obs_list (list): The 7 most recently added observations.
+            - observer_locations (str): A JSON list of the observer locations with
+              the number of observations made at each.
+    """
+    try:
+        cached = cache.get(HOMEPAGE_STATS_CACHE_KEY)
+    except Exception as e:
+        logger.warning(f"Stats cache unavailable: {e}")
+        return _compute_stats()
+    if cached is not None:
+        return cached
+
+    stats = _compute_stats()
+    try:
+        cache.set(HOMEPAGE_STATS_CACHE_KEY, stats, settings.STATS_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Stats cache unavailable: {e}")
+    return stats
+
+
+def invalidate_stats() -> None:
+    """
+    Clears the cached main page and visualization page statistics, called when an
+    upload has finished.
+    """
+    try:
+        cache.delete_many([HOMEPAGE_STATS_CACHE_KEY, VISUALIZATION_STATS_CACHE_KEY])
+    except Exception as e:
+        logger.warning(f"Stats cache unavailable: {e}")
+
+
+# SatChecker response rebuilt from the cache - provides the parts of
+# requests.Response that validate_position and add_additional_data use
+class CachedResponse(namedtuple("CachedResponse", ["status_code", "data"])):
+    def json(self):
+        return self.data
+
+
+def _satchecker_cache_key(endpoint: str, params: dict) -> str:
+    query = json.dumps(params, sort_keys=True, default=str)
+    return "satchecker:" + hashlib.sha256(f"{endpoint}?{query}".encode()).hexdigest()
+
+
+def get_satchecker_response(endpoint: str, params: dict) -> CachedResponse | Response:
+    """
+    Gets a SatChecker API response, using the cache if the same request was made
+    recently.
+
+    The cache key is built from the endpoint and all query parameters, so for ephemeris
+    requests it covers the NORAD ID, Julian date and observer position. Responses
+    with data are cached for SATCHECKER_CACHE_TIMEOUT seconds. Negative results
+    (no data, client errors and TLE out of range errors) are cached separately for
+    the shorter SATCHECKER_CACHE_NEGATIVE_TIMEOUT, so that a satellite that isn't
+    in the catalog yet is checked again reasonably soon. Other server errors and
+    responses larger than SATCHECKER_CACHE_MAX_BYTES are never cached.
+
+    The cache is only a shortcut - if it can't be reached, the request is sent to
+    SatChecker as usual.
+
+    Args:
+        endpoint (str): The SatChecker endpoint path.
+        params (dict): The query parameters for the request.
+
+    Returns:
+        CachedResponse | Response: The response, with status_code and json().
+
+    Raises:
+        requests.exceptions.RequestException: If the request to SatChecker fails.
+    """
+    key = _satchecker_cache_key(endpoint, params)
+    try:
+        cached = cache.get(key)
+    except Exception as e:
+        logger.warning(f"SatChecker cache unavailable: {e}")
+        cached = None
+    if cached is not None:
+        return CachedResponse(*cached)
+
+    response = satchecker_client.get(endpoint, params)
+    try:
+        data = response.json()
+    except ValueError:
+        return response
+
+    has_data = isinstance(data, dict) and bool(data.get("data"))
+    if response.status_code == 200 and has_data:
+        timeout = settings.SATCHECKER_CACHE_TIMEOUT
+    elif response.status_code < 500 or (
+        isinstance(data, dict)
+        and "Error: TLE date out of range" in str(data.get("message"))
+    ):
+        timeout = settings.SATCHECKER_CACHE_NEGATIVE_TIMEOUT
+    else:
+        # Server errors are usually temporary, so the next upload should retry
+        return response
+
+    if len(json.dumps(data)) <= settings.SATCHECKER_CACHE_MAX_BYTES:
+        try:
+            cache.set(key, (response.status_code, data), timeout)
+        except Exception as e:
+            logger.warning(f"SatChecker cache unavailable: {e}")
+    return response
+
+
+def check_position_fields(
+    sat_number: int,
+    observation_time: str | Time,
+    latitude: float,
+    longitude: float,
+    altitude: float,
+) -> str | None:
+    """
+    Returns the error message add_additional_data gives for missing or out of range
+    fields, or None if the satellite position can be checked.
+    """
+    missing_fields = []
+
+    if not sat_number:
+        missing_fields.append("sat_number")
+    if not observation_time:
+        missing_fields.append("observation_time")
+    if latitude is None or not (-90 <= latitude <= 90):
+        missing_fields.append("latitude")
+    if longitude is None or not (-180 <= longitude <= 180):
+        missing_fields.append("longitude")
+    if altitude is None:
+        missing_fields.append("altitude")
+
+    if missing_fields:
+        missing_fields_str = ", ".join(missing_fields)
+        return (
+            "Satellite position check failed - check your data. "
+            f"Missing or incorrect fields: {missing_fields_str}"
+        )
+    return None
+
+
 # Validate satellite position is above horizon using SatChecker and add additional data
 # from the SatChecker response if successful
 def add_additional_data(
@@ -136,27 +295,21 @@ def add_additional_data(
         if the satellite is above the horizon. Returns an error message string or False
         otherwise.
     """
-    missing_fields = []
+    missing_fields_error = check_position_fields(
+        sat_number, observation_time, latitude, longitude, altitude
+    )
+    if missing_fields_error:
+        return missing_fields_error
 
-    if not sat_number:
-        missing_fields.append("sat_number")
-    if not observation_time:
-        missing_fields.append("observation_time")
-    if latitude is None or not (-90 <= latitude <= 90):
-        missing_fields.append("latitude")
-    if longitude is None or not (-180 <= longitude <= 180):
-        missing_fields.append("longitude")
-    if altitude is None:
-        missing_fields.append("altitude")
+    if settings.EPHEMERIS_BACKEND == "local":
+        # Imported here as ephemeris_utils depends on this module
+        from repository.utils.ephemeris_utils import local_additional_data
 
-    if missing_fields:
-        missing_fields_str = ", ".join(missing_fields)
-        return (
-            "Satellite position check failed - check your data. "
-            f"Missing or incorrect fields: {missing_fields_str}"
+        return local_additional_data(
+            satellite_name, sat_number, observation_time, latitude, longitude, altitude
         )
+
     obs_time = Time(observation_time, format="isot", scale="utc")
-    url = "https://satchecker.cps.iau.org/ephemeris/catalog-number/"
     params = {
         "catalog": sat_number,
         "latitude": latitude,
@@ -166,7 +319,7 @@ def add_additional_data(
         "min_altitude": -90,
     }
     try:
-        r = requests.get(url, params=params, timeout=60)
+        r = get_satchecker_response("/ephemeris/catalog-number/", params)
     except requests.exceptions.RequestException:
         return "Satellite position check failed - try again later."
 
@@ -185,14 +338,13 @@ def add_additional_data(
         # current satellite name is used instead of something like
         # "STARLINK K"
 
-        url = "https://satchecker.cps.iau.org/tools/names-from-norad-id/"
         params = {
             "id": sat_number,
         }
 
         error = None
         try:
-            response = requests.get(url, params=params, timeout=60)
+            response = get_satchecker_response("/tools/names-from-norad-id/", params)
             if response.status_code != 200:
                 error = "Satellite info check failed - check the input and try again."
                 raise Exception(requests.exceptions.RequestException(error))
@@ -279,6 +431,219 @@ def add_additional_data(
     return is_valid
 
 
+# The SatChecker thread pool of this process, see get_satchecker_executor
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_satchecker_executor() -> ThreadPoolExecutor:
+    """
+    Returns the thread pool that runs the SatChecker lookups of this process.
+
+    The pool is shared by every upload in the process, so its threads, and the
+    cache connections they open, are reused from one batch of lookups to the next.
+    Celery forks its workers, and threads don't survive a
+    fork, so each process creates its own pool the first time it is used.
+
+    Returns:
+        ThreadPoolExecutor: The shared pool, with SATCHECKER_MAX_WORKERS threads.
+    """
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.SATCHECKER_MAX_WORKERS,
+                    thread_name_prefix="satchecker",
+                )
+                _executor_pid = pid
+    return _executor
+
+
+@contextmanager
+def additional_data_pool(
+    fetch: Callable[[Any], SatCheckerData | str | bool],
+    items: Sequence[Any],
+    additional_data_args: Callable[[Any], tuple | None] | None = None,
+) -> Iterator[list[Future]]:
+    """
+    Runs the SatChecker lookups for a batch of observations on a bounded thread pool.
+
+    Each lookup is dominated by the wait on the SatChecker API, so running them
+    concurrently means a batch takes roughly as long as its slowest requests rather
+    than the sum of all of them. One future is returned per item, in the same order
+    as the items, so callers can walk the results row by row and report errors
+    against the same row (and index) as when the lookups were done one at a time.
+    Exceptions raised by the lookup are re-raised by the future's result().
+
+    The lookups run on the process's SatChecker thread pool (see
+    get_satchecker_executor), so at most SATCHECKER_MAX_WORKERS of them run at
+    once. Lookups that have not started yet are cancelled when the block exits, so
+    an upload that stops at its first bad row doesn't keep calling SatChecker for
+    the rows after it.
+
+    fetch runs in a worker thread and should not use the database. With the local
+    ephemeris backend there is no waiting on the network and the TLEs come from
+    the database, so the lookups are run in the calling thread instead. If
+    additional_data_args is given, the rows are checked one at a time and the
+    ephemeris is then calculated for all rows of the same satellite and location
+    at once (see local_additional_data_batch), which is much faster than
+    calculating it for each row.
+
+    Args:
+        fetch (Callable): Called with a single item, usually a wrapper around
+            add_additional_data.
+        items (Sequence): The observations to look up.
+        additional_data_args (Callable | None): Called with a single item, returns
+            the arguments fetch passes to add_additional_data, or None if fetch
+            skips the item. Only used with the local ephemeris backend.
+
+    Yields:
+        list[Future]: The pending result of fetch for each item, in order.
+    """
+    if settings.EPHEMERIS_BACKEND == "local":
+        if additional_data_args is not None:
+            yield local_additional_data_batch(additional_data_args, items)
+            return
+
+        futures = []
+        for item in items:
+            future = Future()
+            try:
+                future.set_result(fetch(item))
+            except Exception as e:
+                future.set_exception(e)
+            futures.append(future)
+        yield futures
+        return
+
+    executor = get_satchecker_executor()
+    futures = [executor.submit(fetch, item) for item in items]
+    try:
+        yield futures
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def local_additional_data_batch(
+    additional_data_args: Callable[[Any], tuple | None], items: Sequence[Any]
+) -> list[Future]:
+    """
+    Looks up a batch of observations with the local ephemeris backend, giving the
+    same results as calling add_additional_data for each of them.
+
+    Args:
+        additional_data_args (Callable): Called with a single item, returns the
+            arguments of add_additional_data for it, or None to skip the item.
+        items (Sequence): The observations to look up.
+
+    Returns:
+        list[Future]: The completed result of add_additional_data for each item, in
+        order.
+    """
+    # Imported here as ephemeris_utils depends on this module
+    from repository.utils.ephemeris_utils import (
+        LocalLookup,
+        complete_local_lookups,
+        prepare_local_lookup,
+    )
+
+    futures = [Future() for _ in items]
+    pending = []
+    for future, item in zip(futures, items, strict=True):
+        try:
+            args = additional_data_args(item)
+            if args is None:
+                result = None
+            else:
+                result = check_position_fields(*args[1:]) or prepare_local_lookup(*args)
+        except Exception as e:
+            future.set_exception(e)
+            continue
+        if isinstance(result, LocalLookup):
+            pending.append((future, result))
+        else:
+            future.set_result(result)
+
+    try:
+        results = complete_local_lookups([lookup for _, lookup in pending])
+    except Exception as e:
+        for future, _ in pending:
+            future.set_exception(e)
+    else:
+        for (future, _), result in zip(pending, results, strict=True):
+            future.set_result(result)
+    return futures
+
+
+class ProgressThrottle:
+    """
+    Coalesces the progress updates of an upload task.
+
+    Every progress update is a write to the Celery result backend, so instead of
+    reporting after every observation the update is only passed on once enough
+    rows (one percent of the upload by default) or enough time has gone by since
+    the last one. The final update is always passed on, so the status page always
+    ends at 100%.
+
+    Args:
+        report (Callable[[int, int], None]): Writes the progress, called with the
+            number of processed observations and the total.
+        total (int): The number of steps in the upload, usually its number of
+            observations.
+        min_interval (float | None): Seconds after which an update is passed on
+            regardless of the number of rows, defaults to the
+            UPLOAD_PROGRESS_INTERVAL setting.
+        step (int | None): Number of rows after which an update is passed on,
+            defaults to one percent of the total.
+    """
+
+    def __init__(
+        self,
+        report: Callable[[int, int], None],
+        total: int,
+        min_interval: float | None = None,
+        step: int | None = None,
+    ):
+        self.report = report
+        self.total = total
+        self.min_interval = (
+            settings.UPLOAD_PROGRESS_INTERVAL if min_interval is None else min_interval
+        )
+        self.step = step or max(1, math.ceil(total / 100))
+        self._last_current = 0
+        self._last_time = time.monotonic()
+
+    def update(self, current: int, force: bool = False) -> bool:
+        """
+        Reports the progress if it is due.
+
+        Args:
+            current (int): The number of processed observations.
+            force (bool): Report the progress even if it isn't due.
+
+        Returns:
+            bool: True if the progress was reported.
+        """
+        now = time.monotonic()
+        if not (
+            force
+            or current >= self.total
+            or current - self._last_current >= self.step
+            or now - self._last_time >= self.min_interval
+        ):
+            return False
+
+        self.report(current, self.total)
+        self._last_current = current
+        self._last_time = now
+        return True
+
+
 def below_line_of_sight(
     satellite_altitude_deg: float,
     observer_altitude_km: float,
@@ -301,7 +666,7 @@ def below_line_of_sight(
 
 
 def validate_position(
-    response: Response,
+    response: Response | CachedResponse,
     satellite_name: str,
     obs_time: str | Time,
     observer_altitude_km: float = 0.0,
@@ -334,7 +699,7 @@ def validate_position(
     # use tle_epoch, not tle_date (that is the date it was collected)
     date_str = satellite_info[21].replace(" UTC", "")
     tle_date = Time(date_str, format="iso", scale="utc")
-    if (tle_date - obs_time).jd > 14:
+    if (tle_date - obs_time).jd > ARCHIVAL_TLE_AGE_DAYS:
         return "archival data"
     if satellite_name and satellite_info[0] != satellite_name:
         return "Satellite name and number do not match"
@@ -407,10 +772,9 @@ def get_satellite_name(norad_id):
     str or None: The name of the satellite associated with the NORAD ID, or None if no
     satellite was found or an error occurred.
     """
-    url = "https://satchecker.cps.iau.org/tools/names-from-norad-id/"
     params = {"id": norad_id}
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = satchecker_client.get("/tools/names-from-norad-id/", params)
         response.raise_for_status()
 
         data = response.json()
@@ -448,10 +812,9 @@ def get_norad_id(satellite_name):
     str or None: The NORAD ID of the satellite associated with the name, or None if no
     satellite was found or an error occurred.
     """
-    url = "https://satchecker.cps.iau.org/tools/norad-ids-from-name/"
     params = {"name": satellite_name}
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = satchecker_client.get("/tools/norad-ids-from-name/", params)
         response.raise_for_status()
         data = response.json()
         if not data:
@@ -479,10 +842,10 @@ def get_satellite_metadata(satellite_number: str) -> dict[str, str | None] | Non
         Optional[Dict[str, Optional[str]]]: A dictionary containing satellite metadata,
         or None if the request fails or no data is found.
     """
-    satchecker_url = f"https://satchecker.cps.iau.org/tools/get-satellite-data/?id={satellite_number}&id_type=catalog"
+    params = {"id": satellite_number, "id_type": "catalog"}
 
     try:
-        response = requests.get(satchecker_url, timeout=10)
+        response = satchecker_client.get("/tools/get-satellite-data/", params)
         response.raise_for_status()
         satellite_data = response.json()
 
@@ -0,0 +1,89 @@
+import os
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+SATCHECKER_BASE_URL = "https://satchecker.cps.iau.org"
+
+# (connect, read) timeouts in seconds for each group of SatChecker endpoints -
+# ephemeris calculations can be slow, the lookup tools should answer quickly
+SATCHECKER_TIMEOUTS = {
+    "ephemeris": (10, 60),
+    "tools": (10, 10),
+}
+SATCHECKER_DEFAULT_TIMEOUT = (10, 30)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _create_session() -> requests.Session:
+    retry = Retry(
+        total=3,
+        read=1,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    # Keep enough connections open for every upload worker thread, so concurrent
+    # lookups don't wait for a free connection
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=max(settings.SATCHECKER_MAX_WORKERS, 10),
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount(SATCHECKER_BASE_URL, adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the SatChecker session for this process.
+
+    The session keeps connections to SatChecker open between requests, so only the
+    first request in a process pays for the TCP and TLS handshake. Connection errors
+    and 502/503/504 responses are retried with exponential backoff. Celery and
+    gunicorn fork their workers, and connections can't be shared across a fork, so
+    each process creates its own session the first time it is used.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _create_session()
+                _session_pid = pid
+    return _session
+
+
+def get(endpoint: str, params: dict | None = None) -> requests.Response:
+    """
+    Sends a GET request to a SatChecker endpoint using the shared session.
+
+    Args:
+        endpoint (str): The endpoint path, e.g. "/ephemeris/catalog-number/".
+        params (dict | None): The query parameters for the request.
+
+    Returns:
+        requests.Response: The response. Error statuses are returned rather than
+        raised, after any retries.
+
+    Raises:
+        requests.exceptions.RequestException: If SatChecker can't be reached.
+    """
+    group = endpoint.strip("/").split("/")[0]
+    return get_session().get(
+        SATCHECKER_BASE_URL + endpoint,
+        params=params,
+        timeout=SATCHECKER_TIMEOUTS.get(group, SATCHECKER_DEFAULT_TIMEOUT),
+    )
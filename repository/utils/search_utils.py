@@ -1,6 +1,107 @@
+import datetime
+import hashlib
+import json
+import logging
+import re
+from math import asin, cos, degrees, pi, radians, sin
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, QuerySet
 from django.utils import timezone
 
-from repository.models import Location, Observation
+from repository.models import EARTH_RADIUS_KM, Location, Observation
+
+logger = logging.getLogger(__name__)
+
+# Search form fields that are dates, stored as ISO strings in saved searches
+SEARCH_DATE_FIELDS = ("start_date_range", "end_date_range")
+
+# A complete ORCID, as stored on observations (upper case)
+ORCID_PATTERN = re.compile(r"^\d{4}-\d{4}-\d{4}-\d{3}[0-9X]$")
+
+
+def orcid_filter(orcid: str) -> Q:
+    """
+    Returns a filter for the observations made by an observer, or any of a
+    comma-separated list of observers.
+
+    Complete ORCIDs are matched against the elements of obs_orc_id, which can be
+    searched with its GIN index. Anything else is treated as part of an ORCID and
+    matched against the whole array as text, which scans every observation.
+
+    Args:
+        orcid (str): One or more ORCIDs, or part of an ORCID.
+
+    Returns:
+        Q: The filter for Observation objects.
+    """
+    orcids = [value.strip().upper() for value in orcid.split(",")]
+    if all(ORCID_PATTERN.match(value) for value in orcids):
+        return Q(obs_orc_id__overlap=orcids)
+    return Q(obs_orc_id__icontains=orcid.strip())
+
+
+def location_bounding_box(latitude: float, longitude: float, radius: float) -> Q:
+    """
+    Returns a filter for the locations in the smallest latitude/longitude box that
+    contains a circle on the Earth's surface.
+
+    The box can be searched with the index on the location coordinates, so only
+    the locations near the circle need to have their exact distance checked. If
+    the circle includes a pole the box covers every longitude, and if it crosses
+    the antimeridian the longitude range wraps around.
+
+    Args:
+        latitude (float): Latitude of the center of the circle in degrees.
+        longitude (float): Longitude of the center of the circle in degrees.
+        radius (float): Radius of the circle in kilometers.
+
+    Returns:
+        Q: The filter for Location objects.
+    """
+    angular_radius = radius / EARTH_RADIUS_KM
+    min_lat = latitude - degrees(angular_radius)
+    max_lat = latitude + degrees(angular_radius)
+    box = Q(obs_lat_deg__gte=min_lat, obs_lat_deg__lte=max_lat)
+    if min_lat <= -90 or max_lat >= 90 or angular_radius >= pi / 2:
+        return box
+
+    delta_lon = degrees(asin(sin(angular_radius) / cos(radians(latitude))))
+    min_lon = longitude - delta_lon
+    max_lon = longitude + delta_lon
+    if min_lon < -180:
+        return box & (Q(obs_long_deg__gte=min_lon + 360) | Q(obs_long_deg__lte=max_lon))
+    if max_lon > 180:
+        return box & (Q(obs_long_deg__gte=min_lon) | Q(obs_long_deg__lte=max_lon - 360))
+    return box & Q(obs_long_deg__gte=min_lon, obs_long_deg__lte=max_lon)
+
+
+def get_locations_within(latitude: float, longitude: float, radius: float) -> list:
+    """
+    Returns the IDs of the locations within a distance of a point.
+
+    Args:
+        latitude (float): Latitude of the point in degrees.
+        longitude (float): Longitude of the point in degrees.
+        radius (float): The maximum distance in kilometers.
+
+    Returns:
+        list: The location IDs.
+    """
+    candidates = Location.objects.filter(
+        location_bounding_box(latitude, longitude, radius)
+    ).values_list("id", "obs_lat_deg", "obs_long_deg")
+    if not candidates:
+        return []
+
+    ids, latitudes, longitudes = zip(*candidates, strict=True)
+    distances = Location.distances_to(latitudes, longitudes, latitude, longitude)
+    return [
+        loc_id
+        for loc_id, distance in zip(ids, distances, strict=True)
+        if distance <= radius
+    ]
 
 
 def filter_observations(form_data):
@@ -27,7 +128,6 @@ def filter_observations(form_data):
         "sat_number": "satellite_id__sat_number",
         "obs_mode": "obs_mode__icontains",
         "observation_id": "id",
-        "observer_orcid": "obs_orc_id__icontains",
         "mpc_code": "mpc_code",
         "intl_designator": "satellite_id__intl_designator",
         "instrument": "instrument__icontains",
@@ -60,6 +160,10 @@ def filter_observations(form_data):
         if value is not None and value != "":
             observations = observations.filter(**{condition: value})
 
+    observer_orcid = form_data.get("observer_orcid")
+    if observer_orcid:
+        observations = observations.filter(orcid_filter(observer_orcid))
+
     if form_data.get("has_position_data"):
         observations = observations.filter(
             sat_ra_deg__isnull=False, sat_dec_deg__isnull=False
@@ -70,12 +174,97 @@ def filter_observations(form_data):
     radius = form_data.get("observer_radius")
 
     if all([latitude, longitude, radius]):
-        # Filter by observation IDs meeting the radius constraint to return QuerySet
-        matching_location_ids = [
-            loc.id
-            for loc in Location.objects.all()
-            if loc.distance_to(latitude, longitude) <= radius
-        ]
+        # Filter by location IDs meeting the radius constraint to return QuerySet
+        matching_location_ids = get_locations_within(latitude, longitude, radius)
         observations = observations.filter(location_id__in=matching_location_ids)
 
     return observations
+
+
+def search_term_filter(search_term: str) -> Q:
+    """
+    Returns the filter for the search box of the search results table, which
+    matches observations with the term in any of the displayed columns.
+    """
+    return (
+        Q(satellite_id__sat_name__icontains=search_term)
+        | Q(satellite_id__sat_number__icontains=search_term)
+        | Q(obs_mode__icontains=search_term)
+        | Q(obs_filter__icontains=search_term)
+        | Q(obs_orc_id__icontains=search_term)
+        | Q(instrument__icontains=search_term)
+        | Q(date_added__icontains=search_term)
+        | Q(obs_time_utc__icontains=search_term)
+        | Q(apparent_mag__icontains=search_term)
+        | Q(location_id__obs_lat_deg__icontains=search_term)
+        | Q(location_id__obs_long_deg__icontains=search_term)
+        | Q(location_id__obs_alt_m__icontains=search_term)
+    )
+
+
+def _saved_search_cache_key(search_id: str) -> str:
+    return f"search:{search_id}"
+
+
+def save_search(form_data: dict, search_term: str = "") -> str:
+    """
+    Saves a search from the search page so it can be run again later, e.g. to
+    download the results.
+
+    The search ID is a hash of the search, so saving the same search again (as
+    happens for every page of results) returns the same ID. Searches are kept in
+    the cache for SAVED_SEARCH_CACHE_TIMEOUT seconds.
+
+    Args:
+        form_data (dict): The cleaned data of the search form.
+        search_term (str): The term from the search box of the results table.
+
+    Returns:
+        str: The search ID to pass to get_saved_search.
+    """
+    filters = {
+        key: value.isoformat() if isinstance(value, datetime.date) else value
+        for key, value in form_data.items()
+    }
+    search = json.dumps({"filters": filters, "search": search_term}, sort_keys=True)
+    search_id = hashlib.sha256(search.encode()).hexdigest()
+    try:
+        cache.set(
+            _saved_search_cache_key(search_id),
+            search,
+            settings.SAVED_SEARCH_CACHE_TIMEOUT,
+        )
+    except Exception as e:
+        logger.warning(f"Saved search cache unavailable: {e}")
+    return search_id
+
+
+def get_saved_search(search_id: str) -> QuerySet | None:
+    """
+    Runs a search saved by save_search again.
+
+    Args:
+        search_id (str): The ID returned by save_search.
+
+    Returns:
+        QuerySet | None: The matching observations, or None if the search has
+        expired or doesn't exist.
+    """
+    try:
+        search = cache.get(_saved_search_cache_key(search_id))
+    except Exception as e:
+        logger.warning(f"Saved search cache unavailable: {e}")
+        search = None
+    if search is None:
+        return None
+
+    search = json.loads(search)
+    form_data = search["filters"]
+    for key in SEARCH_DATE_FIELDS:
+        if form_data.get(key):
+            form_data[key] = datetime.date.fromisoformat(form_data[key])
+
+    observations = filter_observations(form_data)
+    if search["search"]:
+        observations = observations.filter(search_term_filter(search["search"]))
+    return observations
@@ -0,0 +1,199 @@
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, DateTimeField, F, FloatField, Max, Min, Sum, Value
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from repository.models import (
+    Observation,
+    ObservationStats,
+    Satellite,
+    SatelliteObservationCount,
+)
+
+logger = logging.getLogger(__name__)
+
+# Primary key of the single ObservationStats row
+OBSERVATION_STATS_ID = 1
+
+# Number of satellites listed as the most observed
+TOP_SATELLITE_COUNT = 5
+
+
+def _stats_row():
+    return ObservationStats.objects.filter(pk=OBSERVATION_STATS_ID)
+
+
+def record_new_satellites(count: int) -> None:
+    """
+    Adds newly created satellites to the observation statistics.
+
+    Like record_observations, this must be called in the transaction that saves the
+    satellites, as the last step before it commits.
+    """
+    if count:
+        _stats_row().update(
+            satellite_count=F("satellite_count") + count, date_updated=timezone.now()
+        )
+
+
+def record_observations(observations: list[Observation]) -> None:
+    """
+    Adds newly created observations to the observation statistics.
+
+    This must be called in the transaction that saves the observations, and
+    should be the last step before it commits: the statistics row stays locked
+    until then, so concurrent uploads wait for each other here. A concurrent
+    recompute_observation_stats either locks the row first, in which case it
+    can't see the uncommitted observations and this update is applied after it,
+    or waits for the commit and then includes them. Nothing is recorded until
+    the statistics have been computed for the first time.
+
+    Args:
+        observations (list[Observation]): The new observations, with their
+            satellites set.
+    """
+    if not observations:
+        return
+
+    times = [observation.obs_time_utc for observation in observations]
+    magnitudes = [
+        observation.apparent_mag
+        for observation in observations
+        if observation.apparent_mag is not None
+    ]
+    # Postgres LEAST and GREATEST ignore NULL, so the first values are kept as is
+    updates = {
+        "observation_count": F("observation_count") + len(observations),
+        "earliest_obs_time": Least(
+            "earliest_obs_time", Value(min(times), output_field=DateTimeField())
+        ),
+        "latest_obs_time": Greatest(
+            "latest_obs_time", Value(max(times), output_field=DateTimeField())
+        ),
+        "date_updated": timezone.now(),
+    }
+    if magnitudes:
+        updates.update(
+            magnitude_count=F("magnitude_count") + len(magnitudes),
+            magnitude_sum=F("magnitude_sum") + sum(magnitudes),
+            brightest_mag=Least(
+                "brightest_mag", Value(min(magnitudes), output_field=FloatField())
+            ),
+            faintest_mag=Greatest(
+                "faintest_mag", Value(max(magnitudes), output_field=FloatField())
+            ),
+        )
+    if not _stats_row().update(**updates):
+        return
+
+    satellite_counts = Counter(
+        observation.satellite_id_id for observation in observations
+    )
+    SatelliteObservationCount.objects.bulk_create(
+        [
+            SatelliteObservationCount(satellite_id_id=satellite_id)
+            for satellite_id in satellite_counts
+        ],
+        ignore_conflicts=True,
+    )
+    for satellite_id, count in satellite_counts.items():
+        SatelliteObservationCount.objects.filter(satellite_id=satellite_id).update(
+            observation_count=F("observation_count") + count
+        )
+
+
+def recompute_observation_stats() -> ObservationStats:
+    """
+    Rebuilds the observation statistics from all observations.
+
+    This is needed the first time the statistics are used, and to pick up
+    observations and satellites that were changed or deleted outside of the upload
+    tasks (e.g. in the admin or for data change requests), which aren't recorded
+    as they happen. It is scheduled nightly by CELERY_BEAT_SCHEDULE.
+
+    Returns:
+        ObservationStats: The updated statistics.
+    """
+    with transaction.atomic():
+        ObservationStats.objects.get_or_create(pk=OBSERVATION_STATS_ID)
+        # Wait for uploads that have already recorded observations to commit
+        stats = _stats_row().select_for_update().get()
+
+        totals = Observation.objects.aggregate(
+            observation_count=Count("id"),
+            earliest_obs_time=Min("obs_time_utc"),
+            latest_obs_time=Max("obs_time_utc"),
+            magnitude_count=Count("apparent_mag"),
+            magnitude_sum=Sum("apparent_mag"),
+            brightest_mag=Min("apparent_mag"),
+            faintest_mag=Max("apparent_mag"),
+        )
+        totals["magnitude_sum"] = totals["magnitude_sum"] or 0
+        for field, value in totals.items():
+            setattr(stats, field, value)
+        stats.satellite_count = Satellite.objects.count()
+        stats.date_updated = timezone.now()
+        stats.save()
+
+        SatelliteObservationCount.objects.all().delete()
+        SatelliteObservationCount.objects.bulk_create(
+            SatelliteObservationCount(
+                satellite_id_id=row["satellite_id"],
+                observation_count=row["count"],
+            )
+            for row in Observation.objects.values("satellite_id")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+
+    logger.info(
+        f"Recomputed observation statistics for {stats.observation_count} "
+        "observations"
+    )
+    return stats
+
+
+def get_observation_stats() -> dict:
+    """
+    Returns summary statistics about all observations, for the stats API.
+
+    The statistics are read from ObservationStats, so this takes two small queries
+    however many observations there are. They are computed first if they have not
+    been yet.
+
+    Returns:
+        dict: The statistics, see get_observation_stats in the observations API.
+    """
+    stats = _stats_row().first() or recompute_observation_stats()
+    top_satellites = SatelliteObservationCount.objects.select_related(
+        "satellite_id"
+    ).order_by("-observation_count")[:TOP_SATELLITE_COUNT]
+
+    return {
+        "total_observations": stats.observation_count,
+        "total_satellites": stats.satellite_count,
+        "time_range": {
+            "first": stats.earliest_obs_time,
+            "last": stats.latest_obs_time,
+        },
+        "magnitude_stats": {
+            "average": (
+                round(stats.magnitude_sum / stats.magnitude_count, 2)
+                if stats.magnitude_count
+                else None
+            ),
+            "brightest": stats.brightest_mag,
+            "faintest": stats.faintest_mag,
+        },
+        "most_observed_satellites": [
+            {
+                "number": entry.satellite_id.sat_number,
+                "name": entry.satellite_id.sat_name,
+                "observations": entry.observation_count,
+            }
+            for entry in top_satellites
+        ],
+    }
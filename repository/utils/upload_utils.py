@@ -0,0 +1,416 @@
+import logging
+import uuid
+from collections import namedtuple
+from collections.abc import Iterable
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from repository.models import (
+    Location,
+    Observation,
+    Satellite,
+    UploadChunk,
+    get_constellation_id,
+)
+from repository.utils.general_utils import SatCheckerData
+from repository.utils.stats_utils import record_new_satellites, record_observations
+
+logger = logging.getLogger(__name__)
+
+# Number of observations written per transaction by persist_observations
+UPLOAD_CHUNK_SIZE = 500
+
+# Observation fields that are filled in from SatChecker rather than by the observer
+SATCHECKER_FIELDS = (
+    "phase_angle",
+    "range_to_sat_km_satchecker",
+    "range_rate_sat_km_s_satchecker",
+    "sat_ra_deg_satchecker",
+    "sat_dec_deg_satchecker",
+    "ddec_deg_s_satchecker",
+    "dra_cosdec_deg_s_satchecker",
+    "alt_deg_satchecker",
+    "az_deg_satchecker",
+    "sat_altitude_km_satchecker",
+    "solar_elevation_deg_satchecker",
+    "solar_azimuth_deg_satchecker",
+)
+
+# Fields compared when checking whether an uploaded observation already exists.
+# CSV uploads ignore the SatChecker values so that re-uploading a file does not
+# create duplicates when those values drift slightly between SatChecker runs.
+OBSERVATION_MATCH_FIELDS = tuple(
+    field.name
+    for field in Observation._meta.concrete_fields
+    if field.name not in ("id", "date_added", "date_updated")
+)
+CSV_OBSERVATION_MATCH_FIELDS = tuple(
+    field for field in OBSERVATION_MATCH_FIELDS if field not in SATCHECKER_FIELDS
+)
+
+# One validated, not yet saved, upload row
+PreparedObservation = namedtuple(
+    "PreparedObservation",
+    [
+        "observation",
+        "location",
+        "sat_number",
+        "satellite_name",
+        "additional_data",
+    ],
+)
+
+
+def prepare_observation(
+    observation_fields: dict,
+    location_fields: dict,
+    sat_number: int | str,
+    satellite_name: str,
+    additional_data: SatCheckerData,
+) -> PreparedObservation:
+    """
+    Builds and validates the unsaved objects for a single uploaded observation.
+
+    All model validation happens here, before anything is written, so that errors
+    can be reported against the row they came from. Field values are converted to
+    their Python types by full_clean, which is what allows persist_observations to
+    match rows against existing observations without a query per row.
+
+    Args:
+        observation_fields (dict): Observation field values, without the satellite
+            and location foreign keys.
+        location_fields (dict): Observer latitude, longitude and altitude.
+        sat_number (int | str): The NORAD ID of the observed satellite.
+        satellite_name (str): The satellite name provided with the observation.
+        additional_data (SatCheckerData): The SatChecker data for the observation.
+
+    Returns:
+        PreparedObservation: The validated observation and location instances along
+        with the satellite details needed to resolve the satellite.
+
+    Raises:
+        ValidationError: If the satellite, location or observation data is invalid.
+    """
+    satellite = Satellite(
+        sat_number=sat_number,
+        sat_name=satellite_name or additional_data.satellite_name,
+    )
+    satellite.full_clean(validate_unique=False)
+
+    location = Location(**location_fields)
+    location.full_clean()
+
+    observation = Observation(**observation_fields)
+    observation.full_clean(
+        exclude=["satellite_id", "location_id"], validate_unique=False
+    )
+    if timezone.is_naive(observation.obs_time_utc):
+        observation.obs_time_utc = timezone.make_aware(observation.obs_time_utc)
+
+    return PreparedObservation(
+        observation, location, satellite.sat_number, satellite_name, additional_data
+    )
+
+
+def update_satellite_details(
+    satellite: Satellite, satellite_name: str, additional_data: SatCheckerData
+) -> bool:
+    """
+    Updates the name and international designator of a satellite from upload data.
+
+    Returns:
+        bool: True if the satellite was changed and needs to be saved.
+    """
+    changed = False
+    # Get the new name from either the uploaded data or additional_data
+    new_name = (
+        satellite_name if satellite_name != "" else additional_data.satellite_name
+    )
+    # Update name if:
+    # 1. Satellite has no name and new data has a name, OR
+    # 2. New data has a name that's different from current satellite name
+    if (not satellite.sat_name and new_name) or (
+        new_name and new_name != satellite.sat_name
+    ):
+        satellite.sat_name = new_name
+        satellite.constellation = get_constellation_id(new_name)
+        changed = True
+    # If satellite exists but has no intl_designator, update it
+    if not satellite.intl_designator and additional_data.intl_designator:
+        satellite.intl_designator = additional_data.intl_designator
+        changed = True
+    return changed
+
+
+def resolve_satellites(
+    prepared: list[PreparedObservation],
+) -> tuple[dict[int, Satellite], int]:
+    """
+    Gets or creates the satellites for a set of prepared observations.
+
+    Existing satellites are fetched with one query and new ones are inserted with
+    one bulk insert. Name and designator updates are applied in upload order, so
+    the result is the same as handling each observation one at a time.
+
+    Returns:
+        tuple[dict[int, Satellite], int]: Saved satellites keyed by NORAD ID, and
+        the number of them that were created.
+    """
+    satellites = {}
+    for satellite in Satellite.objects.filter(
+        sat_number__in={entry.sat_number for entry in prepared}
+    ).order_by("id"):
+        satellites.setdefault(satellite.sat_number, satellite)
+
+    new_satellites = {}
+    updated_satellites = {}
+    for entry in prepared:
+        satellite = satellites.get(entry.sat_number)
+        if satellite is None:
+            satellite = Satellite(
+                sat_name=(
+                    entry.satellite_name
+                    if entry.satellite_name != ""
+                    else entry.additional_data.satellite_name
+                ),
+                sat_number=entry.sat_number,
+                date_added=timezone.now(),
+                intl_designator=entry.additional_data.intl_designator,
+            )
+            satellite.constellation = get_constellation_id(satellite.sat_name)
+            satellites[entry.sat_number] = satellite
+            new_satellites[entry.sat_number] = satellite
+        elif update_satellite_details(
+            satellite, entry.satellite_name, entry.additional_data
+        ):
+            if entry.sat_number not in new_satellites:
+                updated_satellites[entry.sat_number] = satellite
+
+    for satellite in new_satellites.values():
+        satellite.full_clean(validate_unique=False)
+    Satellite.objects.bulk_create(new_satellites.values())
+
+    # Renames are rare, so these go through save() to keep the uniqueness checks
+    for satellite in updated_satellites.values():
+        satellite.save()
+
+    return satellites, len(new_satellites)
+
+
+def _location_key(location: Location) -> tuple[float, float, float]:
+    return (location.obs_lat_deg, location.obs_long_deg, location.obs_alt_m)
+
+
+def resolve_locations(
+    prepared: list[PreparedObservation],
+) -> dict[tuple[float, float, float], Location]:
+    """
+    Gets or creates the observer locations for a set of prepared observations.
+
+    Returns:
+        dict[tuple[float, float, float], Location]: Saved locations keyed by
+        (latitude, longitude, altitude).
+    """
+    wanted = {_location_key(entry.location): entry.location for entry in prepared}
+
+    locations = {}
+    for location in Location.objects.filter(
+        obs_lat_deg__in={key[0] for key in wanted},
+        obs_long_deg__in={key[1] for key in wanted},
+        obs_alt_m__in={key[2] for key in wanted},
+    ).order_by("id"):
+        key = _location_key(location)
+        if key in wanted:
+            locations.setdefault(key, location)
+
+    new_locations = [
+        location for key, location in wanted.items() if key not in locations
+    ]
+    Location.objects.bulk_create(new_locations)
+    for location in new_locations:
+        locations[_location_key(location)] = location
+
+    return locations
+
+
+def _chunks(items: list, size: int) -> Iterable[list]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _match_value(value):
+    # ArrayField values come back as lists, which cannot be used in a dict key
+    return tuple(value) if isinstance(value, list) else value
+
+
+def persist_observations(
+    prepared: list[PreparedObservation],
+    match_fields: tuple[str, ...] = OBSERVATION_MATCH_FIELDS,
+    chunk_size: int | None = None,
+) -> list[tuple[int, bool]]:
+    """
+    Saves prepared observations, skipping any that already exist.
+
+    Observations are written in chunks, each in its own transaction. For every
+    chunk the satellites and locations are resolved with a few set-based queries,
+    existing observations are looked up with a single query and the new ones are
+    inserted with bulk_create. An observation is treated as a duplicate when all
+    of its match_fields are equal to those of an existing observation or of an
+    earlier observation in the same upload.
+
+    Args:
+        prepared (list[PreparedObservation]): Rows returned by prepare_observation.
+        match_fields (tuple[str, ...]): Fields compared to detect duplicates.
+        chunk_size (int | None): Number of observations written per transaction,
+            defaults to UPLOAD_CHUNK_SIZE.
+
+    Returns:
+        list[tuple[int, bool]]: The ID of the saved (or already existing)
+        observation for each prepared row, in order, and whether it was created.
+    """
+    attnames = [Observation._meta.get_field(name).attname for name in match_fields]
+
+    def match_key(observation: Observation) -> tuple:
+        return tuple(
+            _match_value(getattr(observation, attname)) for attname in attnames
+        )
+
+    known = {}
+    results = []
+    for chunk in _chunks(prepared, chunk_size or UPLOAD_CHUNK_SIZE):
+        with transaction.atomic():
+            satellites, new_satellite_count = resolve_satellites(chunk)
+            locations = resolve_locations(chunk)
+
+            for entry in chunk:
+                entry.observation.satellite_id = satellites[entry.sat_number]
+                entry.observation.location_id = locations[_location_key(entry.location)]
+
+            existing = Observation.objects.filter(
+                satellite_id__in={entry.observation.satellite_id_id for entry in chunk},
+                obs_time_utc__in={entry.observation.obs_time_utc for entry in chunk},
+            ).values_list("id", *match_fields)
+            for obs_id, *values in existing:
+                known.setdefault(tuple(_match_value(value) for value in values), obs_id)
+
+            new_observations = []
+            chunk_keys = []
+            for entry in chunk:
+                key = match_key(entry.observation)
+                created = key not in known
+                if created:
+                    known[key] = None
+                    new_observations.append(entry.observation)
+                chunk_keys.append((key, created))
+
+            # Set as late as possible so the chunk commits soon after, see
+            # settled_observations
+            date_added = timezone.now()
+            for observation in new_observations:
+                observation.date_added = date_added
+
+            Observation.objects.bulk_create(new_observations)
+            for observation in new_observations:
+                known[match_key(observation)] = observation.id
+
+            # Last, so the statistics row is only locked until the commit
+            record_new_satellites(new_satellite_count)
+            record_observations(new_observations)
+
+        results.extend((known[key], created) for key, created in chunk_keys)
+
+    logger.info(
+        f"Saved {sum(created for _, created in results)} new observations "
+        f"out of {len(results)} uploaded"
+    )
+    return results
+
+
+def settled_observations() -> QuerySet:
+    """
+    Returns the observations that are old enough to be included in the changes
+    feed and the changes download.
+
+    persist_observations sets date_added just before each chunk is inserted, but
+    the chunk only becomes visible when its transaction commits. A sync that ran
+    in between could move its cursor past observations that then appear with an
+    earlier date_added. Leaving out observations added in the last
+    CHANGES_FEED_DELAY seconds gives every chunk time to commit first.
+
+    Returns:
+        QuerySet: The observations added before the delay.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.CHANGES_FEED_DELAY)
+    return Observation.objects.filter(date_added__lte=cutoff)
+
+
+def stage_csv_upload(rows: Iterable[list], chunk_size: int | None = None) -> str:
+    """
+    Saves the rows of an uploaded CSV file in chunks for process_upload_csv.
+
+    Rows are read one at a time and written a chunk at a time, so the whole file
+    never needs to be held in memory as a list.
+
+    Args:
+        rows (Iterable[list]): The CSV rows, without the header.
+        chunk_size (int | None): Number of rows per chunk, defaults to
+            UPLOAD_CHUNK_SIZE.
+
+    Returns:
+        str: The upload ID to pass to process_upload_csv.
+    """
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    upload_id = uuid.uuid4()
+    chunk_index = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            UploadChunk.objects.create(
+                upload_id=upload_id, chunk_index=chunk_index, rows=chunk
+            )
+            chunk_index += 1
+            chunk = []
+    if chunk:
+        UploadChunk.objects.create(
+            upload_id=upload_id, chunk_index=chunk_index, rows=chunk
+        )
+    return str(upload_id)
+
+
+def claim_csv_upload(upload_id: str, claim_id: str) -> bool:
+    """
+    Claims a staged CSV upload for one run of process_upload_csv, or renews the
+    claim of the run that already holds it.
+
+    A long upload can be delivered to a second worker while the first is still
+    working on it. Only the run holding the claim may process the chunks, and the
+    claim runs out UPLOAD_CLAIM_TIMEOUT seconds after it was last renewed, so that
+    another run can take over from a worker that was lost. The claim is a single
+    conditional update of the first chunk, so two runs can't both get it.
+
+    Args:
+        upload_id (str): The upload ID returned by stage_csv_upload.
+        claim_id (str): A unique ID for the run of the task.
+
+    Returns:
+        bool: True if the run holds the claim, False if another run holds it or
+        the upload no longer exists.
+    """
+    now = timezone.now()
+    return bool(
+        UploadChunk.objects.filter(upload_id=upload_id, chunk_index=0)
+        .filter(
+            Q(claimed_by__isnull=True)
+            | Q(claimed_by=claim_id)
+            | Q(claimed_until__lt=now)
+        )
+        .update(
+            claimed_by=claim_id,
+            claimed_until=now + timedelta(seconds=settings.UPLOAD_CLAIM_TIMEOUT),
+        )
+    )
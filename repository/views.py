@@ -1,7 +1,10 @@
+import codecs
 import csv
 import datetime
 import io
+import itertools
 import logging
+import math
 import re
 import time
 import uuid
@@ -13,12 +16,24 @@ from astropy.time import Time
 from celery.result import AsyncResult
 from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
-from django.db.models import Avg, Count, Max, Min, Q
-from django.http import HttpResponse, JsonResponse
+from django.db.models import Avg, Count, F, Q, QuerySet, Window
+from django.db.models.functions import Floor, Mod, RowNumber
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template import loader
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
 from django_ratelimit.decorators import ratelimit
 
@@ -30,18 +45,28 @@ from repository.forms import (
 from repository.models import APIKey, APIKeyVerification, Observation, Satellite
 from repository.serializers import ObservationSerializer
 from repository.tasks import process_upload_csv
-from repository.utils.csv_utils import create_csv
+from repository.utils import satchecker_client
+from repository.utils.csv_utils import get_archive_snapshot, stream_csv
 from repository.utils.email_utils import (
     send_api_key_verification_email,
     send_data_change_email,
 )
 from repository.utils.general_utils import (
+    VISUALIZATION_STATS_CACHE_KEY,
     get_norad_id,
     get_satellite_metadata,
     get_satellite_name,
     get_stats,
 )
-from repository.utils.search_utils import filter_observations
+from repository.utils.parquet_utils import stream_parquet
+from repository.utils.search_utils import (
+    filter_observations,
+    get_saved_search,
+    orcid_filter,
+    save_search,
+    search_term_filter,
+)
+from repository.utils.upload_utils import settled_observations, stage_csv_upload
 
 logger = logging.getLogger(__name__)
 
@@ -94,21 +119,20 @@ def index(request):
         uploaded_file = request.FILES["uploaded_file"]
 
         # Use utf-8-sig so BOM from spreadsheet exports is removed automatically.
-        data_set = uploaded_file.read().decode("utf-8-sig")
-        io_string = io.StringIO(data_set)
+        # The file is decoded and saved a chunk of rows at a time rather than read
+        # into memory all at once, so large uploads don't hold up the web worker.
+        rows = csv.reader(codecs.iterdecode(uploaded_file, "utf-8-sig"), delimiter=",")
 
         # Skip the header if it exists
-        first_line = next(io_string)
-        if first_line.startswith("satellite_name"):
-            pass
-        else:
-            io_string.seek(0)
-
-        read_data = csv.reader(io_string, delimiter=",")
-        obs = list(read_data)
+        first_row = next(rows, None)
+        if first_row is not None and not (
+            first_row and first_row[0].startswith("satellite_name")
+        ):
+            rows = itertools.chain([first_row], rows)
 
         # Create Task
-        upload_task = process_upload_csv.delay(obs)
+        upload_id = stage_csv_upload(rows)
+        upload_task = process_upload_csv.delay(upload_id)
         task_id = upload_task.task_id
 
         # This prevents the file from being re-uploaded if the page is refreshed
@@ -174,13 +198,14 @@ def view_data(request) -> HttpResponse:
 
 def download_all(request) -> HttpResponse:
     """
-    Create a CSV file, zip it, and return it as a downloadable file.
+    Return all observations as a downloadable zipped CSV file, or a Parquet file if
+    requested with the "format" parameter.
 
     Args:
         request (HttpRequest): The request object.
 
     Returns:
-        HttpResponse: The HttpResponse object with the zipped CSV file.
+        HttpResponse: The HttpResponse object with the zipped CSV or Parquet file.
     """
     if request.method == "POST" and settings.RECAPTCHA_PUBLIC_KEY != "":
         # Get the reCAPTCHA response from the POST data
@@ -199,16 +224,91 @@ def download_all(request) -> HttpResponse:
         # Get the result
         result = r.json()
 
-        # If the reCAPTCHA was valid, proceed with the download
-        if result["score"] > 0.7:
-            return create_and_return_csv(False, None)
-        else:
-            # If the reCAPTCHA was not valid, return an error message
+        # If the reCAPTCHA was not valid, return an error message
+        if result["score"] <= 0.7:
             return JsonResponse({"error": "Invalid reCAPTCHA. Please try again."})
-    # If reCAPTCHA is not enabled (development mode), proceed with the download
-    else:
+
+    # If the reCAPTCHA was valid, or isn't enabled (development mode), proceed with
+    # the download
+    if get_export_format(request) == "parquet":
+        return create_and_return_parquet(False, None)
+    return download_archive_snapshot(request)
+
+
+def download_changes(request) -> HttpResponse:
+    """
+    Return the observations added after the time given with the "since" parameter,
+    as a zipped CSV file or a Parquet file (see get_export_format).
+
+    This lets copies of the data be updated without downloading everything. The
+    date_added column of the API changes feed gives the time to use for the next
+    update. As in the changes feed, the last few minutes of observations are left
+    out until they have settled (see settled_observations).
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        HttpResponse: The file, a 204 response if no observations have been added,
+        or a 400 response if the time is missing or invalid.
+    """
+    since = parse_datetime(request.GET.get("since", ""))
+    if since is None:
+        return HttpResponseBadRequest("A valid ISO 8601 'since' time is required.")
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, datetime.timezone.utc)
+    since = since.astimezone(datetime.timezone.utc)
+
+    observations = (
+        settled_observations().filter(date_added__gt=since).order_by("date_added", "id")
+    )
+    if not observations.exists():
+        return HttpResponse(status=204)
+
+    return create_and_return_download(
+        observations,
+        f"changes_since_{since.strftime('%Y%m%dT%H%M%SZ')}",
+        get_export_format(request),
+    )
+
+
+def download_archive_snapshot(request) -> HttpResponse:
+    """
+    Return the stored zipped CSV file of all observations.
+
+    The file is rebuilt by the build_archive_snapshot task, and sent with an ETag
+    and Last-Modified header so that unchanged downloads can be answered with a 304
+    response. If the file hasn't been built yet it is generated for the request.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        HttpResponse: The response with the zipped CSV file.
+    """
+    snapshot = get_archive_snapshot()
+    if snapshot is None:
         return create_and_return_csv(False, None)
 
+    etag = f'"{snapshot.etag}"'
+    last_modified = int(snapshot.last_modified.timestamp())
+    if request.method in ("GET", "HEAD"):
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            return response
+
+    response = FileResponse(
+        default_storage.open(snapshot.path, "rb"),
+        as_attachment=True,
+        filename=snapshot.file_name,
+        content_type="application/zip",
+    )
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
 
 def api_access(request) -> HttpResponse:
     """
@@ -381,36 +481,99 @@ def show_api_key_view(request):
     return render(request, "repository/show_api_key.html", {"api_key": api_key_data})
 
 
+def get_export_format(request) -> str:
+    """
+    Return the download format requested with the "format" parameter.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        str: "parquet" if a Parquet file was requested, otherwise "csv".
+    """
+    export_format = request.POST.get("format") or request.GET.get("format")
+    return "parquet" if export_format == "parquet" else "csv"
+
+
+def create_and_return_download(
+    observations: QuerySet | bool, prefix: str, export_format: str
+) -> StreamingHttpResponse:
+    """
+    Return the provided observations as a zipped CSV file or a Parquet file.
+
+    Args:
+        observations (Union[QuerySet, bool]): A queryset of Observation objects
+            or False. If False, all observations will be included.
+        prefix (str): The prefix for the file name.
+        export_format (str): "csv" or "parquet", see get_export_format.
+
+    Returns:
+        StreamingHttpResponse: An HTTP response containing the file.
+    """
+    if export_format == "parquet":
+        return create_and_return_parquet(observations, prefix)
+    return create_and_return_csv(observations, prefix)
+
+
+def create_and_return_parquet(
+    observations: QuerySet | bool, prefix: str
+) -> StreamingHttpResponse:
+    """
+    Create a Parquet file from the provided observations and return it in an HTTP
+    response.
+
+    The file has the same columns as the CSV download and is streamed in the
+    response one row group at a time as it is written.
+
+    Args:
+        observations (Union[QuerySet, bool]): A queryset of Observation objects
+            or False. If False, all observations will be included in the file.
+        prefix (str): The prefix for the file name.
+
+    Returns:
+        StreamingHttpResponse: An HTTP response containing the Parquet file.
+    """
+    parquet_chunks, file_name = stream_parquet(observations, prefix)
+
+    response = StreamingHttpResponse(
+        parquet_chunks, content_type="application/vnd.apache.parquet"
+    )
+    response["Content-Disposition"] = f"attachment; filename={file_name}"
+    return response
+
+
 def create_and_return_csv(
-    observations: list[Observation] | bool, prefix: str
-) -> HttpResponse:
+    observations: QuerySet | bool, prefix: str
+) -> StreamingHttpResponse:
     """
     Create a CSV file from the provided observations and return it as a zipped file
     in an HTTP response.
 
     This function generates a CSV file containing the provided observations. If the
     observations parameter is False, the function will include all available
-    observations in the CSV file. The CSV file is then zipped and returned as an HTTP
-    response with the appropriate headers to prompt a file download.
+    observations in the CSV file. The CSV file is zipped and streamed in the HTTP
+    response as it is written, with the appropriate headers to prompt a file
+    download.
 
     Args:
-        observations (Union[List[Observation], bool]): A list of Observation objects
+        observations (Union[QuerySet, bool]): A queryset of Observation objects
             or False. If False, all observations will be included in the CSV file.
         prefix (str): The prefix for the CSV file. This prefix is used to generate the
             filename for the CSV file.
 
     Returns:
-        HttpResponse: An HTTP response containing the zipped CSV file. The Content-Type
-        of the response is set to "application/zip", and the Content-Disposition is set
-        to make the file a download with the appropriate filename.
+        StreamingHttpResponse: An HTTP response containing the zipped CSV file. The
+        Content-Type of the response is set to "application/zip", and the
+        Content-Disposition is set to make the file a download with the appropriate
+        filename.
 
     Raises:
         ValueError: If the observations parameter is not a list of Observation objects
             or False.
     """
-    zipped_file, zipfile_name = create_csv(observations, prefix)
+    zip_chunks, zipfile_name = stream_csv(observations, prefix)
 
-    response = HttpResponse(zipped_file, content_type="application/zip")
+    response = StreamingHttpResponse(zip_chunks, content_type="application/zip")
     response["Content-Disposition"] = f"attachment; filename={zipfile_name}"
     return response
 
@@ -488,34 +651,23 @@ def search(request):
 
                 # Apply search filter if search term exists
                 if search_term:
-                    observations = observations.filter(
-                        Q(satellite_id__sat_name__icontains=search_term)
-                        | Q(satellite_id__sat_number__icontains=search_term)
-                        | Q(obs_mode__icontains=search_term)
-                        | Q(obs_filter__icontains=search_term)
-                        | Q(obs_orc_id__icontains=search_term)
-                        | Q(instrument__icontains=search_term)
-                        | Q(date_added__icontains=search_term)
-                        | Q(obs_time_utc__icontains=search_term)
-                        | Q(apparent_mag__icontains=search_term)
-                        | Q(location_id__obs_lat_deg__icontains=search_term)
-                        | Q(location_id__obs_long_deg__icontains=search_term)
-                        | Q(location_id__obs_alt_m__icontains=search_term)
-                    )
+                    observations = observations.filter(search_term_filter(search_term))
 
                 # Get total count before pagination
                 total = observations.count()
 
-                # Get all observation IDs for download
-                if isinstance(observations, list):
-                    all_obs_ids = [o.id for o in observations]
-                else:
-                    all_obs_ids = list(observations.values_list("id", flat=True))
+                # The download button runs the search again from its ID
+                search_id = save_search(form.cleaned_data, search_term)
 
                 # Return early if no results
                 if total == 0:
                     return JsonResponse(
-                        {"total": 0, "rows": [], "total_results": 0, "obs_ids": []}
+                        {
+                            "total": 0,
+                            "rows": [],
+                            "total_results": 0,
+                            "search_id": search_id,
+                        }
                     )
 
                 # Paginate
@@ -558,19 +710,12 @@ def search(request):
                         "total": total,  # For bootstrap-table pagination
                         "total_results": total,  # For our custom message
                         "rows": rows,
-                        "obs_ids": all_obs_ids,  # For download button
+                        "search_id": search_id,  # For download button
                     }
                 )
 
             # Handle regular form submission
-            # Check if observations is a list (from location filtering) or QuerySet
-            if isinstance(observations, list):
-                obs_count = len(observations)
-                obs_ids_list = [o.id for o in observations]
-            else:
-                obs_count = observations.count()
-                obs_ids_list = list(observations.values_list("id", flat=True))
-
+            obs_count = observations.count()
             if obs_count == 0:
                 return render(
                     request,
@@ -584,7 +729,7 @@ def search(request):
                 "repository/search.html",
                 {
                     "observations": observations[:25],
-                    "obs_ids": obs_ids_list,
+                    "search_id": save_search(form.cleaned_data),
                     "form": form,
                     "total_results": obs_count,
                 },
@@ -606,22 +751,6 @@ def download_results(request):
     if request.method == "POST":
         logger.info("POST request received")
 
-        # Parse observation IDs from POST data
-        parse_start = time.time()
-        obs_ids_str = request.POST.get("obs_ids", "")
-        if obs_ids_str:
-            observation_ids = obs_ids_str.split(", ")
-            observation_ids = [
-                int(i.strip("[]")) for i in observation_ids if i.strip("[]")
-            ]
-        else:
-            observation_ids = []
-        parse_end = time.time()
-        logger.info(
-            f"Parsing observation IDs took {parse_end - parse_start:.4f} seconds"
-        )
-        logger.info(f"Using {len(observation_ids)} observation IDs for download")
-
         satellite_name = (
             request.POST.get("satellite_name")
             if request.POST.get("satellite_name")
@@ -631,14 +760,31 @@ def download_results(request):
 
         # Benchmark database query
         query_start = time.time()
-        observations = Observation.objects.filter(id__in=observation_ids)
+        search_id = request.POST.get("search_id")
+        if search_id:
+            # Search page results - run the saved search again
+            observations = get_saved_search(search_id)
+            if observations is None:
+                return HttpResponseBadRequest(
+                    "This search has expired, please search again."
+                )
+        else:
+            # Satellite data page - the observation IDs are in the form
+            obs_ids_str = request.POST.get("obs_ids", "")
+            observation_ids = [
+                int(i.strip("[] ")) for i in obs_ids_str.split(",") if i.strip("[] ")
+            ]
+            logger.info(f"Using {len(observation_ids)} observation IDs for download")
+            observations = Observation.objects.filter(id__in=observation_ids)
         query_end = time.time()
         logger.info(f"Database query took {query_end - query_start:.4f} seconds")
         logger.info(f"Number of observations retrieved: {observations.count()}")
 
         # Benchmark CSV creation and return
         csv_start = time.time()
-        response = create_and_return_csv(observations, prefix=satellite_name)
+        response = create_and_return_download(
+            observations, satellite_name, get_export_format(request)
+        )
         csv_end = time.time()
         logger.info(f"CSV creation and return took {csv_end - csv_start:.4f} seconds")
 
@@ -904,57 +1050,15 @@ def launch_view(request, launch_number):
     )
 
 
-def _get_constellation_id(sat_name):
-    """Helper to determine constellation from satellite name."""
-    sat_name_upper = (sat_name or "").upper()
-    if "STARLINK" in sat_name_upper:
-        return "starlink"
-    elif "KUIPER" in sat_name_upper:
-        return "kuiper"
-    elif "QIANFAN" in sat_name_upper:
-        return "qianfan"
-    elif "SPACEMOBILE" in sat_name_upper:
-        return "spacemobile"
-    elif "ONEWEB" in sat_name_upper:
-        return "oneweb"
-    elif any(x in sat_name_upper for x in ["FLOCK", "PELICAN", "TANAGER"]):
-        return "planetlabs"
-    return "other"
-
-
-def _get_constellation_filter(const_id):
-    """Helper to get Q filter for constellation."""
-    if const_id == "starlink":
-        return Q(satellite_id__sat_name__icontains="STARLINK")
-    elif const_id == "kuiper":
-        return Q(satellite_id__sat_name__icontains="KUIPER")
-    elif const_id == "qianfan":
-        return Q(satellite_id__sat_name__icontains="QIANFAN")
-    elif const_id == "spacemobile":
-        return Q(satellite_id__sat_name__icontains="SPACEMOBILE")
-    elif const_id == "oneweb":
-        return Q(satellite_id__sat_name__icontains="ONEWEB")
-    elif const_id == "planetlabs":
-        return (
-            Q(satellite_id__sat_name__icontains="FLOCK")
-            | Q(satellite_id__sat_name__icontains="PELICAN")
-            | Q(satellite_id__sat_name__icontains="TANAGER")
-        )
-    else:  # other
-        return (
-            ~Q(satellite_id__sat_name__icontains="STARLINK")
-            & ~Q(satellite_id__sat_name__icontains="KUIPER")
-            & ~Q(satellite_id__sat_name__icontains="QIANFAN")
-            & ~Q(satellite_id__sat_name__icontains="SPACEMOBILE")
-            & ~Q(satellite_id__sat_name__icontains="ONEWEB")
-            & ~Q(satellite_id__sat_name__icontains="FLOCK")
-            & ~Q(satellite_id__sat_name__icontains="PELICAN")
-            & ~Q(satellite_id__sat_name__icontains="TANAGER")
-        )
-
+def _compute_visualization_stats():
+    """
+    Computes the constellation statistics, magnitude histogram and all-sky plot
+    points for the visualization page.
 
-def visualization_view(request):
-    """Landing page with constellation stats and magnitude histogram."""
+    Observations are grouped by the constellation of their satellite and by
+    magnitude bin, using FLOOR, so the whole page takes two grouped queries however
+    many bins there are.
+    """
     # Constellation definitions
     constellations_config = {
         "starlink": {"name": "Starlink"},
@@ -966,62 +1070,118 @@ def visualization_view(request):
         # 'other': {'name': 'Other'},
     }
 
-    # Get actual magnitude range from data
-    mag_stats = Observation.objects.aggregate(
-        min_mag=Min("apparent_mag"), max_mag=Max("apparent_mag")
+    observations = Observation.objects.annotate(
+        constellation=F("satellite_id__constellation")
     )
-    min_mag = int(mag_stats["min_mag"]) if mag_stats["min_mag"] else 0
-    max_mag = int(mag_stats["max_mag"]) + 1 if mag_stats["max_mag"] else 12
-
-    # Calculate stats for each constellation using database queries
-    constellation_stats = []
-    magnitude_bins = {i: {} for i in range(min_mag, max_mag + 1)}
 
-    for const_id, const_info in constellations_config.items():
-        filter_q = _get_constellation_filter(const_id)
+    totals = {
+        row["constellation"]: row
+        for row in observations.values("constellation")
+        .annotate(
+            observation_count=Count("id"),
+            satellite_count=Count("satellite_id", distinct=True),
+            avg_magnitude=Avg("apparent_mag"),
+        )
+        .order_by()
+    }
+    bin_counts = list(
+        observations.filter(apparent_mag__isnull=False)
+        .annotate(mag_bin=Floor("apparent_mag"))
+        .values("constellation", "mag_bin")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
 
-        # Get stats for this constellation
-        obs_qs = Observation.objects.filter(filter_q)
-        obs_count = obs_qs.count()
-        sat_count = Satellite.objects.filter(observations__in=obs_qs).distinct().count()
-        avg_mag = obs_qs.aggregate(Avg("apparent_mag"))["apparent_mag__avg"]
+    # Magnitude range of all observations, including other constellations
+    mag_bins = [int(row["mag_bin"]) for row in bin_counts]
+    min_mag = min(mag_bins) if mag_bins else 0
+    max_mag = max(mag_bins) + 1 if mag_bins else 12
 
+    constellation_stats = []
+    for const_id, const_info in constellations_config.items():
+        row = totals.get(const_id, {})
+        avg_mag = row.get("avg_magnitude")
         constellation_stats.append(
             {
                 "id": const_id,
                 "name": const_info["name"],
-                "satellite_count": sat_count,
-                "observation_count": obs_count,
+                "satellite_count": row.get("satellite_count", 0),
+                "observation_count": row.get("observation_count", 0),
                 "avg_magnitude": round(avg_mag, 2) if avg_mag else None,
             }
         )
 
-        # Get magnitude distribution using database aggregation
-        for mag_bin in range(min_mag, max_mag + 1):
-            count = obs_qs.filter(
-                apparent_mag__gte=mag_bin, apparent_mag__lt=mag_bin + 1
-            ).count()
-            magnitude_bins[mag_bin][const_id] = count
+    magnitude_bins = {
+        i: {const_id: 0 for const_id in constellations_config}
+        for i in range(min_mag, max_mag + 1)
+    }
+    for row in bin_counts:
+        if row["constellation"] in constellations_config:
+            magnitude_bins[int(row["mag_bin"])][row["constellation"]] = row["count"]
 
     # Sort by observation count, but keep "Other" at the end
     constellation_stats.sort(key=lambda x: (-x["observation_count"]))
 
-    # Get all observations for the all-sky plot
+    return constellation_stats, magnitude_bins, _get_allsky_points()
+
+
+def _get_allsky_points():
+    """
+    Gets the observations shown on the all-sky plot.
+
+    If there are more than ALLSKY_PLOT_MAX_POINTS observations with a position and
+    magnitude, every n-th one (in order of ID) is returned instead, so the page
+    size stays the same as the archive grows. The sampling is done in the
+    database with a ROW_NUMBER window.
+    """
+    points = Observation.objects.filter(
+        alt_deg_satchecker__isnull=False,
+        az_deg_satchecker__isnull=False,
+        apparent_mag__isnull=False,
+    )
+    step = math.ceil(points.count() / settings.ALLSKY_PLOT_MAX_POINTS)
+    if step > 1:
+        points = (
+            points.annotate(row_number=Window(RowNumber(), order_by=F("id").asc()))
+            .annotate(sample=Mod("row_number", step))
+            .filter(sample=0)
+        )
+
     # Only fetch minimal fields since tooltips are disabled
-    observations = [
+    return [
         {
             "alt_deg_satchecker": obs["alt_deg_satchecker"],
             "az_deg_satchecker": obs["az_deg_satchecker"],
             "magnitude": obs["apparent_mag"],
         }
-        for obs in Observation.objects.filter(
-            alt_deg_satchecker__isnull=False,
-            az_deg_satchecker__isnull=False,
-            apparent_mag__isnull=False,
-        ).values("alt_deg_satchecker", "az_deg_satchecker", "apparent_mag")
-        # Uncomment to limit for performance: [:10000]
+        for obs in points.values(
+            "alt_deg_satchecker", "az_deg_satchecker", "apparent_mag"
+        )
     ]
 
+
+def visualization_view(request):
+    """Landing page with constellation stats and magnitude histogram."""
+    # The stats are cached until the next upload, see invalidate_stats. As with
+    # get_stats, they are computed for every request if the cache can't be reached.
+    try:
+        stats = cache.get(VISUALIZATION_STATS_CACHE_KEY)
+    except Exception as e:
+        logger.warning(f"Stats cache unavailable: {e}")
+        stats = _compute_visualization_stats()
+    else:
+        if stats is None:
+            stats = _compute_visualization_stats()
+            try:
+                cache.set(
+                    VISUALIZATION_STATS_CACHE_KEY,
+                    stats,
+                    settings.STATS_CACHE_TIMEOUT,
+                )
+            except Exception as e:
+                logger.warning(f"Stats cache unavailable: {e}")
+    constellation_stats, magnitude_bins, observations = stats
+
     return render(
         request,
         "repository/data_visualization.html",
@@ -1065,7 +1225,7 @@ def observer_view(request, orc_id):
     """
     View function to display data for a specific observer.
     """
-    observations = Observation.objects.filter(obs_orc_id__icontains=orc_id)
+    observations = Observation.objects.filter(orcid_filter(orc_id))
     return render(
         request,
         "repository/observer_view.html",
@@ -1207,7 +1367,7 @@ def satellite_pos_lookup(request):
 
     response = None
     if norad_id:
-        url = "https://satchecker.cps.iau.org/ephemeris/catalog-number/"
+        endpoint = "/ephemeris/catalog-number/"
         params = {
             "catalog": norad_id,
             "latitude": observer_latitude,
@@ -1217,11 +1377,11 @@ def satellite_pos_lookup(request):
             "min_altitude": -90,
         }
         try:
-            response = requests.get(url, params=params, timeout=60)
+            response = satchecker_client.get(endpoint, params)
         except requests.exceptions.RequestException:
             return "Satellite position check failed - try again later."
     else:
-        url = "https://satchecker.cps.iau.org/ephemeris/name/"
+        endpoint = "/ephemeris/name/"
         params = {
             "name": satellite_name,
             "latitude": observer_latitude,
@@ -1231,7 +1391,7 @@ def satellite_pos_lookup(request):
             "min_altitude": -90,
         }
         try:
-            response = requests.get(url, params=params, timeout=60)
+            response = satchecker_client.get(endpoint, params)
         except requests.exceptions.RequestException:
             return "Satellite position check failed - try again later."
 
@@ -1301,7 +1461,7 @@ def last_observer_location(request):
         )
     if observer_orcid:
         observer = (
-            Observation.objects.filter(obs_orc_id__icontains=observer_orcid)
+            Observation.objects.filter(orcid_filter(observer_orcid))
             .order_by("-date_added")
             .first()
         )
@@ -1437,7 +1597,7 @@ def observer_observations(request, orc_id):
     Returns:
         JsonResponse: The JSON response containing the observations for the observer.
     """
-    observations = Observation.objects.filter(obs_orc_id__icontains=orc_id)
+    observations = Observation.objects.filter(orcid_filter(orc_id))
 
     # Handle sorting
     sort = request.GET.get("sort")
@@ -1523,10 +1683,12 @@ def download_observer_data(request):
         orc_id = request.POST.get("orc_id") if request.POST.get("orc_id") else None
         logger.info(f"ORCID: {orc_id}")
 
-        observations = Observation.objects.filter(obs_orc_id__icontains=orc_id)
+        observations = Observation.objects.filter(orcid_filter(orc_id))
         logger.info(f"Number of observations retrieved: {observations.count()}")
 
-        response = create_and_return_csv(observations, prefix=orc_id)
+        response = create_and_return_download(
+            observations, orc_id, get_export_format(request)
+        )
         return response
 
     logger.info("Non-POST request received, returning empty HttpResponse")
@@ -1550,8 +1712,7 @@ def get_satellite_data(request):
         for satellite in satellites_with_observations:
             sat_name = satellite.sat_name or ""
 
-            # Determine constellation based on satellite name patterns
-            constellation_id = _get_constellation_id(sat_name)
+            constellation_id = satellite.constellation
 
             if constellation_id not in constellations:
                 constellations[constellation_id] = {"count": 0, "satellites": []}
@@ -1583,8 +1744,6 @@ def get_observations_for_satellites(request):
     """
     API endpoint to get observations for selected satellites
     """
-    from django.db.models import Q
-
     try:
         # Get selected satellites from request
         selected_satellites = request.GET.getlist("satellites[]")
@@ -1604,37 +1763,9 @@ def get_observations_for_satellites(request):
 
         # Add constellation filters
         if selected_constellations:
-            for constellation in selected_constellations:
-                if constellation == "starlink":
-                    combined_filters |= Q(satellite_id__sat_name__icontains="STARLINK")
-                elif constellation == "kuiper":
-                    combined_filters |= Q(satellite_id__sat_name__icontains="KUIPER")
-                elif constellation == "qianfan":
-                    combined_filters |= Q(satellite_id__sat_name__icontains="QIANFAN")
-                elif constellation == "spacemobile":
-                    combined_filters |= Q(
-                        satellite_id__sat_name__icontains="SPACEMOBILE"
-                    )
-                elif constellation == "oneweb":
-                    combined_filters |= Q(satellite_id__sat_name__icontains="ONEWEB")
-                elif constellation == "planetlabs":
-                    combined_filters |= (
-                        Q(satellite_id__sat_name__icontains="FLOCK")
-                        | Q(satellite_id__sat_name__icontains="PELICAN")
-                        | Q(satellite_id__sat_name__icontains="TANAGER")
-                    )
-                elif constellation == "other":
-                    # "Other" means anything that's NOT the known constellations
-                    combined_filters |= (
-                        ~Q(satellite_id__sat_name__icontains="STARLINK")
-                        & ~Q(satellite_id__sat_name__icontains="KUIPER")
-                        & ~Q(satellite_id__sat_name__icontains="QIANFAN")
-                        & ~Q(satellite_id__sat_name__icontains="SPACEMOBILE")
-                        & ~Q(satellite_id__sat_name__icontains="ONEWEB")
-                        & ~Q(satellite_id__sat_name__icontains="FLOCK")
-                        & ~Q(satellite_id__sat_name__icontains="PELICAN")
-                        & ~Q(satellite_id__sat_name__icontains="TANAGER")
-                    )
+            combined_filters |= Q(
+                satellite_id__constellation__in=selected_constellations
+            )
 
         # Apply the combined filter only if satellites/constellations are selected
         if combined_filters:
@@ -1704,6 +1835,7 @@ def get_observations_for_satellites(request):
             "alt_deg_satchecker",
             "az_deg_satchecker",
             "satellite_id__sat_name",
+            "satellite_id__constellation",
             "location_id__obs_lat_deg",
             "location_id__obs_long_deg",
             "location_id__obs_alt_m",
@@ -1714,8 +1846,8 @@ def get_observations_for_satellites(request):
         for obs in observations:
             sat_name = obs["satellite_id__sat_name"] or ""
 
-            # Determine constellation ID for color mapping
-            constellation_id = _get_constellation_id(sat_name)
+            # Constellation ID for color mapping
+            constellation_id = obs["satellite_id__constellation"]
 
             chart_data.append(
                 {
@@ -8,6 +8,7 @@ from pathlib import Path
 
 import boto3
 from botocore.exceptions import ClientError
+from celery.schedules import crontab
 from django.contrib.messages import constants as messages
 
 
@@ -239,6 +240,23 @@ LOGGING = {
 BROKER_URL = "redis://localhost"
 CELERY_RESULT_BACKEND = "redis://localhost"
 CELERY_RESULT_SERIALIZER = "json"
+# Tasks that are acknowledged late, like CSV uploads, are delivered again if they
+# run for longer than this. A large upload can take hours, and a second delivery
+# only waits for the first to finish (see claim_csv_upload), but keeping this long
+# avoids rerunning them needlessly.
+CELERY_BROKER_TRANSPORT_OPTIONS = {"visibility_timeout": 60 * 60 * 24}
+# Rebuild the full-archive download nightly, if observations have changed, and
+# recompute the observation statistics to pick up changes made outside of uploads
+CELERY_BEAT_SCHEDULE = {
+    "build-archive-snapshot": {
+        "task": "repository.tasks.build_archive_snapshot",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    "recompute-observation-stats": {
+        "task": "repository.tasks.recompute_observation_stats",
+        "schedule": crontab(hour=3, minute=30),
+    },
+}
 
 # Cache settings (uses same Redis as Celery)
 CACHES = {
@@ -248,6 +266,46 @@ CACHES = {
     }
 }
 
+# Where uploaded observations get their position data: "satchecker" uses the
+# SatChecker API, "local" propagates the TLEs stored with import_tles using SGP4
+EPHEMERIS_BACKEND = "satchecker"
+
+# Maximum number of concurrent SatChecker requests made by a single upload task
+SATCHECKER_MAX_WORKERS = 8
+
+# Minimum number of seconds between progress updates written by an upload task,
+# unless another percent of the upload has been processed
+UPLOAD_PROGRESS_INTERVAL = 1.0
+
+# Number of seconds a CSV upload task can go without making progress before
+# another delivery of the task may take over the upload, see claim_csv_upload
+UPLOAD_CLAIM_TIMEOUT = 30 * 60
+
+# Directory in the default file storage for the full-archive download built by
+# build_archive_snapshot. The web server and Celery workers must share the storage.
+ARCHIVE_SNAPSHOT_DIR = "exports"
+
+# Observations are left out of the changes feed and changes download until they
+# were added this many seconds ago, so that uploads still being saved aren't missed
+CHANGES_FEED_DELAY = 5 * 60
+
+# Maximum number of seconds the main page and visualization page statistics are
+# cached for. The cache is also cleared whenever an upload finishes.
+STATS_CACHE_TIMEOUT = 60 * 60
+
+# Number of seconds a search on the search page is kept for its download button
+SAVED_SEARCH_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Maximum number of observations shown on the all-sky plot of the visualization
+# page - larger archives are sampled down to this many points
+ALLSKY_PLOT_MAX_POINTS = 20000
+
+# SatChecker response cache - positive results, negative results (not found,
+# not visible, TLE out of range) and the largest response body that is cached
+SATCHECKER_CACHE_TIMEOUT = 60 * 60 * 24
+SATCHECKER_CACHE_NEGATIVE_TIMEOUT = 60 * 60
+SATCHECKER_CACHE_MAX_BYTES = 64 * 1024
+
 # Rate limiting settings
 RATELIMIT_USE_CACHE = "default"
 RATELIMIT_ENABLE = True
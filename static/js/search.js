@@ -110,10 +110,9 @@ function onLoadSuccess(data) {
         $('#totalResultsMessage').empty();
     }
 
-    // Update the hidden obs_ids field for download
-    if (data.obs_ids) {
-        const obsIdsStr = data.obs_ids.join(', ');
-        $('input[name="obs_ids"]').val(obsIdsStr);
+    // Update the saved search used by the download button
+    if (data.search_id) {
+        $('input[name="search_id"]').val(data.search_id);
     }
 }
 